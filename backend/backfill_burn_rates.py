@@ -0,0 +1,43 @@
+import sys
+import time
+from sqlalchemy import select
+from database import SessionLocal
+from migrate import upgrade_database
+from models import Usage, Spool
+from utils.burn_rates import BurnEvent, rebuild
+
+# Заполнение оценок скорости расхода (spool_burn_rates, material_burn_rates)
+# по всей истории трат. Траты читаются потоком в порядке времени.
+#   python backfill_burn_rates.py
+
+
+def history(db):
+    stmt = (
+        select(Usage.spool_id, Usage.group_id, Spool.plastic_type_id, Spool.color, Usage.amount_used, Usage.timestamp)
+        .outerjoin(Spool, Spool.id == Usage.spool_id)
+        .where(Usage.timestamp.is_not(None), Usage.amount_used.is_not(None))
+        .order_by(Usage.timestamp, Usage.id)
+    )
+    for row in db.execute(stmt.execution_options(yield_per=10000)):
+        yield BurnEvent(*row)
+
+
+def backfill(db) -> tuple[int, int]:
+    return rebuild(db, history(db))
+
+
+def main() -> int:
+    upgrade_database()
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        spools, materials = backfill(db)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Оценки расхода пересчитаны: катушек {spools}, материалов {materials} за {time.perf_counter() - start:.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+# Микробенчмарк bcrypt: сколько логинов (verify) в секунду выдерживает пул хеширования
+# при разных значениях стоимости. Запуск из папки backend:
+#   python benchmarks/bench_bcrypt.py --rounds 8 10 12 --workers 4 --logins 64
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+
+def bench(rounds: int, workers: int, logins: int) -> dict:
+    ctx = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    hashed = ctx.hash("benchmark-password")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: ctx.verify("benchmark-password", hashed), range(logins)))
+        elapsed = time.perf_counter() - start
+    assert all(results)
+    return {
+        "rounds": rounds,
+        "workers": workers,
+        "logins": logins,
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(logins / elapsed, 1),
+        "ms_per_verify": round(elapsed * 1000 * workers / logins, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность логина при разной стоимости bcrypt")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[8, 10, 12, 13])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+    print(f"{'rounds':>6} {'workers':>7} {'logins/s':>9} {'ms/verify':>9}")
+    for rounds in args.rounds:
+        r = bench(rounds, args.workers, args.logins)
+        print(f"{r['rounds']:>6} {r['workers']:>7} {r['logins_per_sec']:>9} {r['ms_per_verify']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# Задержки и пропускная способность основных эндпоинтов на данных «боевого» объёма.
+# Приложение запускается в процессе (httpx + ASGITransport) поверх заполненной БД.
+#   python benchmarks/bench_endpoints.py --groups 200 --spools 100000 --usages 10000000
+#   python benchmarks/bench_endpoints.py --compare benchmarks/results/<commit>-sync.json
+# Результат (p50/p95/p99, запросов/с, ошибки) пишется в JSON: по умолчанию
+# benchmarks/results/<commit>-<DB_MODE>.json. Без DATABASE_URL берётся временная
+# SQLite; уже заполненную БД можно переиспользовать с --skip-seed.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("QR_PERSIST", "0")  # create_spool не пишет PNG в static/qr_codes: БД временная, файлы — нет
+
+import httpx  # noqa: E402
+from sqlalchemy import insert, select, func  # noqa: E402
+from main import app, startup  # noqa: E402
+from database import SessionLocal, async_engine, DB_MODE  # noqa: E402
+from models import Role, Group, User, PlasticType, PlasticManufacturer, Spool, Project, Usage  # noqa: E402
+from routers.auth import create_access_token, token_claims  # noqa: E402
+from utils.password_hashing import pwd_context  # noqa: E402
+from utils.qr_generator import sign_payload  # noqa: E402
+from utils.qr_service import spool_qr_data  # noqa: E402
+
+PASSWORD = "bench-password"
+BATCH = 20000  # Строк в одном executemany
+SCENARIOS = ["login", "get_spools", "get_usage", "post_usage", "create_spool", "decode_qr"]
+
+
+def _insert(db, model, rows):
+    for offset in range(0, len(rows), BATCH):
+        db.execute(insert(model), rows[offset:offset + BATCH])
+
+
+def seed(groups: int, users: int, spools: int, projects: int, usages: int):
+    # Пакетные вставки; пароль хешируется один раз на всех пользователей
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        role_id = db.execute(select(Role.id).where(Role.name == "user")).scalar_one()
+        _insert(db, Group, [{"name": f"bench-group-{i}", "is_active": 1} for i in range(groups)])
+        group_ids = db.execute(select(Group.id).where(Group.name.like("bench-group-%"))).scalars().all()
+        hashed = pwd_context.hash(PASSWORD)
+        _insert(db, User, [
+            {"username": f"bench-user-{i}", "hashed_password": hashed, "role_id": role_id, "group_id": group_ids[i % len(group_ids)], "is_active": 1}
+            for i in range(users)
+        ])
+        _insert(db, PlasticType, [{"name": f"bench-type-{i}"} for i in range(8)])
+        _insert(db, PlasticManufacturer, [{"name": f"bench-maker-{i}", "empty_spool_weight": 200.0 + i * 10} for i in range(6)])
+        type_ids = db.execute(select(PlasticType.id).where(PlasticType.name.like("bench-type-%"))).scalars().all()
+        maker_ids = db.execute(select(PlasticManufacturer.id).where(PlasticManufacturer.name.like("bench-maker-%"))).scalars().all()
+        _insert(db, Spool, [
+            {"plastic_type_id": rng.choice(type_ids), "color": f"color-{rng.randrange(24)}", "weight_total": 1e9, "weight_remaining": 1e9,
+             "group_id": group_ids[i % len(group_ids)], "manufacturer_id": rng.choice(maker_ids)}
+            for i in range(spools)
+        ])
+        _insert(db, Project, [{"name": f"bench-project-{i}", "group_id": group_ids[i % len(group_ids)]} for i in range(projects)])
+        spool_rows = db.execute(select(Spool.id, Spool.group_id)).all()
+        user_ids = db.execute(select(User.id).where(User.username.like("bench-user-%"))).scalars().all()
+        start = datetime.utcnow() - timedelta(days=365)
+        step = 365 * 86400 / max(usages, 1)
+        for offset in range(0, usages, BATCH):
+            rows = []
+            for i in range(offset, min(offset + BATCH, usages)):
+                spool_id, group_id = spool_rows[rng.randrange(len(spool_rows))]
+                rows.append({"spool_id": spool_id, "amount_used": round(rng.uniform(1, 60), 1), "purpose": "bench",
+                             "timestamp": start + timedelta(seconds=i * step), "group_id": group_id, "user_id": rng.choice(user_ids)})
+            db.execute(insert(Usage), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_fixtures(sample_users: int):
+    # Пользователи для запросов (токены без bcrypt) и их катушки
+    db = SessionLocal()
+    try:
+        users = db.execute(select(User).where(User.username.like("bench-user-%")).order_by(User.id).limit(sample_users)).scalars().all()
+        if not users:
+            raise SystemExit("В БД нет bench-пользователей: запустите без --skip-seed")
+        spools_by_group = {}
+        for user in users:
+            if user.group_id not in spools_by_group:
+                spools_by_group[user.group_id] = db.execute(
+                    select(Spool.id).where(Spool.group_id == user.group_id).order_by(Spool.id).limit(200)
+                ).scalars().all()
+        type_id = db.execute(select(func.min(PlasticType.id))).scalar_one()
+        qr_codes = [
+            sign_payload(spool_qr_data(spool_id, "bench", "color", None))
+            for spool_ids in spools_by_group.values() for spool_id in spool_ids[:20]
+        ]
+        fixtures = [
+            {"username": user.username, "headers": {"Authorization": f"Bearer {create_access_token(token_claims(user))}"},
+             "spools": spools_by_group[user.group_id]}
+            for user in users
+        ]
+        return fixtures, type_id, qr_codes
+    finally:
+        db.close()
+
+
+def make_requests(fixtures, type_id: int, qr_codes: list[str]):
+    # Фабрики запросов: i -> (метод, путь, аргументы httpx)
+    def user(i):
+        return fixtures[i % len(fixtures)]
+
+    return {
+        "login": lambda i: ("POST", "/auth/login", {"data": {"username": user(i)["username"], "password": PASSWORD}}),
+        "get_spools": lambda i: ("GET", "/spools/", {"headers": user(i)["headers"]}),
+        "get_usage": lambda i: ("GET", "/usage/", {"headers": user(i)["headers"]}),
+        "post_usage": lambda i: ("POST", "/usage/", {"headers": user(i)["headers"], "json": {
+            "spool_id": user(i)["spools"][i % len(user(i)["spools"])], "amount_used": 0.1, "purpose": "bench"}}),
+        "create_spool": lambda i: ("POST", "/spools/", {"headers": user(i)["headers"], "json": {
+            "plastic_type_id": type_id, "color": "bench", "weight_total": 1000}}),
+        "decode_qr": lambda i: ("POST", "/spools/decode_qr", {"headers": user(i)["headers"], "json": {"qr": qr_codes[i % len(qr_codes)]}}),
+    }
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    # Ближайший ранг
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, factory, requests: int, concurrency: int, warmup: int) -> dict:
+    for i in range(warmup):
+        method, url, kwargs = factory(i)
+        await client.request(method, url, **kwargs)
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    counter = iter(range(warmup, warmup + requests))
+
+    async def worker():
+        for i in counter:
+            method, url, kwargs = factory(i)
+            started = time.perf_counter()
+            r = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "throughput_rps": round(requests / elapsed, 1),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+async def run(scenarios: list[str], fixtures, type_id: int, qr_codes: list[str], args) -> dict:
+    factories = make_requests(fixtures, type_id, qr_codes)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in scenarios:
+            # Логин упирается в bcrypt — для него отдельное, меньшее число запросов
+            requests = args.login_requests if name == "login" else args.requests
+            results[name] = await run_scenario(client, factories[name], requests, args.concurrency, args.warmup)
+            r = results[name]
+            print(f"{name:<13} p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  p99 {r['p99_ms']:>8.2f} мс  "
+                  f"{r['throughput_rps']:>8.1f} запр/с  ошибок {r['errors']}", flush=True)
+    if async_engine is not None:
+        # Потоки aiosqlite не дают процессу завершиться, пока пул не закрыт
+        await async_engine.dispose()
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nСравнение с {baseline_path} ({baseline.get('commit')}):")
+    for name, r in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        p95 = (r["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        rps = (r["throughput_rps"] / old["throughput_rps"] - 1) * 100 if old["throughput_rps"] else 0.0
+        print(f"  {name:<13} p95 {p95:+6.1f}%  запр/с {rps:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержки эндпоинтов на заполненной БД")
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--spools", type=int, default=10000)
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--usages", type=int, default=200000)
+    parser.add_argument("--skip-seed", action="store_true", help="БД уже заполнена предыдущим запуском")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=500, help="Запросов на сценарий")
+    parser.add_argument("--login-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--sample-users", type=int, default=50, help="Сколько разных пользователей шлют запросы")
+    parser.add_argument("--output", help="Файл JSON с результатами")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args()
+
+    startup()  # ASGITransport не запускает lifespan: миграции и роли вручную
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seed(args.groups, args.users, args.spools, args.projects, args.usages)
+        print(f"БД заполнена за {time.perf_counter() - started:.1f} с", flush=True)
+    fixtures, type_id, qr_codes = load_fixtures(args.sample_users)
+    results = asyncio.run(run(args.scenarios, fixtures, type_id, qr_codes, args))
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "db_mode": DB_MODE,
+        "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+        "python": platform.python_version(),
+        "dataset": {"groups": args.groups, "users": args.users, "spools": args.spools, "projects": args.projects,
+                    "usages": args.usages, "reused": args.skip_seed},
+        "results": results,
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"{commit or 'local'}-{DB_MODE}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Время сборки листа наклеек (utils/labels.py) без HTTP и БД:
+#   python benchmarks/bench_labels.py --labels 1000 --workers 4 --format pdf
+# Печатает время, скорость и пиковую память родительского процесса.
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+async def build(labels_module, items: list[dict], fmt: str) -> int:
+    stream = labels_module.stream_pdf(items) if fmt == "pdf" else labels_module.stream_png_zip(items)
+    size = 0
+    async for chunk in stream:
+        size += len(chunk)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--labels", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--format", choices=["pdf", "png"], default="pdf")
+    args = parser.parse_args()
+    if args.workers:
+        os.environ["LABEL_WORKERS"] = str(args.workers)
+    from utils import labels
+
+    qr = "eyJpZCI6MSwicGxhc3RpY190eXBlIjoiUExBIiwiY29sb3IiOiLQmtGA0LDRgdC90YvQuSJ9." + "0" * 64
+    items = [
+        {"id": i, "qr": qr, "plastic_type": "PLA", "color": "Красный", "manufacturer": "Bambu Lab"}
+        for i in range(1, args.labels + 1)
+    ]
+    # Прогрев пула: запуск процессов не входит в замер
+    asyncio.run(build(labels, items[:labels.labels_per_page() * labels.LABEL_WORKERS], args.format))
+    started = time.perf_counter()
+    size = asyncio.run(build(labels, items, args.format))
+    elapsed = time.perf_counter() - started
+    labels.shutdown()
+    print(f"{args.labels} наклеек, {labels.page_count(items)} стр., {labels.LABEL_WORKERS} процессов, {args.format}")
+    print(f"  {elapsed:.2f} с, {args.labels / elapsed:.0f} наклеек/с, {size / 1024:.0f} КиБ")
+    print(f"  пиковая память родителя: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} МиБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Время сериализации списков на 10k строк: как было (Pydantic-модель на строку,
+# повторная проверка по response_model, json), словари + response_model и orjson
+# (FAST_JSON=1), плюс gzip результата.
+#   python benchmarks/bench_serialization.py --rows 10000
+import argparse
+import asyncio
+import gzip
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+
+import orjson  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from migrate import upgrade_database  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models import PlasticType, PlasticManufacturer, Spool, Usage  # noqa: E402
+from routers.spools import SpoolOut, SPOOL_OUT_COLUMNS  # noqa: E402
+from routers.usage import UsageOut  # noqa: E402
+from utils.qr_service import spool_qr_path  # noqa: E402
+from utils.fast_json import GZIP_LEVEL  # noqa: E402
+
+
+def seed(rows: int):
+    db = SessionLocal()
+    try:
+        plastic_type = PlasticType(name="bench-PLA")
+        manufacturer = PlasticManufacturer(name="bench-M", empty_spool_weight=200)
+        db.add_all([plastic_type, manufacturer])
+        db.flush()
+        db.execute(Spool.__table__.insert(), [
+            {"plastic_type_id": plastic_type.id, "color": f"color-{i % 20}", "weight_total": 1000.0, "weight_remaining": 1000.0 - i % 900,
+             "group_id": 1, "manufacturer_id": manufacturer.id} for i in range(rows)
+        ])
+        start = datetime(2025, 1, 1)
+        db.execute(Usage.__table__.insert(), [
+            {"spool_id": 1 + i % rows, "amount_used": 12.5, "purpose": "печать детали", "timestamp": start + timedelta(minutes=i),
+             "group_id": 1, "user_id": 1} for i in range(rows)
+        ])
+        db.commit()
+        spools = db.execute(select(*SPOOL_OUT_COLUMNS).outerjoin(PlasticManufacturer, PlasticManufacturer.id == Spool.manufacturer_id)
+                            .order_by(Spool.id)).all()
+        usages = db.execute(select(Usage.id, Usage.spool_id, Usage.amount_used, Usage.purpose, Usage.timestamp,
+                                   Usage.project_id, Usage.user_id)).all()
+        return spools, usages
+    finally:
+        db.close()
+
+
+def timed(fn, repeat: int) -> tuple[float, bytes]:
+    best, body = float("inf"), b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def fastapi_render(field, content) -> bytes:
+    # То, что делает FastAPI с возвращённым значением: проверка по response_model и JSONResponse
+    return JSONResponse(asyncio.run(serialize_response(field=field, response_content=content))).body
+
+
+def report(name: str, model, rows, to_dict, rows_count: int, repeat: int):
+    field = create_model_field(name="Response", type_=list[model], mode="serialization")
+    variants = {
+        "модель на строку + response_model": lambda: fastapi_render(field, [model(**to_dict(row)) for row in rows]),
+        "словари + response_model": lambda: fastapi_render(field, [to_dict(row) for row in rows]),
+        "orjson (FAST_JSON=1)": lambda: orjson.dumps([to_dict(row) for row in rows]),
+    }
+    print(f"{name}: {len(rows)} строк")
+    baseline = None
+    for label, fn in variants.items():
+        elapsed, body = timed(fn, repeat)
+        per_10k = elapsed * 10000 / rows_count * 1000
+        baseline = baseline or per_10k
+        print(f"  {label:<36} {per_10k:8.1f} мс / 10k строк  x{baseline / per_10k:.1f}  {len(body) / 1024:.0f} КиБ")
+    started = time.perf_counter()
+    compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    print(f"  gzip (уровень {GZIP_LEVEL}): {len(compressed) / 1024:.0f} КиБ за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    upgrade_database()
+    spools, usages = seed(args.rows)
+    report("GET /spools/", SpoolOut, spools,
+           lambda row: {**row._mapping, "qr_code_path": spool_qr_path(row.id, row.qr_code_path)}, args.rows, args.repeat)
+    report("GET /usage/", UsageOut, usages, lambda row: dict(row._mapping), args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Холодный старт: время от запуска процесса uvicorn до первого обслуженного запроса.
+#   python benchmarks/bench_startup.py --runs 5
+# Каждый прогон — новый процесс на уже смигрированной временной БД (как рестарт
+# контейнера). Печатает медиану и разброс, а также время импорта main.
+# MIGRATE_ON_START=0 — режим entrypoint.sh (миграции до запуска сервера).
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def cold_start(env: dict, path: str, timeout: float) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        if not wait_ready(f"http://127.0.0.1:{port}{path}", process, timeout):
+            raise SystemExit(f"Сервер не ответил на {path} за {timeout} с")
+        return time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def import_time(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/readyz", help="Запрос, которого ждём (первый обслуженный)")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("SECRET_KEY", "bench-secret")
+        env.setdefault("ALGORITHM", "HS256")
+        env.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+        env["DATABASE_URL"] = f"sqlite:///{tmp}/startup.db"
+        # Схема создаётся заранее — в замер не входит
+        subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+        imports = [import_time(env) for _ in range(args.runs)]
+        starts = [cold_start(env, args.path, args.timeout) for _ in range(args.runs)]
+
+    print(f"import main:      медиана {statistics.median(imports) * 1000:.0f} мс (мин {min(imports) * 1000:.0f}, макс {max(imports) * 1000:.0f})")
+    print(f"первый ответ {args.path}: медиана {statistics.median(starts) * 1000:.0f} мс (мин {min(starts) * 1000:.0f}, макс {max(starts) * 1000:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Сравнение пропускной способности записи трат: POST /usage/ по одной записи
+# против POST /usage/batch пакетами.
+#   python benchmarks/bench_usage_batch.py --usages 2000 --batch-size 500
+# Работает на временной БД; режим БД задаётся DB_MODE (sync/async).
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+
+import httpx  # noqa: E402
+from main import app, startup  # noqa: E402
+from database import SessionLocal, async_engine  # noqa: E402
+from models import Role, Group, User, PlasticType, Spool  # noqa: E402
+from routers.auth import create_access_token, token_claims  # noqa: E402
+
+
+def seed(spools: int) -> tuple[str, list[int]]:
+    db = SessionLocal()
+    try:
+        group = Group(name="bench", is_active=1)
+        db.add(group)
+        db.flush()
+        role = db.query(Role).filter(Role.name == "user").first()
+        user = User(username="bench", hashed_password="-", role_id=role.id, group_id=group.id, is_active=1)
+        plastic_type = PlasticType(name="bench-PLA")
+        db.add_all([user, plastic_type])
+        db.flush()
+        items = [
+            Spool(plastic_type_id=plastic_type.id, color="black", weight_total=1e9, weight_remaining=1e9, qr_code_path="", group_id=group.id)
+            for _ in range(spools)
+        ]
+        db.add_all(items)
+        db.commit()
+        return create_access_token(token_claims(user)), [s.id for s in items]
+    finally:
+        db.close()
+
+
+async def run(token: str, spool_ids: list[int], usages: int, batch_size: int, concurrency: int) -> tuple[float, float, int]:
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = [{"spool_id": spool_ids[i % len(spool_ids)], "amount_used": 1.0, "purpose": "bench"} for i in range(usages)]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def single(item):
+            async with semaphore:
+                return await client.post("/usage/", json=item, headers=headers)
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[single(item) for item in payload])
+        single_elapsed = time.perf_counter() - start
+        created = sum(r.status_code == 200 for r in responses)
+
+        start = time.perf_counter()
+        for offset in range(0, usages, batch_size):
+            r = await client.post("/usage/batch", json=payload[offset:offset + batch_size], headers=headers)
+            r.raise_for_status()
+            created += r.json()["created"]
+        batch_elapsed = time.perf_counter() - start
+    if async_engine is not None:
+        # Потоки aiosqlite не дают процессу завершиться, пока пул не закрыт
+        await async_engine.dispose()
+    return single_elapsed, batch_elapsed, created
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="POST /usage/ против POST /usage/batch")
+    parser.add_argument("--usages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--spools", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    startup()  # ASGITransport не запускает lifespan: миграции и роли вручную
+    token, spool_ids = seed(args.spools)
+    single, batch, created = asyncio.run(run(token, spool_ids, args.usages, args.batch_size, args.concurrency))
+    db = SessionLocal()
+    try:
+        used = sum(1e9 - s.weight_remaining for s in db.query(Spool).all())
+    finally:
+        db.close()
+    single_rate, batch_rate = args.usages / single, args.usages / batch
+    print(f"по одной: {single_rate:.0f} трат/с; пакетами по {args.batch_size}: {batch_rate:.0f} трат/с; ускорение x{batch_rate / single_rate:.1f}")
+    ok = created == 2 * args.usages and used == created
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
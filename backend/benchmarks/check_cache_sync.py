@@ -0,0 +1,146 @@
+# Проверка многопроцессного режима (utils/cache_sync.py): несколько воркеров на одной БД,
+# блокировка и разблокировка через один из них должна дойти до всех за ограниченное время.
+#   python benchmarks/check_cache_sync.py --workers 4 --bound 1.0
+# Воркеры — отдельные процессы uvicorn на своих портах (как --workers, но к каждому можно
+# обратиться напрямую). Сценарии: блокировка/разблокировка пользователя и группы,
+# ETag списка после записи. Печатает задержку по воркерам; код выхода 1, если превышен --bound.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from bench_startup import BACKEND_DIR, free_port, wait_ready
+
+
+def call(port: int, method: str, path: str, token: str | None = None, form: dict | None = None, body: dict | None = None):
+    # (код ответа, JSON, заголовки); ошибки HTTP — тоже ответ
+    headers, data = {}, None
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    if form is not None:
+        data = urllib.parse.urlencode(form).encode()
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    elif body is not None:
+        data = json.dumps(body).encode()
+        headers["Content-Type"] = "application/json"
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read() or b"null"), response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, None, e.headers
+
+
+def login(port: int, username: str, password: str) -> str:
+    status, payload, _ = call(port, "POST", "/auth/login", form={"username": username, "password": password})
+    if status != 200:
+        raise SystemExit(f"Вход {username} на порту {port}: {status}")
+    return payload["access_token"]
+
+
+def wait_all(ports: list[int], check, timeout: float) -> list[float | None]:
+    # Опрос воркеров по кругу; для каждого — время, когда check впервые вернул True
+    started = time.perf_counter()
+    seen: list[float | None] = [None] * len(ports)
+    while None in seen and time.perf_counter() - started < timeout:
+        for i, port in enumerate(ports):
+            if seen[i] is None and check(port):
+                seen[i] = time.perf_counter() - started
+        time.sleep(0.002)
+    return seen
+
+
+def report(name: str, delays: list[float | None], bound: float) -> bool:
+    ok = all(delay is not None and delay <= bound for delay in delays)
+    shown = ", ".join("—" if delay is None else f"{delay * 1000:.0f}" for delay in delays)
+    print(f"{name:<28} задержка по воркерам, мс: {shown}  {'OK' if ok else 'ПРЕВЫШЕНО'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--bound", type=float, default=1.0, help="Допустимая задержка, с")
+    parser.add_argument("--interval", default="0.1", help="CACHE_SYNC_INTERVAL воркеров, с")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("SECRET_KEY", "cache-sync-secret")
+        env.setdefault("ALGORITHM", "HS256")
+        env.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+        env["DATABASE_URL"] = f"sqlite:///{tmp}/cache_sync.db"
+        subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+        subprocess.run([sys.executable, "init_db.py"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+        env.update(MIGRATE_ON_START="0", CACHE_SYNC="1", CACHE_SYNC_INTERVAL=args.interval)
+
+        ports = [free_port() for _ in range(args.workers)]
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                cwd=BACKEND_DIR, env=env,
+            )
+            for port in ports
+        ]
+        try:
+            for port, process in zip(ports, processes):
+                if not wait_ready(f"http://127.0.0.1:{port}/readyz", process, args.timeout):
+                    raise SystemExit(f"Воркер на порту {port} не стал готов")
+            ok = run_scenarios(ports, args.bound)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+    sys.exit(0 if ok else 1)
+
+
+def run_scenarios(ports: list[int], bound: float) -> bool:
+    timeout = bound * 5
+    admin = login(ports[0], "admin", "adminpass")
+    token = login(ports[0], "user", "userpass")
+    _, me, _ = call(ports[0], "GET", "/auth/me", token)
+    user_id, group_id = me["id"], me["group"]["id"]
+    # Прогрев: каждый воркер держит пользователя и группу в своих кэшах
+    for port in ports:
+        if call(port, "GET", "/auth/me", token)[0] != 200:
+            raise SystemExit(f"Воркер {port} не принял токен")
+    writer = ports[-1]  # Запись через один воркер, остальные узнают о ней из журнала
+    ok = True
+
+    call(writer, "PUT", f"/roles_groups/users/{user_id}/block", admin)
+    ok &= report("блокировка пользователя", wait_all(ports, lambda port: call(port, "GET", "/auth/me", token)[0] == 401, timeout), bound)
+
+    call(writer, "PUT", f"/roles_groups/users/{user_id}/unblock", admin)
+    token = login(writer, "user", "userpass")  # Версия сменилась — старый токен отозван
+    ok &= report("разблокировка пользователя", wait_all(ports, lambda port: call(port, "GET", "/auth/me", token)[0] == 200, timeout), bound)
+
+    call(writer, "PUT", f"/roles_groups/groups/{group_id}/block", admin)
+    ok &= report("блокировка группы", wait_all(ports, lambda port: call(port, "GET", "/auth/me", token)[0] == 403, timeout), bound)
+
+    call(writer, "PUT", f"/roles_groups/groups/{group_id}/unblock", admin)
+    token = login(writer, "user", "userpass")
+    ok &= report("разблокировка группы", wait_all(ports, lambda port: call(port, "GET", "/auth/me", token)[0] == 200, timeout), bound)
+
+    # ETag списка одинаков во всех воркерах и меняется после записи в любом из них
+    etags = {call(port, "GET", "/plastic_types/types", admin)[2]["ETag"] for port in ports}
+    if len(etags) != 1:
+        print(f"ETag различается между воркерами: {sorted(etags)}")
+        ok = False
+    old_etag = etags.pop()
+    call(writer, "POST", "/plastic_types/types", admin, body={"name": "CACHE-SYNC"})
+    new_etag = call(writer, "GET", "/plastic_types/types", admin)[2]["ETag"]
+    ok &= report("ETag после записи", wait_all(ports, lambda port: call(port, "GET", "/plastic_types/types", admin)[2]["ETag"] == new_etag, timeout), bound)
+    ok &= new_etag != old_etag
+    return ok
+
+
+if __name__ == "__main__":
+    main()
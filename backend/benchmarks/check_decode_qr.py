@@ -0,0 +1,99 @@
+# Проверка разбора QR-кодов (routers/decode_qr.py) на испорченных кодах: подпись с не-ASCII
+# символами, id не целым числом. Ожидается 400 (для /decode_qr/batch — ошибка по коду),
+# а не 500 и не чужой id.
+#   python benchmarks/check_decode_qr.py
+# Приложение запускается в процессе (httpx + ASGITransport) на временной SQLite.
+# Код выхода 1, если какой-то случай ответил не так.
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "check_decode_qr.db"))
+os.environ.setdefault("SECRET_KEY", "check-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("QR_PERSIST", "0")
+
+import httpx  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from main import app, startup  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models import Role, User  # noqa: E402
+from routers.auth import create_access_token, token_claims  # noqa: E402
+from utils.qr_generator import SECRET_KEY, sign_payload  # noqa: E402
+
+
+def signed(obj) -> str:
+    # Код с верной подписью и произвольным содержимым
+    payload = base64.urlsafe_b64encode(json.dumps(obj).encode()).decode()
+    return f"{payload}.{hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).hexdigest()}"
+
+
+def admin_headers() -> dict:
+    db = SessionLocal()
+    try:
+        role_id = db.execute(select(Role.id).where(Role.name == "admin")).scalar_one()
+        user = User(username="check-admin", hashed_password="-", role_id=role_id, is_active=1)
+        db.add(user)
+        db.commit()
+        return {"Authorization": f"Bearer {create_access_token(token_claims(user))}"}
+    finally:
+        db.close()
+
+
+def cases() -> list[tuple[str, str, int | None]]:
+    # (название, строка QR, ожидаемый id или None — код должен быть отвергнут)
+    valid = sign_payload({"id": 7})
+    payload, signature = valid.split(".")
+    return [
+        ("верный код", valid, 7),
+        ("подпись с кириллицей", f"{payload}.{signature[:-1]}ж", None),
+        ("подпись из не-ASCII", f"{payload}.{'é' * len(signature)}", None),
+        ("подпись с эмодзи", f"{payload}.🙂", None),
+        ("id — строка", signed({"id": "7"}), None),
+        ("id — дробное", signed({"id": 7.5}), None),
+        ("id — true", signed({"id": True}), None),
+        ("id — список", signed({"id": [7]}), None),
+        ("нет id", signed({"spool": 7}), None),
+        ("не объект", signed([7]), None),
+    ]
+
+
+async def run(headers: dict) -> bool:
+    ok = True
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        items = cases()
+        for name, qr, expected in items:
+            response = await client.post("/spools/decode_qr", headers=headers, json={"qr": qr})
+            decoded = response.json().get("id") if response.status_code == 200 else None  # У 500 тело не JSON
+            passed = (response.status_code, decoded) == ((200, expected) if expected is not None else (400, None))
+            ok &= passed
+            print(f"{name:<24} /decode_qr: {response.status_code}  {'OK' if passed else 'ОШИБКА'}")
+        # Пакет: испорченные коды — ошибка 400 по каждому, остальные разбираются (id 7 нет в БД — 404)
+        response = await client.post("/spools/decode_qr/batch", headers=headers, json={"qrs": [qr for _, qr, _ in items]})
+        results = response.json().get("results", {}) if response.status_code == 200 else {}
+        for name, qr, expected in items:
+            status = results.get(qr, {}).get("status_code")
+            passed = status == (404 if expected is not None else 400)
+            ok &= passed
+            print(f"{name:<24} /decode_qr/batch: {status}  {'OK' if passed else 'ОШИБКА'}")
+    return ok
+
+
+def main():
+    startup()  # ASGITransport не запускает lifespan: миграции и роли вручную
+    ok = asyncio.run(run(admin_headers()))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
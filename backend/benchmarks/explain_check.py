@@ -0,0 +1,60 @@
+# Проверка, что горячие запросы используют индексы (EXPLAIN QUERY PLAN, только SQLite).
+# По умолчанию создаёт временную БД через миграции; чтобы проверить рабочую базу:
+#   DATABASE_URL=sqlite:///./plastic.db python benchmarks/explain_check.py
+# Код возврата 1, если хотя бы один запрос идёт полным проходом по таблице.
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "explain.db")
+
+from datetime import datetime  # noqa: E402
+from sqlalchemy import select, or_, tuple_  # noqa: E402
+from database import engine  # noqa: E402
+from migrate import upgrade_database  # noqa: E402
+from models import Spool, Usage, Project, User, PlasticManufacturer  # noqa: E402
+
+# (описание, запрос, индекс, который должен использоваться)
+CHECKS = [
+    ("GET /spools/ (группа)", select(Spool).where(Spool.group_id == 1).order_by(Spool.id), "ix_spools_group_id_id"),
+    ("GET /spools/?cursor= (группа, keyset)", select(Spool.id, PlasticManufacturer.name)
+        .outerjoin(PlasticManufacturer, PlasticManufacturer.id == Spool.manufacturer_id)
+        .where(Spool.group_id == 1, Spool.id > 100).order_by(Spool.id).limit(501), "ix_spools_group_id_id"),
+    ("GET /usage/ (группа, по времени)", select(Usage).where(Usage.group_id == 1).order_by(Usage.timestamp.desc()), "ix_usages_group_id_timestamp"),
+    ("GET /usage/ (админ, по времени)", select(Usage).order_by(Usage.timestamp.desc()).limit(50), "ix_usages_timestamp"),
+    ("GET /usage/?cursor= (группа, keyset)", select(Usage.id).join(Spool, Spool.id == Usage.spool_id)
+        .outerjoin(Project, Project.id == Usage.project_id).where(or_(Usage.project_id.is_(None), Project.id.is_not(None)))
+        .where(Usage.group_id == 1, tuple_(Usage.timestamp, Usage.id) < tuple_(datetime(2026, 1, 1), 100))
+        .order_by(Usage.timestamp.desc(), Usage.id.desc()).limit(501), "ix_usages_group_id_timestamp"),
+    ("траты катушки", select(Usage).where(Usage.spool_id == 1), "ix_usages_spool_id"),
+    ("траты проекта", select(Usage).where(Usage.project_id == 1), "ix_usages_project_id"),
+    ("GET /projects/ (группа)", select(Project).where(Project.group_id == 1), "ix_projects_group_id"),
+    ("пользователи группы", select(User).where(User.group_id == 1), "ix_users_group_id"),
+]
+
+
+def query_plan(conn, stmt) -> list[str]:
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+def main() -> int:
+    if engine.dialect.name != "sqlite":
+        print("EXPLAIN QUERY PLAN проверяется только для SQLite")
+        return 0
+    upgrade_database()
+    failed = 0
+    with engine.connect() as conn:
+        for title, stmt, index in CHECKS:
+            plan = query_plan(conn, stmt)
+            ok = any(index in line for line in plan) and not any("TEMP B-TREE" in line for line in plan)
+            failed += not ok
+            print(f"{'OK  ' if ok else 'FAIL'} {title}: {' | '.join(plan)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
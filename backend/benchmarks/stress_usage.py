@@ -0,0 +1,90 @@
+# Стресс-проверка списания: сотни параллельных POST /usage/ на одну катушку.
+# Итоговый остаток должен точно совпасть с суммой успешных списаний.
+#   python benchmarks/stress_usage.py --requests 400 --amount 3 --weight 1000
+# Работает на временной БД; режим БД задаётся DB_MODE (sync/async).
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "stress.db"))
+os.environ.setdefault("SECRET_KEY", "stress-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+
+import httpx  # noqa: E402
+from main import app, startup  # noqa: E402
+from database import SessionLocal, async_engine  # noqa: E402
+from models import Role, Group, User, PlasticType, Spool  # noqa: E402
+from routers.auth import create_access_token, token_claims  # noqa: E402
+
+
+def seed(weight: float) -> tuple[str, int]:
+    db = SessionLocal()
+    try:
+        group = Group(name="stress", is_active=1)
+        db.add(group)
+        db.flush()
+        role = db.query(Role).filter(Role.name == "user").first()
+        user = User(username="stress", hashed_password="-", role_id=role.id, group_id=group.id, is_active=1)
+        plastic_type = PlasticType(name="stress-PLA")
+        db.add_all([user, plastic_type])
+        db.flush()
+        spool = Spool(plastic_type_id=plastic_type.id, color="black", weight_total=weight, weight_remaining=weight, qr_code_path="", group_id=group.id)
+        db.add(spool)
+        db.commit()
+        return create_access_token(token_claims(user)), spool.id
+    finally:
+        db.close()
+
+
+async def fire(token: str, spool_id: int, requests: int, amount: float) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stress") as client:
+        responses = await asyncio.gather(*[
+            client.post("/usage/", json={"spool_id": spool_id, "amount_used": amount, "purpose": "stress"}, headers=headers)
+            for _ in range(requests)
+        ])
+    if async_engine is not None:
+        # Потоки aiosqlite не дают процессу завершиться, пока пул не закрыт
+        await async_engine.dispose()
+    codes = {}
+    for r in responses:
+        codes[r.status_code] = codes.get(r.status_code, 0) + 1
+    return codes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Параллельные списания с одной катушки")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--amount", type=float, default=3.0)
+    parser.add_argument("--weight", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    startup()  # ASGITransport не запускает lifespan: миграции и роли вручную
+    token, spool_id = seed(args.weight)
+    start = time.perf_counter()
+    codes = asyncio.run(fire(token, spool_id, args.requests, args.amount))
+    elapsed = time.perf_counter() - start
+    db = SessionLocal()
+    try:
+        remaining = db.query(Spool).get(spool_id).weight_remaining
+    finally:
+        db.close()
+    succeeded = codes.get(200, 0)
+    expected = args.weight - succeeded * args.amount
+    print(f"ответы: {codes}; остаток {remaining}, ожидалось {expected}; {elapsed:.2f} с ({args.requests / elapsed:.0f} запросов/с)")
+    ok = remaining == expected and remaining >= 0 and set(codes) <= {200, 400}
+    ok = ok and succeeded == min(args.requests, int(args.weight // args.amount))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,115 @@
-from sqlalchemy import create_engine
+import logging
+import os
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./plastic.db"  # SQLite база будет храниться в файле
+# .env читается один раз здесь: database импортируется раньше всех модулей,
+# которые берут настройки из окружения (main, роутеры, скрипты)
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+# По умолчанию SQLite база хранится в файле рядом с приложением
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./plastic.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# PRAGMA, выполняемые на каждом новом соединении SQLite.
+# WAL позволяет читателям (GET /spools/) работать, пока идёт запись (POST /usage/).
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # отрицательное — в КиБ (64 МБ)
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+# Настройки пула соединений (для SQLite в памяти пул не настраивается)
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": not IS_SQLITE,
+}
+if IS_SQLITE and (DATABASE_URL in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in DATABASE_URL):
+    POOL_SETTINGS = {}
+
+# Режим работы обработчиков с БД: sync — синхронный движок и пул потоков,
+# async — асинхронный движок (aiosqlite / asyncpg). Нужен для сравнения под одинаковой нагрузкой.
+DB_MODE = os.getenv("DB_MODE", "sync")
+if DB_MODE not in ("sync", "async"):
+    raise RuntimeError("DB_MODE должен быть sync или async")
 
 engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+    DATABASE_URL, connect_args={"check_same_thread": False} if IS_SQLITE else {}, **POOL_SETTINGS
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+
+def to_async_url(url: str) -> str:
+    # sqlite:///... -> sqlite+aiosqlite:///..., postgresql://... -> postgresql+asyncpg://...
+    scheme, rest = url.split("://", 1)
+    driver = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+    return f"{driver.get(scheme, scheme)}://{rest}"
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    async_engine = create_async_engine(to_async_url(DATABASE_URL), **POOL_SETTINGS)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+
+def log_database_config():
+    # Пишет в лог фактическую конфигурацию (значения PRAGMA читаются из соединения)
+    settings = {"url": engine.url.render_as_string(hide_password=True), "mode": DB_MODE, "pool": type(engine.pool).__name__}
+    settings.update(POOL_SETTINGS)
+    if IS_SQLITE:
+        with engine.connect() as conn:
+            for name in SQLITE_PRAGMAS:
+                settings[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    logger.info("Database: " + ", ".join(f"{k}={v}" for k, v in settings.items()))
+
+
+class SessionRunner:
+    # Единый интерфейс для async-обработчиков в обоих режимах:
+    # await db.run_sync(fn, *args) вызывает fn(session, *args) с обычной Session
+    def __init__(self, session):
+        self.session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        if DB_MODE == "async":
+            return await self.session.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+
+async def get_async_db():
+    if DB_MODE == "async":
+        async with AsyncSessionLocal() as session:
+            yield SessionRunner(session)
+    else:
+        session = SessionLocal()
+        try:
+            yield SessionRunner(session)
+        finally:
+            await run_in_threadpool(session.close)
@@ -1,15 +1,39 @@
 #!/bin/bash
-# Скрипт запускает uvicorn и после успешного старта — init_db.py
+# Миграции, затем uvicorn; init_db.py — после того как /readyz ответит 200
+set -e
 
 # Проверяем, определена ли переменная PORT, иначе используем 8000
 PORT_TO_USE=${PORT:-8000}
+READY_TIMEOUT=${READY_TIMEOUT:-60}
+
+# Миграции до запуска сервера: приложение их уже не повторяет
+python migrate.py
 
 # Запускаем uvicorn в фоне
-uvicorn main:app --host 0.0.0.0 --port $PORT_TO_USE &
+# WEB_CONCURRENCY > 1 — несколько воркеров, кэши согласуются через utils/cache_sync.py
+MIGRATE_ON_START=0 uvicorn main:app --host 0.0.0.0 --port $PORT_TO_USE --workers ${WEB_CONCURRENCY:-1} &
 UVICORN_PID=$!
 
-# Ждём, пока uvicorn поднимется (можно заменить на healthcheck или curl, если есть /docs или /health)
-sleep 5
+# Ждём готовности (в образе нет curl — опрашиваем через python)
+if ! python - "$PORT_TO_USE" "$READY_TIMEOUT" <<'EOF'
+import sys, time, urllib.request
+port, timeout = sys.argv[1], float(sys.argv[2])
+deadline = time.monotonic() + timeout
+while time.monotonic() < deadline:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=2) as response:
+            if response.status == 200:
+                sys.exit(0)
+    except OSError:
+        pass
+    time.sleep(0.1)
+sys.exit(1)
+EOF
+then
+    echo "Сервер не стал готов за ${READY_TIMEOUT} с" >&2
+    kill $UVICORN_PID
+    exit 1
+fi
 
 # Запускаем инициализацию базы
 python init_db.py
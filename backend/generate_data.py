@@ -0,0 +1,307 @@
+import argparse
+import itertools
+import math
+import random
+import sys
+import time
+from datetime import date, datetime
+from sqlalchemy import MetaData, Table, Column, Integer, Float, String, Date, select, insert, update, bindparam
+from database import engine, IS_SQLITE
+from migrate import upgrade_database
+from models import Role, Group, User, PlasticType, PlasticManufacturer, Spool, Project, Usage, UsageRollup, SpoolBurnRate, MaterialBurnRate
+from utils.password_hashing import pwd_context
+from utils.usage_rollups import NO_GROUP
+from utils.burn_rates import TAU_DAYS, DAY_SECONDS
+
+# Синтетические данные для нагрузочных тестов: группы, пользователи, катушки,
+# проекты и траты пакетными вставками. Пароль хешируется один раз на всех,
+# QR-коды не рисуются (картинки строятся на лету, utils/qr_service.py).
+# Распределения неравномерные: размеры групп и популярность катушек — степенные,
+# траты — логнормальные и учащаются к настоящему времени.
+#   python generate_data.py --groups 200 --users 5000 --spools 100000 --projects 20000 --usages 10000000
+# Пользователи: <prefix>-admin, <prefix>-user-N, пароль --password.
+
+BATCH = 50000  # Строк в одном executemany
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+PLASTIC_TYPES = {"PLA": 45, "PETG": 25, "ABS": 10, "TPU": 6, "ASA": 5, "PA": 3, "PC": 3, "HIPS": 3}
+MANUFACTURERS = {"ESUN": (220.0, 30), "REC": (240.0, 20), "Polymaker": (200.0, 15), "Bambu Lab": (250.0, 15),
+                 "Prusament": (193.0, 10), "Creality": (180.0, 10)}
+COLORS = {"Черный": 22, "Белый": 20, "Серый": 10, "Красный": 8, "Синий": 8, "Зеленый": 6, "Оранжевый": 5, "Желтый": 5,
+          "Прозрачный": 5, "Фиолетовый": 3, "Коричневый": 3, "Розовый": 3, "Бирюзовый": 2}
+SPOOL_WEIGHTS = {1000.0: 70, 750.0: 8, 500.0: 8, 250.0: 4, 2000.0: 6, 3000.0: 4}
+PURPOSES = ["Печать детали", "Прототип", "Калибровка", "Тестовая печать", "Заказ", "Ремонт", "Макет"]
+
+
+def _cumulative(weights) -> list[float]:
+    return list(itertools.accumulate(weights))
+
+
+def _zipf(n: int, s: float = 1.1) -> list[float]:
+    # Вес i-го элемента ~ 1 / i^s: немного больших групп и длинный хвост маленьких
+    return [1 / (i ** s) for i in range(1, n + 1)]
+
+
+def _split(total: int, weights: list[float], minimum: int = 0) -> list[int]:
+    # Делит total пропорционально весам (не меньше minimum, если хватает)
+    base = minimum if total >= minimum * len(weights) else 0
+    rest = total - base * len(weights)
+    scale = sum(weights)
+    counts = [base + int(rest * w / scale) for w in weights]
+    for i in range(total - sum(counts)):
+        counts[i % len(counts)] += 1
+    return counts
+
+
+def _insert(conn, table, columns: list[str], rows: list[tuple], processed: bool = False, expressions: dict[str, str] | None = None):
+    # SQLite: executemany драйвера без построчной обработки SQLAlchemy (в разы быстрее);
+    # остальные СУБД — Core insert (insertmanyvalues). processed — значения уже в формате
+    # драйвера; expressions — SQL вместо "?" для отдельных колонок (только SQLite)
+    if not rows:
+        return
+    if IS_SQLITE:
+        processors = [table.c[name].type.bind_processor(conn.dialect) for name in columns]
+        if any(processors) and not processed:
+            rows = [tuple(p(v) if p and v is not None else v for p, v in zip(processors, row)) for row in rows]
+        values = [(expressions or {}).get(name, "?") for name in columns]
+        sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join(values)})"
+        for offset in range(0, len(rows), BATCH):
+            conn.exec_driver_sql(sql, rows[offset:offset + BATCH])
+    else:
+        for offset in range(0, len(rows), BATCH):
+            conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows[offset:offset + BATCH]])
+
+
+def _ids(conn, column, name_column, prefix: str) -> list[int]:
+    return conn.execute(select(column).where(name_column.like(f"{prefix}%")).order_by(column)).scalars().all()
+
+
+def _lookup(conn, model, names) -> dict[str, int]:
+    return dict(conn.execute(select(model.name, model.id).where(model.name.in_(list(names)))).all())
+
+
+def generate(groups: int, users: int, spools: int, projects: int, usages: int, days: int = 365, prefix: str = "gen",
+             password: str = "password", seed: int = 1, derived: bool = True, log=print) -> dict:
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    def step(message: str):
+        log(f"[{time.perf_counter() - started:7.1f} с] {message}")
+
+    with engine.begin() as conn:
+        if IS_SQLITE:
+            # Только на время загрузки: без fsync на каждую страницу и с большим кэшем
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            conn.exec_driver_sql("PRAGMA cache_size=-262144")
+
+        # Справочники: роли, типы, производители (недостающие)
+        for role_name in ("admin", "moderator", "user"):
+            if conn.execute(select(Role.id).where(Role.name == role_name)).first() is None:
+                conn.execute(Role.__table__.insert().values(name=role_name))
+        roles = dict(conn.execute(select(Role.name, Role.id)).all())
+        existing = _lookup(conn, PlasticType, PLASTIC_TYPES)
+        _insert(conn, PlasticType.__table__, ["name"], [(name,) for name in PLASTIC_TYPES if name not in existing])
+        type_ids = _lookup(conn, PlasticType, PLASTIC_TYPES)
+        existing = _lookup(conn, PlasticManufacturer, MANUFACTURERS)
+        _insert(conn, PlasticManufacturer.__table__, ["name", "empty_spool_weight"],
+                [(name, weight) for name, (weight, _) in MANUFACTURERS.items() if name not in existing])
+        maker_ids = _lookup(conn, PlasticManufacturer, MANUFACTURERS)
+
+        # Группы и пользователи: размеры групп по закону Ципфа
+        _insert(conn, Group.__table__, ["name", "is_active"], [(f"{prefix}-group-{i}", 1) for i in range(1, groups + 1)])
+        group_ids = _ids(conn, Group.id, Group.name, f"{prefix}-group-")
+        group_weights = _zipf(len(group_ids))
+        hashed = pwd_context.hash(password)
+        user_rows = [(f"{prefix}-admin", hashed, roles["admin"], group_ids[0], 1)]
+        number = 0
+        for group_id, count in zip(group_ids, _split(users, group_weights, minimum=1)):
+            for k in range(count):
+                number += 1
+                # Первый в группе — модератор
+                user_rows.append((f"{prefix}-user-{number}", hashed, roles["moderator" if k == 0 else "user"], group_id, 1))
+        _insert(conn, User.__table__, ["username", "hashed_password", "role_id", "group_id", "is_active"], user_rows)
+        users_by_group: dict[int, list[int]] = {}
+        for user_id, group_id in conn.execute(select(User.id, User.group_id).where(User.username.like(f"{prefix}-%"))):
+            users_by_group.setdefault(group_id, []).append(user_id)
+        step(f"группы: {len(group_ids)}, пользователи: {len(user_rows)}")
+
+        # Катушки: тип, цвет, производитель и вес — по частотам; QR не рисуется
+        spool_counts = _split(spools, group_weights)
+        type_names, type_cum = list(PLASTIC_TYPES), _cumulative(PLASTIC_TYPES.values())
+        maker_names, maker_cum = list(MANUFACTURERS), _cumulative(w for _, w in MANUFACTURERS.values())
+        color_names, color_cum = list(COLORS), _cumulative(COLORS.values())
+        weight_values, weight_cum = list(SPOOL_WEIGHTS), _cumulative(SPOOL_WEIGHTS.values())
+        first_spool = conn.execute(select(Spool.id).order_by(Spool.id.desc()).limit(1)).scalar() or 0
+        spool_rows = []
+        for group_id, count in zip(group_ids, spool_counts):
+            for _ in range(count):
+                weight = rng.choices(weight_values, cum_weights=weight_cum)[0]
+                spool_rows.append((type_ids[rng.choices(type_names, cum_weights=type_cum)[0]],
+                                   rng.choices(color_names, cum_weights=color_cum)[0], weight, weight, group_id,
+                                   maker_ids[rng.choices(maker_names, cum_weights=maker_cum)[0]]))
+        _insert(conn, Spool.__table__, ["plastic_type_id", "color", "weight_total", "weight_remaining", "group_id", "manufacturer_id"], spool_rows)
+        spool_list = conn.execute(
+            select(Spool.id, Spool.group_id, Spool.weight_total, Spool.plastic_type_id, Spool.color).where(Spool.id > first_spool).order_by(Spool.id)
+        ).all()
+        step(f"катушки: {len(spool_list)}")
+
+        # Проекты: пропорционально размеру группы
+        project_rows = []
+        for group_id, count in zip(group_ids, _split(projects, group_weights)):
+            project_rows += [(f"{prefix}-project-{group_id}-{k}", f"Синтетический проект {k}", group_id) for k in range(1, count + 1)]
+        _insert(conn, Project.__table__, ["name", "description", "group_id"], project_rows)
+        projects_by_group: dict[int, list[int]] = {}
+        for project_id, group_id in conn.execute(select(Project.id, Project.group_id).where(Project.name.like(f"{prefix}-project-%"))):
+            projects_by_group.setdefault(group_id, []).append(project_id)
+        step(f"проекты: {len(project_rows)}")
+
+        # Траты. Индексы usages снимаются на время загрузки и строятся заново в конце —
+        # так вставка в несколько раз быстрее. Траты идут по времени, поэтому сводки
+        # usage_rollups копятся за текущий день и записываются при его смене, а оценки
+        # расхода считаются той же формулой, что в utils/burn_rates.py. Все ключи
+        # (группы, катушки, проекты, пользователи) новые — достаточно обычной вставки.
+        usage_indexes = list(Usage.__table__.indexes)
+        if usages and spool_list:
+            for index in usage_indexes:
+                index.drop(conn)
+            # Популярность катушек — распределение Парето; средняя трата подобрана так,
+            # чтобы в сумме израсходовать не больше ~80% всего пластика
+            spool_cum = _cumulative(rng.paretovariate(1.2) for _ in spool_list)
+            remaining = [row.weight_total for row in spool_list]
+            mean_amount = min(25.0, 0.8 * sum(remaining) / usages)
+            mu = math.log(mean_amount) - 0.32  # Среднее логнормального распределения = exp(mu + sigma^2 / 2)
+            # Время траты — секунды Unix; в SQLite строка даты собирается самим SQLite
+            # (strftime в C втрое быстрее datetime + isoformat), с точностью до миллисекунды
+            start = time.time() - days * DAY_SECONDS
+            span = days * DAY_SECONDS
+            expressions = {"timestamp": "strftime('%Y-%m-%d %H:%M:%f000', ?, 'unixepoch')"}
+            columns = ["spool_id", "project_id", "group_id", "user_id", "amount_used", "purpose", "timestamp"]
+            rollup_columns = ["dimension", "key_id", "group_id", "day", "grams", "usages"]
+            rollups: dict[tuple, list] = {}
+            rollup_day, rollup_rows = None, 0
+            spool_rates: dict[int, list] = {}  # spool_id -> [rate, время последней траты]
+            material_rates: dict[tuple, list] = {}
+            materials = [(group_id or NO_GROUP, plastic_type_id or 0, color or "") for _, group_id, _, plastic_type_id, color in spool_list]
+
+            # Сводки за день копятся во временной таблице без индексов и в конце переносятся
+            # одним INSERT ... SELECT в порядке первичного ключа (вставка по дням вразброс
+            # по индексу в разы медленнее)
+            stage = Table("generate_rollups", MetaData(), Column("dimension", String), Column("key_id", Integer), Column("group_id", Integer),
+                          Column("day", Date), Column("grams", Float), Column("usages", Integer), prefixes=["TEMPORARY"])
+            rollup_indexes = list(UsageRollup.__table__.indexes)
+            if derived:
+                stage.create(conn)
+                for index in rollup_indexes:
+                    index.drop(conn)
+
+            def flush_rollups():
+                if not rollups:
+                    return 0
+                day = date.fromordinal(EPOCH_ORDINAL + rollup_day)
+                day = day.isoformat() if IS_SQLITE else day
+                rows = [(dimension, key, group_id, day, grams, count) for (dimension, key, group_id), (grams, count) in rollups.items()]
+                _insert(conn, stage, rollup_columns, rows, processed=True)
+                rollups.clear()
+                return len(rows)
+
+            def fold(states: dict, key, at: float, amount: float):
+                # rate = rate * exp(-dt / tau) + amount / tau; траты идут по неубыванию времени
+                state = states.get(key)
+                if state is None:
+                    states[key] = [amount / TAU_DAYS, at]
+                elif at > state[1]:
+                    state[0] = state[0] * math.exp((state[1] - at) / (DAY_SECONDS * TAU_DAYS)) + amount / TAU_DAYS
+                    state[1] = at
+                else:
+                    state[0] += amount / TAU_DAYS
+
+            for offset in range(0, usages, BATCH):
+                chunk = min(BATCH, usages - offset)
+                picks = rng.choices(range(len(spool_list)), cum_weights=spool_cum, k=chunk)
+                rows = []
+                for n, index in enumerate(picks, offset):
+                    amount = math.exp(rng.gauss(mu, 0.8))
+                    for _ in range(5):
+                        if remaining[index] >= 1.0:
+                            break
+                        # Катушка закончилась — трата уходит на случайную другую
+                        index = int(len(spool_list) * rng.random())
+                    amount = round(min(amount, remaining[index]), 1)
+                    remaining[index] -= amount
+                    spool_id, group_id = spool_list[index][0], spool_list[index][1]
+                    group_users = users_by_group.get(group_id)
+                    user_id = group_users[int(len(group_users) * rng.random())] if group_users else None
+                    group_projects = projects_by_group.get(group_id)
+                    project_id = group_projects[int(len(group_projects) * rng.random() ** 2)] if group_projects and rng.random() < 0.6 else None
+                    # Траты учащаются к настоящему времени (рост числа пользователей)
+                    at = round(start + span * math.sqrt((n + rng.random()) / usages), 3)
+                    rows.append((spool_id, project_id, group_id, user_id, amount, PURPOSES[int(len(PURPOSES) * rng.random() ** 2)],
+                                 at if IS_SQLITE else datetime.utcfromtimestamp(at)))
+                    if not derived:
+                        continue
+                    day = int(at // DAY_SECONDS)
+                    if day != rollup_day:
+                        rollup_rows += flush_rollups()
+                        rollup_day = day
+                    rollup_group = group_id or NO_GROUP
+                    for key in (("group", rollup_group, rollup_group), ("spool", spool_id, rollup_group),
+                                ("project", project_id, rollup_group), ("user", user_id, rollup_group)):
+                        if key[1] is None:
+                            continue
+                        delta = rollups.get(key)
+                        if delta is None:
+                            rollups[key] = [amount, 1]
+                        else:
+                            delta[0] += amount
+                            delta[1] += 1
+                    fold(spool_rates, spool_id, at, amount)
+                    fold(material_rates, materials[index], at, amount)
+                _insert(conn, Usage.__table__, columns, rows, processed=True, expressions=expressions)
+                if (offset // BATCH) % 20 == 19 and offset + chunk < usages:
+                    step(f"траты: {offset + chunk}")
+            step(f"траты: {usages}")
+            conn.execute(update(Spool.__table__).where(Spool.__table__.c.id == bindparam("spool_id")).values(weight_remaining=bindparam("remaining")),
+                         [{"spool_id": row.id, "remaining": round(left, 1)} for row, left in zip(spool_list, remaining)])
+            if derived:
+                # Сводки и оценки расхода для /reports и /reports/depletion
+                rollup_rows += flush_rollups()
+                ordered = select(*(stage.c[name] for name in rollup_columns)).order_by(stage.c.dimension, stage.c.key_id, stage.c.group_id, stage.c.day)
+                conn.execute(insert(UsageRollup.__table__).from_select(rollup_columns, ordered))
+                stage.drop(conn)
+                for index in rollup_indexes:
+                    index.create(conn)
+                _insert(conn, SpoolBurnRate.__table__, ["spool_id", "rate", "last_usage_at"],
+                        [(spool_id, rate, datetime.utcfromtimestamp(at)) for spool_id, (rate, at) in spool_rates.items()])
+                _insert(conn, MaterialBurnRate.__table__, ["group_id", "plastic_type_id", "color", "rate", "last_usage_at"],
+                        [(*key, rate, datetime.utcfromtimestamp(at)) for key, (rate, at) in material_rates.items()])
+                step(f"сводки: {rollup_rows}, оценки расхода: {len(spool_rates)} катушек, {len(material_rates)} материалов")
+            for index in usage_indexes:
+                index.create(conn)
+            step("индексы usages построены")
+        conn.exec_driver_sql("ANALYZE")
+    return {"groups": len(group_ids), "users": len(user_rows), "spools": len(spool_list), "projects": len(project_rows), "usages": usages}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Синтетические данные для нагрузочных тестов")
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--spools", type=int, default=10000)
+    parser.add_argument("--projects", type=int, default=2000)
+    parser.add_argument("--usages", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=365, help="Глубина истории трат, дни")
+    parser.add_argument("--prefix", default="gen", help="Префикс имён групп, пользователей и проектов")
+    parser.add_argument("--password", default="password", help="Пароль всех созданных пользователей")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-derived", action="store_true", help="Не заполнять сводки и оценки расхода")
+    args = parser.parse_args()
+
+    upgrade_database()
+    counts = generate(args.groups, args.users, args.spools, args.projects, args.usages, days=args.days, prefix=args.prefix,
+                      password=args.password, seed=args.seed, derived=not args.skip_derived)
+    print("Готово: " + ", ".join(f"{name} {count}" for name, count in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
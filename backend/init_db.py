@@ -1,13 +1,17 @@
 from database import SessionLocal
 from models import Role, Group, User, Project, Spool, Usage, PlasticType, PlasticManufacturer
+from sqlalchemy import insert
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from passlib.hash import bcrypt
-from utils.qr_generator import generate_qr
+from utils.usage_rollups import rebuild as rebuild_rollups
+from backfill_burn_rates import backfill as backfill_burn_rates
 import random
 
 def hash_password(password: str) -> str:
-    return bcrypt.hash(password)
+    # Демо-пароли хешируются с минимальной стоимостью (~1 мс вместо ~300 мс);
+    # при первом входе хеш перезаписывается с BCRYPT_ROUNDS (rehash-on-login)
+    return bcrypt.using(rounds=4).hash(password)
 
 def seed_data():
     db = SessionLocal()
@@ -71,64 +75,63 @@ def seed_data():
                 "role": roles["user"],
                 "group": groups["GroupA" if i % 3 == 1 else "GroupB" if i % 3 == 2 else "GroupC"]
             })
-        for u in users:
-            if not db.query(User).filter_by(username=u["username"]).first():
-                user = User(
-                    username=u["username"],
-                    hashed_password=hash_password(u["password"]),
-                    role_id=u["role"].id,
-                    group_id=u["group"].id
-                )
-                db.add(user)
-        db.commit()
+        existing = {username for (username,) in db.query(User.username).filter(User.username.in_([u["username"] for u in users]))}
+        db.add_all([
+            User(
+                username=u["username"],
+                hashed_password=hash_password(u["password"]),
+                role_id=u["role"].id,
+                group_id=u["group"].id
+            )
+            for u in users if u["username"] not in existing
+        ])
 
         # Проекты
         for i, group in enumerate(groups.values(), 1):
             for j in range(1, 11):
                 project = Project(name=f"Project{i}_{j}", description=f"Test project {i}_{j}", group_id=group.id)
                 db.add(project)
-        db.commit()
 
-        # Катушки (используем первый стандартный тип пластика и производителей)
+        # Катушки (используем первый стандартный тип пластика и производителей).
+        # QR-коды не рисуются: картинка строится при первом запросе (utils/qr_service.py)
         plastic_type = db.query(PlasticType).filter_by(name="PLA").first()
         man_list = list(manufacturers.values())
         for i, group in enumerate(groups.values(), 1):
             for j in range(1, 21):
                 manufacturer = man_list[(j-1) % len(man_list)]
-                spool = Spool(
+                db.add(Spool(
                     plastic_type_id=plastic_type.id,
                     color=f"Color{i}_{j}",
                     weight_total=1000+j*10,
                     weight_remaining=900-j*5,
-                    qr_code_path="",
                     group_id=group.id,
                     manufacturer_id=manufacturer.id
-                )
-                db.add(spool)
-                db.commit()
-                db.refresh(spool)
-                # Генерация QR-кода после получения id
-                qr_path = generate_qr({"id": spool.id})
-                spool.qr_code_path = qr_path
-                db.commit()
+                ))
+        db.flush()
 
-        # Usage
+        # Usage: пользователи групп загружаются один раз, траты пишутся одним executemany
         spools = db.query(Spool).all()
         projects = db.query(Project).all()
+        users_by_group = {}
+        for user_id, group_id in db.query(User.id, User.group_id):
+            users_by_group.setdefault(group_id, []).append(user_id)
+        usages = []
         for i, (spool, project) in enumerate(zip(spools, projects), 1):
-            group_users = db.query(User).filter_by(group_id=spool.group_id).all()
+            group_users = users_by_group.get(spool.group_id)
             for k in range(1, 6):
-                user = random.choice(group_users) if group_users else None
-                usage = Usage(
-                    spool_id=spool.id,
-                    amount_used=100+k,
-                    purpose=f"Test usage {i}_{k}",
-                    project_id=project.id,
-                    group_id=spool.group_id,
-                    user_id=user.id if user else None,
-                    timestamp=datetime.utcnow()
-                )
-                db.add(usage)
+                usages.append({
+                    "spool_id": spool.id,
+                    "amount_used": 100+k,
+                    "purpose": f"Test usage {i}_{k}",
+                    "project_id": project.id,
+                    "group_id": spool.group_id,
+                    "user_id": random.choice(group_users) if group_users else None,
+                    "timestamp": datetime.utcnow()
+                })
+        if usages:
+            db.execute(insert(Usage), usages)
+        rebuild_rollups(db)
+        backfill_burn_rates(db)
         db.commit()
         print("Тестовые данные успешно добавлены!")
     except IntegrityError:
@@ -1,20 +1,55 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from database import Base, engine
-from routers import spools, usage, auth, projects, roles_groups, plastic_types, decode_qr, plastic_manufacturers
+from database import engine, async_engine, log_database_config
+from routers import spools, usage, auth, projects, roles_groups, plastic_types, decode_qr, plastic_manufacturers, reports, metrics, health
 from fastapi.middleware.cors import CORSMiddleware
+from utils.fast_json import JSONGZipMiddleware, GZIP_MIN_SIZE, GZIP_LEVEL
+from utils.metrics import MetricsMiddleware, instrument_engine, METRICS_TOKEN
 import os
-from dotenv import load_dotenv  # <--- добавлено
 from fastapi.openapi.utils import get_openapi
+from routers.roles_groups import ensure_default_roles, get_groups
+from utils import slow_queries, labels, qr_worker, password_hashing, cache_sync
 
-load_dotenv()  # <--- добавлено
+# Миграции при старте процесса. entrypoint.sh применяет их сам до запуска
+# воркеров и выставляет MIGRATE_ON_START=0 (несколько воркеров не мигрируют наперегонки)
+MIGRATE_ON_START = os.getenv("MIGRATE_ON_START", "1") == "1"
 
-app = FastAPI()
+logger = logging.getLogger("uvicorn.error")
 
-Base.metadata.create_all(bind=engine)
 
-from routers.roles_groups import ensure_default_roles, get_groups
-ensure_default_roles()
+def startup():
+    if MIGRATE_ON_START:
+        # alembic нужен только здесь — импорт не замедляет импорт приложения
+        from migrate import upgrade_database
+        upgrade_database()
+    log_database_config()
+    if not METRICS_TOKEN:
+        logger.warning("METRICS_TOKEN не задан: GET /metrics доступен только админу (Prometheus без токена получит 401)")
+    ensure_default_roles()
+    cache_sync.init()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Инициализация до приёма запросов (а не при импорте модуля); /readyz отвечает 200 после неё
+    await run_in_threadpool(startup)
+    cache_sync.start()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    await cache_sync.stop()
+    labels.shutdown()
+    qr_worker.shutdown()
+    password_hashing.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # --- CORS настройка ---
 # Можно задать переменную окружения ALLOWED_ORIGINS через .env или панель хостинга
@@ -32,7 +67,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Курсор следующей страницы для списков
 )
+app.add_middleware(JSONGZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
+# Метрики — внешний слой: время ответа включает CORS и сжатие
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine, "sync")
+slow_queries.instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine, "async")
+    slow_queries.instrument_engine(async_engine.sync_engine)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -44,12 +88,15 @@ app.include_router(roles_groups.router, prefix="/roles_groups")
 app.include_router(plastic_types.router, prefix="/plastic_types")
 app.include_router(decode_qr.router, prefix="/spools")
 app.include_router(plastic_manufacturers.router, prefix="/manufacturers")
+app.include_router(reports.router, prefix="/reports")
+app.include_router(metrics.router)
+app.include_router(health.router)
 
 # Прокси-роут для /groups/ (чтобы фронт работал без изменений)
 from fastapi import Depends
 @app.get("/groups/", response_model=list[roles_groups.GroupOut])
-def proxy_groups(db: roles_groups.Session = Depends(roles_groups.get_db), current_user: roles_groups.User = Depends(roles_groups.get_current_user)):
-    return get_groups(db, current_user)
+def proxy_groups(request: Request, response: Response, db: roles_groups.Session = Depends(roles_groups.get_db), current_user: roles_groups.User = Depends(roles_groups.get_current_user)):
+    return get_groups(request, response, db, current_user)
 
 # Кастомизация OpenAPI
 def custom_openapi():
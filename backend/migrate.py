@@ -0,0 +1,31 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from database import engine
+
+# Применение миграций Alembic (migrations/). Вызывается при старте приложения,
+# можно запустить и вручную: python migrate.py
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+BASELINE_REVISION = "0001"
+
+
+def alembic_config() -> Config:
+    config = Config(ALEMBIC_INI)
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def upgrade_database():
+    config = alembic_config()
+    tables = set(inspect(engine).get_table_names())
+    if "alembic_version" not in tables and "users" in tables:
+        # База создана через Base.metadata.create_all до появления миграций
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+
+if __name__ == "__main__":
+    upgrade_database()
+    print("Миграции применены")
@@ -0,0 +1,130 @@
+"""initial schema
+
+Схема в том виде, в каком её создавал Base.metadata.create_all до появления миграций.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('groups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_groups_id', 'groups', ['id'], unique=False)
+    op.create_index('ix_groups_name', 'groups', ['name'], unique=True)
+    op.create_table('plastic_manufacturers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('info', sa.String(), nullable=True),
+    sa.Column('empty_spool_weight', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index('ix_plastic_manufacturers_id', 'plastic_manufacturers', ['id'], unique=False)
+    op.create_table('roles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_roles_id', 'roles', ['id'], unique=False)
+    op.create_index('ix_roles_name', 'roles', ['name'], unique=True)
+    op.create_table('projects',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('group_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_projects_id', 'projects', ['id'], unique=False)
+    op.create_index('ix_projects_name', 'projects', ['name'], unique=True)
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(), nullable=True),
+    sa.Column('hashed_password', sa.String(), nullable=True),
+    sa.Column('role_id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.ForeignKeyConstraint(['role_id'], ['roles.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+    op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    op.create_table('plastic_types',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_plastic_types_id', 'plastic_types', ['id'], unique=False)
+    op.create_index('ix_plastic_types_name', 'plastic_types', ['name'], unique=True)
+    op.create_table('spools',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plastic_type_id', sa.Integer(), nullable=True),
+    sa.Column('color', sa.String(), nullable=True),
+    sa.Column('weight_total', sa.Float(), nullable=True),
+    sa.Column('weight_remaining', sa.Float(), nullable=True),
+    sa.Column('qr_code_path', sa.String(), nullable=True),
+    sa.Column('group_id', sa.Integer(), nullable=True),
+    sa.Column('manufacturer_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.ForeignKeyConstraint(['manufacturer_id'], ['plastic_manufacturers.id'], ),
+    sa.ForeignKeyConstraint(['plastic_type_id'], ['plastic_types.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_spools_id', 'spools', ['id'], unique=False)
+    op.create_table('usages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('spool_id', sa.Integer(), nullable=True),
+    sa.Column('project_id', sa.Integer(), nullable=True),
+    sa.Column('group_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('amount_used', sa.Float(), nullable=True),
+    sa.Column('purpose', sa.String(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.ForeignKeyConstraint(['spool_id'], ['spools.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_usages_id', 'usages', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_usages_id', table_name='usages')
+    op.drop_table('usages')
+    op.drop_index('ix_spools_id', table_name='spools')
+    op.drop_table('spools')
+    op.drop_index('ix_plastic_types_name', table_name='plastic_types')
+    op.drop_index('ix_plastic_types_id', table_name='plastic_types')
+    op.drop_table('plastic_types')
+    op.drop_index('ix_users_username', table_name='users')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_table('users')
+    op.drop_index('ix_projects_name', table_name='projects')
+    op.drop_index('ix_projects_id', table_name='projects')
+    op.drop_table('projects')
+    op.drop_index('ix_roles_name', table_name='roles')
+    op.drop_index('ix_roles_id', table_name='roles')
+    op.drop_table('roles')
+    op.drop_index('ix_plastic_manufacturers_id', table_name='plastic_manufacturers')
+    op.drop_table('plastic_manufacturers')
+    op.drop_index('ix_groups_name', table_name='groups')
+    op.drop_index('ix_groups_id', table_name='groups')
+    op.drop_table('groups')
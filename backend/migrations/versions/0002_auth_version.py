@@ -0,0 +1,36 @@
+"""auth_version for users and groups
+
+Добавляет users.auth_version и groups.auth_version (INTEGER NOT NULL DEFAULT 0) —
+версию отзыва токенов (см. utils/auth_state.py): токен хранит версии uv/gv и
+перестаёт действовать, когда версия пользователя или группы увеличивается.
+Колонки, которые уже есть в таблице, пропускаются.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    for table in ("users", "groups"):
+        if not _has_column(table, "auth_version"):
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column('auth_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    for table in ("users", "groups"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('auth_version')
@@ -0,0 +1,37 @@
+"""indexes for group-scoped lists and usage filters
+
+Все списки фильтруются по группе; без индексов каждый запрос — полный проход
+по таблице. Составные индексы совпадают с реальными запросами:
+usages по (group_id, timestamp), spools по (group_id, id).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_usages_group_id_timestamp', 'usages', ['group_id', 'timestamp']),
+    ('ix_usages_timestamp', 'usages', ['timestamp']),
+    ('ix_usages_spool_id', 'usages', ['spool_id']),
+    ('ix_usages_project_id', 'usages', ['project_id']),
+    ('ix_spools_group_id_id', 'spools', ['group_id', 'id']),
+    ('ix_projects_group_id', 'projects', ['group_id']),
+    ('ix_users_group_id', 'users', ['group_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
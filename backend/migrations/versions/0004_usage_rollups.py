@@ -0,0 +1,53 @@
+"""usage rollups by group, spool, project and user per day
+
+Сводки трат по дням, которые приложение поддерживает в одной транзакции
+с тратами. При создании таблица заполняется из существующих трат.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+BACKFILL = """
+INSERT INTO usage_rollups (dimension, key_id, group_id, day, grams, usages)
+SELECT '{dimension}', {key}, COALESCE(group_id, 0), DATE(timestamp), SUM(amount_used), COUNT(*)
+FROM usages
+WHERE {key} IS NOT NULL AND timestamp IS NOT NULL
+GROUP BY {key}, COALESCE(group_id, 0), DATE(timestamp)
+"""
+
+KEYS = {
+    'group': 'COALESCE(group_id, 0)',
+    'spool': 'spool_id',
+    'project': 'project_id',
+    'user': 'user_id',
+}
+
+
+def upgrade():
+    op.create_table(
+        'usage_rollups',
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('key_id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('grams', sa.Float(), nullable=False),
+        sa.Column('usages', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('dimension', 'key_id', 'group_id', 'day'),
+    )
+    op.create_index('ix_usage_rollups_dimension_group_id_day', 'usage_rollups', ['dimension', 'group_id', 'day'], unique=False)
+    for dimension, key in KEYS.items():
+        op.execute(BACKFILL.format(dimension=dimension, key=key))
+
+
+def downgrade():
+    op.drop_index('ix_usage_rollups_dimension_group_id_day', table_name='usage_rollups')
+    op.drop_table('usage_rollups')
@@ -0,0 +1,41 @@
+"""burn rate estimates per spool and per material
+
+Оценки скорости расхода (EWMA), которые обновляются на каждую трату.
+Заполняются по истории командой python backfill_burn_rates.py.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'spool_burn_rates',
+        sa.Column('spool_id', sa.Integer(), nullable=False),
+        sa.Column('rate', sa.Float(), nullable=False),
+        sa.Column('last_usage_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('spool_id'),
+    )
+    op.create_table(
+        'material_burn_rates',
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('plastic_type_id', sa.Integer(), nullable=False),
+        sa.Column('color', sa.String(), nullable=False),
+        sa.Column('rate', sa.Float(), nullable=False),
+        sa.Column('last_usage_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('group_id', 'plastic_type_id', 'color'),
+    )
+
+
+def downgrade():
+    op.drop_table('material_burn_rates')
+    op.drop_table('spool_burn_rates')
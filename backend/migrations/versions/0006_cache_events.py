@@ -0,0 +1,32 @@
+"""cache invalidation log shared by worker processes
+
+Журнал изменений, по которому воркеры сбрасывают кэши авторизации
+и версии данных (ETag, отчёты) после записей в других процессах.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'cache_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True,
+    )
+
+
+def downgrade():
+    op.drop_table('cache_events')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -15,6 +15,7 @@ class Group(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     is_active = Column(Integer, default=1)  # 1 - активна, 0 - заблокирована
+    auth_version = Column(Integer, nullable=False, default=0, server_default="0")  # Растёт при блокировке/разблокировке/удалении
     users = relationship("User", back_populates="group")
 
 
@@ -24,8 +25,9 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     role_id = Column(Integer, ForeignKey("roles.id"), nullable=False)
-    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True)
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True, index=True)
     is_active = Column(Integer, default=1)  # 1 - активен, 0 - заблокирован
+    auth_version = Column(Integer, nullable=False, default=0, server_default="0")  # Растёт при блокировке/разблокировке/смене роли/удалении
     role = relationship("Role", back_populates="users")
     group = relationship("Group", back_populates="users")
     plastic_types = relationship("PlasticType", back_populates="user")
@@ -36,13 +38,16 @@ class Project(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)  
     description = Column(String, nullable=True)
-    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True)  # Привязка к группе
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True, index=True)  # Привязка к группе
     group = relationship("Group")
     usages = relationship("Usage", back_populates="project")
 
 
 class Spool(Base):
     __tablename__ = "spools"
+    __table_args__ = (
+        Index("ix_spools_group_id_id", "group_id", "id"),  # Список катушек группы
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     plastic_type_id = Column(Integer, ForeignKey("plastic_types.id"))
@@ -60,15 +65,18 @@ class Spool(Base):
 
 class Usage(Base):
     __tablename__ = "usages"
+    __table_args__ = (
+        Index("ix_usages_group_id_timestamp", "group_id", "timestamp"),  # Траты группы по времени
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    spool_id = Column(Integer, ForeignKey("spools.id"))
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
+    spool_id = Column(Integer, ForeignKey("spools.id"), index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True, index=True)
     group_id = Column(Integer, ForeignKey("groups.id"), nullable=True)  # Привязка к группе
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Пользователь, совершивший трату
     amount_used = Column(Float)
     purpose = Column(String)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
 
     spool = relationship("Spool", back_populates="usages")
     project = relationship("Project", back_populates="usages")
@@ -92,3 +100,47 @@ class PlasticManufacturer(Base):
     info = Column(String, nullable=True)  # Доп. информация о производителе
     empty_spool_weight = Column(Float, nullable=False)  # Вес пустой катушки (граммы)
     spools = relationship("Spool", back_populates="manufacturer")
+
+
+class UsageRollup(Base):
+    # Суммы трат по дням, обновляются в той же транзакции, что и траты (utils/usage_rollups.py).
+    # dimension: group / spool / project / user; key_id — id группы, катушки, проекта или пользователя
+    __tablename__ = "usage_rollups"
+    __table_args__ = (
+        Index("ix_usage_rollups_dimension_group_id_day", "dimension", "group_id", "day"),  # Отчёты группы за период
+    )
+
+    dimension = Column(String, primary_key=True)
+    key_id = Column(Integer, primary_key=True)
+    group_id = Column(Integer, primary_key=True)  # 0 — трата без группы
+    day = Column(Date, primary_key=True)
+    grams = Column(Float, nullable=False, default=0)
+    usages = Column(Integer, nullable=False, default=0)
+
+
+class SpoolBurnRate(Base):
+    # Скорость расхода катушки (г/день), обновляется на каждую трату (utils/burn_rates.py)
+    __tablename__ = "spool_burn_rates"
+    spool_id = Column(Integer, primary_key=True)
+    rate = Column(Float, nullable=False, default=0)  # Значение на момент last_usage_at
+    last_usage_at = Column(DateTime, nullable=False)
+
+
+class MaterialBurnRate(Base):
+    # Скорость расхода материала (тип + цвет) в группе; 0 и "" — тип/цвет не указаны
+    __tablename__ = "material_burn_rates"
+    group_id = Column(Integer, primary_key=True)  # 0 — без группы
+    plastic_type_id = Column(Integer, primary_key=True)
+    color = Column(String, primary_key=True)
+    rate = Column(Float, nullable=False, default=0)
+    last_usage_at = Column(DateTime, nullable=False)
+
+
+class CacheEvent(Base):
+    # Журнал изменений для сброса кэшей в других процессах-воркерах (utils/cache_sync.py).
+    # kind: data (key "таблица:группа"), user, group (key — id), epoch (key — epoch ETag)
+    __tablename__ = "cache_events"
+    __table_args__ = {"sqlite_autoincrement": True}  # id не переиспользуются после очистки журнала
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    key = Column(String, nullable=False)
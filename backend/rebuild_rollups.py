@@ -0,0 +1,37 @@
+import argparse
+import sys
+from database import SessionLocal
+from migrate import upgrade_database
+from utils.usage_rollups import rebuild, verify
+
+# Пересчёт сводок трат (usage_rollups) с нуля и сверка с таблицей usages.
+#   python rebuild_rollups.py           — пересчитать и проверить
+#   python rebuild_rollups.py --verify  — только проверить, код возврата 1 при расхождениях
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Пересчёт и сверка сводок трат")
+    parser.add_argument("--verify", action="store_true", help="только сверка, без пересчёта")
+    args = parser.parse_args()
+
+    upgrade_database()
+    db = SessionLocal()
+    try:
+        if not args.verify:
+            rebuild(db)
+            db.commit()
+            print("Сводки пересчитаны")
+        problems = verify(db)
+    finally:
+        db.close()
+    for problem in problems[:50]:
+        print(problem)
+    if problems:
+        print(f"Расхождений: {len(problems)}")
+        return 1
+    print("Сводки совпадают с тратами")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
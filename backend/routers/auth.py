@@ -1,17 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, Security
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
-from database import SessionLocal
+from database import SessionLocal, SessionRunner, get_async_db
 from models import User, Group, Role
-from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer  # добавлено
+from fastapi.concurrency import run_in_threadpool
 import os
-from dotenv import load_dotenv
+from utils.principal_cache import principal_cache, Principal, RoleInfo, GroupInfo
+from utils.auth_state import auth_state
+from utils.password_hashing import hash_password, verify_password
+from utils.secret_key import SECRET_KEY
 
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 if not SECRET_KEY or not ALGORITHM or not ACCESS_TOKEN_EXPIRE_MINUTES:
@@ -19,17 +20,8 @@ if not SECRET_KEY or not ALGORITHM or not ACCESS_TOKEN_EXPIRE_MINUTES:
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class UserCreate(BaseModel):
     username: str
     password: str
@@ -44,19 +36,57 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def token_claims(user: User) -> dict:
+    # Всё, что нужно для авторизации без БД: id, группа, роль и версии отзыва
+    return {
+        "sub": user.username,
+        "role": user.role.name if user.role else "user",
+        "uid": user.id,
+        "gid": user.group_id,
+        "rid": user.role_id,
+        "uv": user.auth_version or 0,
+        "gv": (user.group.auth_version or 0) if user.group else None,
+    }
+
+def load_principal(db: Session, username: str) -> Principal:
+    # Один запрос: пользователь вместе с ролью и группой
+    user = db.query(User).options(joinedload(User.role), joinedload(User.group)).filter(User.username == username, User.is_active == 1).first()
+    if user is None:
+        raise HTTPException(status_code=401, detail="Пользователь не найден или заблокирован")
+    if not user.role:
+        raise HTTPException(status_code=403, detail="У пользователя не назначена роль")
+    # Проверка: если у пользователя есть группа и она заблокирована
+    if user.group is not None and getattr(user.group, 'is_active', 1) == 0:
+        raise HTTPException(status_code=403, detail="Ваша группа заблокирована. Обратитесь к администратору.")
+    return Principal(
+        id=user.id,
+        username=user.username,
+        role_id=user.role_id,
+        group_id=user.group_id,
+        is_active=user.is_active,
+        role=RoleInfo(id=user.role.id, name=user.role.name),
+        group=GroupInfo(id=user.group.id, name=user.group.name, is_active=user.group.is_active) if user.group else None,
+    )
+
+def _load_and_cache_principal(username: str) -> Principal:
+    db = SessionLocal()
+    try:
+        principal = load_principal(db, username)
+    finally:
+        db.close()
+    principal_cache.put(principal)
+    return principal
+
+# Общая зависимость для всех роутеров.
+# Токены с uid/rid/uv проверяются по карте версий auth_state без запросов к БД;
+# старые токены (только sub) — через кэш principal_cache с загрузкой из БД при промахе.
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -64,18 +94,16 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise HTTPException(status_code=401, detail="Не удалось получить пользователя из токена")
     except JWTError:
         raise HTTPException(status_code=401, detail="Неверный токен")
-    user = db.query(User).filter(User.username == username, User.is_active == 1).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="Пользователь не найден или заблокирован")
-    # Проверка: если у пользователя есть группа и она заблокирована
-    if user.group_id is not None:
-        group = db.query(Group).filter(Group.id == user.group_id).first()
-        if group and getattr(group, 'is_active', 1) == 0:
-            raise HTTPException(status_code=403, detail="Ваша группа заблокирована. Обратитесь к администратору.")
-    return user
+    if "uid" in payload and "rid" in payload and "uv" in payload:
+        if auth_state.needs_db(payload):
+            return await run_in_threadpool(auth_state.check, payload)
+        return auth_state.check(payload)
+    principal = principal_cache.get(username)
+    if principal is None:
+        principal = await run_in_threadpool(_load_and_cache_principal, username)
+    return principal
 
-@router.post("/register", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def _register(db: Session, user: UserCreate, hashed_password: str, current_user: Principal) -> dict:
     # Админ может создавать любых пользователей, модератор — только пользователей с ролью 'user' и только в своей группе
     role = db.query(Role).filter(Role.id == user.role_id).first()
     if not role:
@@ -96,26 +124,45 @@ def register(user: UserCreate, db: Session = Depends(get_db), current_user: User
         raise HTTPException(status_code=403, detail="Нет прав на регистрацию пользователей")
     if db.query(User).filter(User.username == user.username).first():
         raise HTTPException(status_code=400, detail="Пользователь уже существует")
-    hashed_password = get_password_hash(user.password)
     db_user = User(username=user.username, hashed_password=hashed_password, role_id=role.id, group_id=group.id)
     db.add(db_user)
+    db.flush()
+    auth_state.user_changed(db, db_user.id)
     db.commit()
     db.refresh(db_user)
-    access_token = create_access_token(data={"sub": db_user.username, "role": role.name})
+    access_token = create_access_token(data=token_claims(db_user))
     return {"access_token": access_token, "token_type": "bearer"}
 
+@router.post("/register", response_model=Token)
+async def register(user: UserCreate, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    # bcrypt считается в отдельном пуле (utils/password_hashing.py)
+    hashed_password = await hash_password(user.password)
+    return await db.run_sync(_register, user, hashed_password, current_user)
+
+def _find_login_user(db: Session, username: str) -> User | None:
+    return db.query(User).options(joinedload(User.role), joinedload(User.group)).filter(User.username == username, User.is_active == 1).first()
+
+def _save_password_hash(db: Session, db_user: User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    db.commit()
+
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == form_data.username, User.is_active == 1).first()
-    if not db_user or not verify_password(form_data.password, db_user.hashed_password):
-        raise HTTPException(status_code=401, detail="Неверные имя пользователя или пароль или пользователь заблокирован")
-    # Получаем роль пользователя
-    role = db_user.role.name if db_user.role else "user"
-    access_token = create_access_token(data={"sub": db_user.username, "role": role})
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: SessionRunner = Depends(get_async_db)):
+    error = HTTPException(status_code=401, detail="Неверные имя пользователя или пароль или пользователь заблокирован")
+    db_user = await db.run_sync(_find_login_user, form_data.username)
+    if not db_user:
+        raise error
+    valid, new_hash = await verify_password(form_data.password, db_user.hashed_password)
+    if not valid:
+        raise error
+    access_token = create_access_token(data=token_claims(db_user))
+    # Хеш создан с другой стоимостью (BCRYPT_ROUNDS) — перезаписываем прозрачно для пользователя
+    if new_hash:
+        await db.run_sync(_save_password_hash, db_user, new_hash)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me")
-def get_me(current_user: User = Depends(get_current_user)):
+def get_me(current_user: Principal = Depends(get_current_user)):
     # Возвращаем профиль пользователя с ролью и группой
     return {
         "id": current_user.id,
@@ -123,3 +170,11 @@ def get_me(current_user: User = Depends(get_current_user)):
         "role": {"id": current_user.role.id, "name": current_user.role.name} if current_user.role else None,
         "group": {"id": current_user.group.id, "name": current_user.group.name} if current_user.group else None
     }
+
+# Статистика кэша авторизации (только для админа): principal_cache — старые токены (только sub),
+# auth_state — токены с uid/rid/uv, которые выдаёт /auth/login
+@router.get("/cache_stats")
+def get_cache_stats(current_user: Principal = Depends(get_current_user)):
+    if not (current_user.role and current_user.role.name == "admin"):
+        raise HTTPException(status_code=403, detail="Только админ имеет доступ к этому ресурсу")
+    return {**principal_cache.stats(), "auth_state": auth_state.stats()}
@@ -1,35 +1,117 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 import base64
 import json
 import hmac
 import hashlib
-import os
-from dotenv import load_dotenv
+from database import SessionRunner, get_async_db
+from models import Spool, PlasticType, Group, PlasticManufacturer
+from utils.principal_cache import Principal
+from utils.qr_service import spool_qr_path
+from utils.secret_key import SECRET_KEY
 from .spools import get_current_user
 
 router = APIRouter()
 
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY", "default_secret")
+QR_BATCH_LIMIT = 1000  # Кодов в одном запросе /decode_qr/batch
 
 class QRRequest(BaseModel):
     qr: str
 
-@router.post("/decode_qr")
-def decode_qr(data: QRRequest, current_user=Depends(get_current_user)):
+class QRBatchRequest(BaseModel):
+    qrs: list[str]
+
+class QRBatchItem(BaseModel):
+    ok: bool
+    spool: dict | None = None
+    status_code: int | None = None
+    detail: str | None = None
+
+class QRBatchOut(BaseModel):
+    results: dict[str, QRBatchItem]  # Ключ — исходная строка QR
+
+def _decode(qr: str) -> int:
+    # id катушки из "base64(JSON).подпись"; ValueError с причиной, если код неверный
+    try:
+        payload, signature = qr.split('.')
+    except ValueError:
+        raise ValueError("Некорректный QR-код")
+    expected_signature = hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).hexdigest()
+    # Подпись пришла от клиента: сравниваем байты (compare_digest не принимает не-ASCII str)
+    if not hmac.compare_digest(signature.encode(), expected_signature.encode()):
+        raise ValueError("Некорректная подпись QR-кода")
     try:
-        payload, signature = data.qr.split('.')
-        # Проверка подписи (безопасно, если используется)
-        expected_signature = hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).hexdigest()
-        if not hmac.compare_digest(signature, expected_signature):
-            raise HTTPException(status_code=400, detail="Некорректная подпись QR-кода")
-        # Исправлено: urlsafe_b64decode требует padding
+        # urlsafe_b64decode требует padding
         padded = payload + '=' * (-len(payload) % 4)
-        decoded = base64.urlsafe_b64decode(padded).decode()
-        obj = json.loads(decoded)
-        if 'id' not in obj:
-            raise HTTPException(status_code=400, detail="В QR-коде нет id")
-        return {"id": obj['id']}
+        obj = json.loads(base64.urlsafe_b64decode(padded).decode())
     except Exception:
+        raise ValueError("Некорректный QR-код")
+    if not isinstance(obj, dict) or 'id' not in obj:
+        raise ValueError("В QR-коде нет id")
+    if not isinstance(obj['id'], int) or isinstance(obj['id'], bool):
+        raise ValueError("Некорректный id в QR-коде")
+    return obj['id']
+
+@router.post("/decode_qr")
+def decode_qr(data: QRRequest, current_user=Depends(get_current_user)):
+    try:
+        return {"id": _decode(data.qr)}
+    except ValueError:
         raise HTTPException(status_code=400, detail="Некорректный QR-код")
+
+def _decode_qr_batch(db: Session, qrs: list[str], current_user: Principal) -> QRBatchOut:
+    results: dict[str, QRBatchItem] = {}
+    spool_ids: dict[str, int] = {}
+    for qr in dict.fromkeys(qrs):
+        try:
+            spool_ids[qr] = _decode(qr)
+        except ValueError as e:
+            results[qr] = QRBatchItem(ok=False, status_code=400, detail=str(e))
+    # Все катушки с типом, производителем и группой — одним запросом
+    rows = {}
+    if spool_ids:
+        rows = {
+            row.id: row for row in db.execute(
+                select(
+                    Spool.id, Spool.plastic_type_id, Spool.color, Spool.weight_total, Spool.weight_remaining,
+                    Spool.qr_code_path, Spool.group_id, Spool.manufacturer_id, PlasticType.name.label("plastic_type_name"),
+                    Group.name.label("group_name"), PlasticManufacturer.name.label("manufacturer_name"),
+                    PlasticManufacturer.empty_spool_weight,
+                )
+                .outerjoin(PlasticType, PlasticType.id == Spool.plastic_type_id)
+                .outerjoin(Group, Group.id == Spool.group_id)
+                .outerjoin(PlasticManufacturer, PlasticManufacturer.id == Spool.manufacturer_id)
+                .where(Spool.id.in_(set(spool_ids.values())))
+            ).all()
+        }
+    is_admin = current_user.role and current_user.role.name == "admin"
+    for qr, spool_id in spool_ids.items():
+        row = rows.get(spool_id)
+        if row is None:
+            results[qr] = QRBatchItem(ok=False, status_code=404, detail="Катушка не найдена")
+        elif not is_admin and row.group_id != current_user.group_id:
+            results[qr] = QRBatchItem(ok=False, status_code=403, detail="Нет доступа к этой катушке")
+        else:
+            results[qr] = QRBatchItem(ok=True, spool={
+                "id": row.id,
+                "plastic_type_id": row.plastic_type_id,
+                "color": row.color,
+                "weight_total": row.weight_total,
+                "weight_remaining": row.weight_remaining,
+                "qr_code_path": spool_qr_path(row.id, row.qr_code_path),
+                "group_id": row.group_id,
+                "plastic_type": {"id": row.plastic_type_id, "name": row.plastic_type_name} if row.plastic_type_name is not None else None,
+                "group": {"id": row.group_id, "name": row.group_name} if row.group_name is not None else None,
+                "manufacturer": {"id": row.manufacturer_id, "name": row.manufacturer_name, "empty_spool_weight": row.empty_spool_weight}
+                if row.manufacturer_name is not None else None,
+            })
+    return QRBatchOut(results=results)
+
+# Пакетное распознавание: проверка подписей и катушки одним запросом, ошибки — по каждому коду
+@router.post("/decode_qr/batch", response_model=QRBatchOut)
+async def decode_qr_batch(data: QRBatchRequest, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    if len(data.qrs) > QR_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Не больше {QR_BATCH_LIMIT} кодов за раз")
+    return await db.run_sync(_decode_qr_batch, data.qrs, current_user)
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Request
+from sqlalchemy import text
+from database import engine
+
+router = APIRouter()
+
+
+# Живость: процесс отвечает (для перезапуска зависшего контейнера)
+@router.get("/healthz", include_in_schema=False)
+def healthz():
+    return {"status": "ok"}
+
+
+# Готовность: инициализация в lifespan завершена и БД отвечает.
+# entrypoint.sh ждёт её перед init_db.py, балансировщик — перед отправкой трафика
+@router.get("/readyz", include_in_schema=False)
+def readyz(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Приложение запускается")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception:
+        raise HTTPException(status_code=503, detail="База данных недоступна")
+    return {"status": "ready"}
@@ -0,0 +1,49 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from routers.auth import get_current_user
+from utils.principal_cache import Principal
+from utils.metrics import METRICS_TOKEN, render
+from utils import slow_queries
+
+router = APIRouter()
+
+
+# Текстовый формат Prometheus (exposition format 0.0.4).
+# С METRICS_TOKEN — только с этим токеном; без него — только админу с обычным токеном входа
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(authorization: str | None = Header(None)):
+    if METRICS_TOKEN:
+        # Заголовок декодирован как latin-1 и может быть не-ASCII: сравниваем байты
+        if not hmac.compare_digest((authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            raise HTTPException(status_code=401, detail="Неверный токен метрик")
+    else:
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        _admin(await get_current_user(token))
+    # render — в потоке event loop, как и обновление счётчиков в middleware
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _admin(current_user: Principal):
+    if not (current_user.role and current_user.role.name == "admin"):
+        raise HTTPException(status_code=403, detail="Только админ имеет доступ к этому ресурсу")
+
+
+# Журнал медленных SQL-запросов (только для админа), новые первыми
+@router.get("/metrics/slow_queries")
+def get_slow_queries(limit: int | None = None, current_user: Principal = Depends(get_current_user)):
+    _admin(current_user)
+    return {
+        "threshold_ms": slow_queries.SLOW_QUERY_MS,
+        "buffer_size": slow_queries.SLOW_QUERY_BUFFER,
+        "records": slow_queries.records(limit),
+    }
+
+
+@router.delete("/metrics/slow_queries")
+def clear_slow_queries(current_user: Principal = Depends(get_current_user)):
+    _admin(current_user)
+    slow_queries.clear()
+    return {"ok": True}
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from database import SessionLocal
-from models import PlasticManufacturer, User
+from models import PlasticManufacturer
 from pydantic import BaseModel
-from routers.spools import get_current_user
+from routers.auth import get_current_user
+from utils.principal_cache import Principal
+from utils.data_versions import data_versions
+from utils.conditional import versions_etag, not_modified
 
 router = APIRouter()
 
@@ -28,31 +31,38 @@ class ManufacturerOut(BaseModel):
         from_attributes = True
 
 @router.post("/", response_model=ManufacturerOut)
-def create_manufacturer(manufacturer: ManufacturerCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_manufacturer(manufacturer: ManufacturerCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     if db.query(PlasticManufacturer).filter_by(name=manufacturer.name).first():
         raise HTTPException(status_code=400, detail="Производитель с таким именем уже существует")
     new_man = PlasticManufacturer(**manufacturer.dict())
     db.add(new_man)
+    data_versions.bump(db, "plastic_manufacturers")
     db.commit()
     db.refresh(new_man)
     return new_man
 
 @router.get("/", response_model=list[ManufacturerOut])
-def get_manufacturers(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_manufacturers(request: Request, response: Response, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    etag = versions_etag(request, current_user, "plastic_manufacturers")
+    if cached := not_modified(request, response, etag):
+        return cached
     return db.query(PlasticManufacturer).all()
 
 @router.get("/{manufacturer_id}", response_model=ManufacturerOut)
-def get_manufacturer(manufacturer_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_manufacturer(manufacturer_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     man = db.query(PlasticManufacturer).get(manufacturer_id)
     if not man:
         raise HTTPException(status_code=404, detail="Производитель не найден")
     return man
 
 @router.delete("/{manufacturer_id}", status_code=204)
-def delete_manufacturer(manufacturer_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def delete_manufacturer(manufacturer_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     man = db.query(PlasticManufacturer).get(manufacturer_id)
     if not man:
         raise HTTPException(status_code=404, detail="Производитель не найден")
     db.delete(man)
+    # У катушек этого производителя manufacturer_id становится NULL
+    data_versions.bump(db, "plastic_manufacturers")
+    data_versions.bump(db, "spools")
     db.commit()
     return None
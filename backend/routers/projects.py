@@ -1,29 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from database import SessionLocal
-from models import Project, User, Group
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-import os
-from dotenv import load_dotenv
+from database import SessionRunner, get_async_db
+from models import Project, Group
+from routers.auth import get_current_user
+from utils.principal_cache import Principal
+from utils.usage_rollups import forget as forget_rollups
+from utils.data_versions import data_versions
+from utils.conditional import versions_etag, not_modified
+from utils.fast_json import FAST_JSON, rows_response
 
 router = APIRouter()
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-if not SECRET_KEY or not ALGORITHM:
-    raise RuntimeError("SECRET_KEY и ALGORITHM должны быть заданы в .env")
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class ProjectCreate(BaseModel):
     name: str
     description: str | None = None
@@ -37,30 +25,7 @@ class ProjectOut(BaseModel):
     class Config:
         from_attributes = True
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Не удалось получить пользователя из токена")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Неверный токен")
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="Пользователь не найден")
-    # Проверка: если у пользователя есть группа и она заблокирована
-    if user.group_id is not None:
-        group = db.query(Group).filter(Group.id == user.group_id).first()
-        if group and getattr(group, 'is_active', 1) == 0:
-            raise HTTPException(status_code=403, detail="Ваша группа заблокирована. Обратитесь к администратору.")
-    return user
-
-@router.post("/", response_model=ProjectOut)
-def create_project(
-    project: ProjectCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+def _create_project(db: Session, project: ProjectCreate, current_user: Principal):
     is_admin = current_user.role and current_user.role.name == "admin"
     # --- Проверка группы ---
     if is_admin and project.group_id:
@@ -76,19 +41,35 @@ def create_project(
         raise HTTPException(status_code=400, detail="Проект с таким именем уже существует в этой группе")
     db_project = Project(name=project.name, description=project.description, group_id=group_id)
     db.add(db_project)
+    data_versions.bump(db, "projects", group_id)
     db.commit()
     db.refresh(db_project)
-    return db_project
+    return ProjectOut.model_validate(db_project)
 
-@router.get("/", response_model=list[ProjectOut])
-def get_projects(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.post("/", response_model=ProjectOut)
+async def create_project(project: ProjectCreate, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run_sync(_create_project, project, current_user)
+
+def _get_projects(db: Session, current_user: Principal):
     is_admin = current_user.role and current_user.role.name == "admin"
     if is_admin:
-        return db.query(Project).all()
-    return db.query(Project).filter(Project.group_id == current_user.group_id).all()
+        projects = db.query(Project.id, Project.name, Project.description, Project.group_id).all()
+    else:
+        projects = db.query(Project.id, Project.name, Project.description, Project.group_id).filter(Project.group_id == current_user.group_id).all()
+    # Колонки совпадают с ProjectOut; схему проверяет только response_model (или никто при FAST_JSON)
+    return [dict(p._mapping) for p in projects]
 
-@router.delete("/{project_id}", status_code=200)
-def delete_project(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.get("/", response_model=list[ProjectOut])
+async def get_projects(request: Request, response: Response, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    etag = versions_etag(request, current_user, "projects")
+    if cached := not_modified(request, response, etag):
+        return cached
+    projects = await db.run_sync(_get_projects, current_user)
+    if FAST_JSON:
+        return rows_response(projects, response)
+    return projects
+
+def _delete_project(db: Session, project_id: int, current_user: Principal):
     if not current_user.role or (current_user.role.name not in ["admin", "moderator"]):
         raise HTTPException(status_code=403, detail="Нет прав на удаление проекта")
     project = db.query(Project).filter(Project.id == project_id).first()
@@ -96,6 +77,13 @@ def delete_project(project_id: int, db: Session = Depends(get_db), current_user:
         raise HTTPException(status_code=404, detail="Проект не найден")
     if current_user.role.name == "moderator" and project.group_id != current_user.group_id:
         raise HTTPException(status_code=403, detail="Модератор может удалять только проекты своей группы")
+    data_versions.bump(db, "projects", project.group_id)
+    data_versions.bump(db, "usages", project.group_id)
     db.delete(project)
+    forget_rollups(db, "project", project_id)
     db.commit()
     return {"ok": True}
+
+@router.delete("/{project_id}", status_code=200)
+async def delete_project(project_id: int, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run_sync(_delete_project, project_id, current_user)
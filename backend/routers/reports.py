@@ -0,0 +1,248 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, func, cast, Date, String, literal
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from database import SessionRunner, get_async_db, IS_SQLITE
+from models import Usage, UsageRollup, Spool, PlasticType, PlasticManufacturer, Project, User, SpoolBurnRate, MaterialBurnRate
+from routers.auth import get_current_user
+from utils.principal_cache import Principal
+from utils.data_versions import data_versions, ALL_GROUPS
+from utils.lru import LRUCache
+from utils.usage_rollups import NO_GROUP
+from utils.burn_rates import decayed
+
+router = APIRouter()
+
+# Отчёты по расходу пластика: граммы по часам/дням/неделям/месяцам с разбивкой.
+# Дни, недели и месяцы считаются по сводке usage_rollups (сотни строк за год),
+# часы — по самим тратам за ограниченный период. Всё суммируется в SQL (GROUP BY).
+
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))  # Готовых отчётов в кэше
+REPORT_HOURLY_MAX_DAYS = 31  # Почасовой отчёт читает траты напрямую, поэтому период ограничен
+REPORT_DEFAULT_DAYS = 30
+
+report_cache = LRUCache(REPORT_CACHE_SIZE)
+
+Bucket = Literal["hour", "day", "week", "month"]
+Breakdown = Literal["type", "color", "manufacturer", "project", "user"]
+
+# Таблицы, от которых зависит результат (для ключа кэша)
+BREAKDOWN_TABLES = {
+    None: (),
+    "type": ("spools", "plastic_types"),
+    "color": ("spools",),
+    "manufacturer": ("spools", "plastic_manufacturers"),
+    "project": ("projects",),
+    "user": ("users",),
+}
+
+class ReportRow(BaseModel):
+    bucket: str  # Начало интервала: 2026-01-05 (день/неделя/месяц) или 2026-01-05 14:00:00 (час)
+    key: int | str | None = None  # id типа/производителя/проекта/пользователя или цвет
+    label: str | None = None
+    grams: float
+    usages: int
+
+class DepletingSpool(BaseModel):
+    spool_id: int
+    group_id: int | None = None
+    plastic_type_id: int | None = None
+    plastic_type: str | None = None
+    color: str | None = None
+    weight_remaining: float
+    rate_per_day: float  # Текущая оценка расхода, г/день
+    days_left: float
+
+class DepletingMaterial(BaseModel):
+    group_id: int | None = None
+    plastic_type_id: int | None = None
+    plastic_type: str | None = None
+    color: str | None = None
+    weight_remaining: float  # Остаток на всех катушках группы этого типа и цвета
+    spools: int
+    rate_per_day: float
+    days_left: float
+
+class DepletionOut(BaseModel):
+    days: int
+    spools: list[DepletingSpool]
+    materials: list[DepletingMaterial]
+
+def _scope(current_user: Principal, group_id: int | None):
+    # Те же правила, что и в routers/usage.py: админ видит все группы (или выбранную), остальные — свою
+    is_admin = current_user.role and current_user.role.name == "admin"
+    if is_admin:
+        return group_id if group_id is not None else ALL_GROUPS
+    return current_user.group_id if current_user.group_id is not None else NO_GROUP
+
+def _bucket_expr(column, bucket: str):
+    if IS_SQLITE:
+        if bucket == "hour":
+            return func.strftime("%Y-%m-%d %H:00:00", column)
+        if bucket == "day":
+            return func.date(column)
+        if bucket == "week":
+            # Понедельник той же недели
+            return func.date(column, "-6 days", "weekday 1")
+        return func.strftime("%Y-%m-01", column)
+    if bucket == "hour":
+        return cast(func.date_trunc("hour", column), String)
+    return cast(cast(func.date_trunc(bucket, column), Date), String)
+
+def _report(db: Session, group_id: object, bucket: str, by: str | None, date_from: date, date_to: date):
+    if bucket == "hour":
+        # Почасовой отчёт — по тратам
+        period = _bucket_expr(Usage.timestamp, bucket)
+        grams, count = func.sum(Usage.amount_used), func.count()
+        stmt = select(period.label("bucket")).where(
+            Usage.timestamp >= datetime.combine(date_from, datetime.min.time()),
+            Usage.timestamp < datetime.combine(date_to, datetime.min.time()),
+        )
+        if group_id != ALL_GROUPS:
+            stmt = stmt.where(Usage.group_id == (None if group_id == NO_GROUP else group_id))
+        spool_key, project_key, user_key = Usage.spool_id, Usage.project_id, Usage.user_id
+        source = Usage
+    else:
+        # Дни, недели, месяцы — по сводке; разрез катушек нужен для типа, цвета и производителя
+        dimension = {"type": "spool", "color": "spool", "manufacturer": "spool", "project": "project", "user": "user"}.get(by, "group")
+        period = _bucket_expr(UsageRollup.day, bucket)
+        grams, count = func.sum(UsageRollup.grams), func.sum(UsageRollup.usages)
+        stmt = select(period.label("bucket")).where(
+            UsageRollup.dimension == dimension, UsageRollup.day >= date_from, UsageRollup.day < date_to,
+        )
+        if group_id != ALL_GROUPS:
+            stmt = stmt.where(UsageRollup.group_id == group_id)
+        spool_key = project_key = user_key = UsageRollup.key_id
+        source = UsageRollup
+
+    if by in ("type", "color", "manufacturer"):
+        stmt = stmt.join(Spool, Spool.id == spool_key)
+    if by == "type":
+        key, label = Spool.plastic_type_id, PlasticType.name
+        stmt = stmt.outerjoin(PlasticType, PlasticType.id == Spool.plastic_type_id)
+    elif by == "color":
+        key, label = Spool.color, Spool.color
+    elif by == "manufacturer":
+        key, label = Spool.manufacturer_id, PlasticManufacturer.name
+        stmt = stmt.outerjoin(PlasticManufacturer, PlasticManufacturer.id == Spool.manufacturer_id)
+    elif by == "project":
+        key, label = project_key, Project.name
+        stmt = stmt.outerjoin(Project, Project.id == project_key)
+        if source is Usage:
+            stmt = stmt.where(Usage.project_id.is_not(None))
+    elif by == "user":
+        key, label = user_key, User.username
+        stmt = stmt.outerjoin(User, User.id == user_key)
+        if source is Usage:
+            stmt = stmt.where(Usage.user_id.is_not(None))
+    else:
+        key = label = None
+
+    # Строки сводки, обнулённые удалением трат, в отчёт не попадают
+    stmt = stmt.having(count != 0)
+    if key is None:
+        stmt = stmt.add_columns(grams.label("grams"), count.label("usages")).group_by(period).order_by(period)
+    else:
+        stmt = stmt.add_columns(key.label("key"), label.label("label"), grams.label("grams"), count.label("usages"))
+        stmt = stmt.group_by(period, key, label).order_by(period, key)
+    return [
+        ReportRow(bucket=str(row.bucket), key=row.key if key is not None else None,
+                  label=row.label if key is not None else None, grams=row.grams or 0.0, usages=row.usages or 0)
+        for row in db.execute(stmt)
+    ]
+
+# 📊 GET /reports/consumption?bucket=day&by=type — граммы по интервалам с разбивкой
+@router.get("/consumption", response_model=list[ReportRow])
+async def consumption(bucket: Bucket = "day", by: Breakdown | None = None, date_from: date | None = None,
+                      date_to: date | None = None, group_id: int | None = None,
+                      db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    scope = _scope(current_user, group_id)
+    date_to = date_to or datetime.utcnow().date() + timedelta(days=1)  # Граница не включается (даты в UTC)
+    date_from = date_from or date_to - timedelta(days=REPORT_DEFAULT_DAYS)
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="date_from должна быть раньше date_to")
+    if bucket == "hour" and (date_to - date_from).days > REPORT_HOURLY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Почасовой отчёт — не больше {REPORT_HOURLY_MAX_DAYS} дней")
+    # Ключ кэша: группа, параметры запроса и версии всех таблиц, из которых строится отчёт
+    version_group = ALL_GROUPS if scope == ALL_GROUPS else (None if scope == NO_GROUP else scope)
+    versions = tuple(data_versions.get(table, version_group) for table in ("usages",) + BREAKDOWN_TABLES[by])
+    cache_key = (scope, bucket, by, date_from, date_to, versions)
+    result = report_cache.get(cache_key)
+    if result is None:
+        result = await db.run_sync(_report, scope, bucket, by, date_from, date_to)
+        report_cache.put(cache_key, result)
+    return result
+
+def _depletion(db: Session, group_id: object, days: int, now: datetime):
+    # Только готовые оценки из spool_burn_rates/material_burn_rates, без чтения трат.
+    # В SQL отсекаются заведомо далёкие (остаток > rate * days; rate не убывает до now),
+    # затухание до текущего момента считается для оставшихся строк
+    spool_stmt = (
+        select(Spool.id, Spool.group_id, Spool.plastic_type_id, PlasticType.name.label("plastic_type"), Spool.color,
+               Spool.weight_remaining, SpoolBurnRate.rate, SpoolBurnRate.last_usage_at)
+        .join(SpoolBurnRate, SpoolBurnRate.spool_id == Spool.id)
+        .outerjoin(PlasticType, PlasticType.id == Spool.plastic_type_id)
+        .where(SpoolBurnRate.rate > 0, Spool.weight_remaining <= SpoolBurnRate.rate * days)
+    )
+    if group_id != ALL_GROUPS:
+        spool_stmt = spool_stmt.where(Spool.group_id == (None if group_id == NO_GROUP else group_id))
+    spools = []
+    for row in db.execute(spool_stmt):
+        rate = decayed(row.rate, row.last_usage_at, now)
+        days_left = (row.weight_remaining or 0.0) / rate if rate > 0 else float("inf")
+        if days_left <= days:
+            spools.append(DepletingSpool(
+                spool_id=row.id, group_id=row.group_id, plastic_type_id=row.plastic_type_id, plastic_type=row.plastic_type,
+                color=row.color, weight_remaining=row.weight_remaining or 0.0, rate_per_day=rate, days_left=days_left,
+            ))
+
+    # Остаток материала — сумма по катушкам группы с тем же типом и цветом
+    stock = (
+        select(
+            func.coalesce(Spool.group_id, NO_GROUP).label("group_id"),
+            func.coalesce(Spool.plastic_type_id, 0).label("plastic_type_id"),
+            func.coalesce(Spool.color, "").label("color"),
+            func.sum(Spool.weight_remaining).label("weight_remaining"),
+            func.count().label("spools"),
+        )
+        .group_by(func.coalesce(Spool.group_id, NO_GROUP), func.coalesce(Spool.plastic_type_id, 0), func.coalesce(Spool.color, ""))
+    )
+    if group_id != ALL_GROUPS:
+        stock = stock.where(func.coalesce(Spool.group_id, NO_GROUP) == group_id)
+    stock = stock.subquery()
+    remaining = func.coalesce(stock.c.weight_remaining, 0.0)
+    material_stmt = (
+        select(MaterialBurnRate, PlasticType.name.label("plastic_type"), remaining.label("weight_remaining"),
+               func.coalesce(stock.c.spools, literal(0)).label("spools"))
+        .outerjoin(stock, (stock.c.group_id == MaterialBurnRate.group_id)
+                   & (stock.c.plastic_type_id == MaterialBurnRate.plastic_type_id)
+                   & (stock.c.color == MaterialBurnRate.color))
+        .outerjoin(PlasticType, PlasticType.id == MaterialBurnRate.plastic_type_id)
+        .where(MaterialBurnRate.rate > 0, remaining <= MaterialBurnRate.rate * days)
+    )
+    if group_id != ALL_GROUPS:
+        material_stmt = material_stmt.where(MaterialBurnRate.group_id == group_id)
+    materials = []
+    for material, plastic_type, weight_remaining, spool_count in db.execute(material_stmt):
+        rate = decayed(material.rate, material.last_usage_at, now)
+        days_left = weight_remaining / rate if rate > 0 else float("inf")
+        if days_left <= days:
+            materials.append(DepletingMaterial(
+                group_id=material.group_id or None, plastic_type_id=material.plastic_type_id or None, plastic_type=plastic_type,
+                color=material.color or None, weight_remaining=weight_remaining, spools=spool_count, rate_per_day=rate, days_left=days_left,
+            ))
+    spools.sort(key=lambda s: s.days_left)
+    materials.sort(key=lambda m: m.days_left)
+    return DepletionOut(days=days, spools=spools, materials=materials)
+
+# ⏳ GET /reports/depletion?days=14 — катушки и материалы, которые закончатся за N дней
+@router.get("/depletion", response_model=DepletionOut)
+async def depletion(days: int = 14, group_id: int | None = None, db: SessionRunner = Depends(get_async_db),
+                    current_user: Principal = Depends(get_current_user)):
+    if days < 1 or days > 3650:
+        raise HTTPException(status_code=400, detail="days должен быть от 1 до 3650")
+    scope = _scope(current_user, group_id)
+    return await db.run_sync(_depletion, scope, days, datetime.utcnow())
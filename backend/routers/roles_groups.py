@@ -1,23 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 from database import SessionLocal
 from models import Role, Group, User
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-import os
-from dotenv import load_dotenv
-from passlib.context import CryptContext
-
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-if not SECRET_KEY or not ALGORITHM:
-    raise RuntimeError("SECRET_KEY и ALGORITHM должны быть заданы в .env")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+from fastapi.concurrency import run_in_threadpool
+from routers.auth import get_current_user
+from utils.principal_cache import Principal
+from utils.auth_state import auth_state, bump_version
+from utils.password_hashing import hash_password
+from utils.data_versions import data_versions
+from utils.conditional import versions_etag, not_modified
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def get_db():
     db = SessionLocal()
@@ -26,29 +20,8 @@ def get_db():
     finally:
         db.close()
 
-# --- Проверка пользователя и роль админа ---
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            raise HTTPException(status_code=401, detail="Не удалось получить пользователя из токена")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Неверный токен")
-    # ВАЖНО: подгружаем роль пользователя сразу!
-    user = db.query(User).options(joinedload(User.role)).filter(User.username == username, User.is_active == 1).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="Пользователь не найден или заблокирован")
-    if not user.role:
-        raise HTTPException(status_code=403, detail="У пользователя не назначена роль")
-    # Проверка: если у пользователя есть группа и она заблокирована
-    if user.group_id is not None:
-        group = db.query(Group).filter(Group.id == user.group_id).first()
-        if group and getattr(group, 'is_active', 1) == 0:
-            raise HTTPException(status_code=403, detail="Ваша группа заблокирована. Обратитесь к администратору.")
-    return user
-
-def admin_required(current_user: User = Depends(get_current_user)):
+# --- Проверка роли админа ---
+def admin_required(current_user: Principal = Depends(get_current_user)):
     if not (current_user.role and current_user.role.name == "admin"):
         raise HTTPException(status_code=403, detail="Только админ имеет доступ к этому ресурсу")
     return current_user
@@ -65,7 +38,7 @@ class RoleOut(BaseModel):
 
 
 @router.get("/roles/", response_model=list[RoleOut])
-def get_roles(db: Session = Depends(get_db), current_user: User = Depends(admin_required)):
+def get_roles(db: Session = Depends(get_db), current_user: Principal = Depends(admin_required)):
     return db.query(Role).all()
 
 # --- CRUD для групп ---
@@ -80,17 +53,21 @@ class GroupOut(BaseModel):
         from_attributes = True
 
 @router.post("/groups/", response_model=GroupOut)
-def create_group(group: GroupCreate, db: Session = Depends(get_db), current_user: User = Depends(admin_required)):
+def create_group(group: GroupCreate, db: Session = Depends(get_db), current_user: Principal = Depends(admin_required)):
     if db.query(Group).filter(Group.name == group.name).first():
         raise HTTPException(status_code=400, detail="Группа уже существует")
     db_group = Group(name=group.name)
     db.add(db_group)
+    data_versions.bump(db, "groups")
     db.commit()
     db.refresh(db_group)
     return db_group
 
 @router.get("/groups/", response_model=list[GroupOut])
-def get_groups(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_groups(request: Request, response: Response, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    etag = versions_etag(request, current_user, "groups")
+    if cached := not_modified(request, response, etag):
+        return cached
     if current_user.role and current_user.role.name == "admin":
         return db.query(Group).all()
     # Для не-админа — все активные группы
@@ -103,7 +80,7 @@ def get_groups(db: Session = Depends(get_db), current_user: User = Depends(get_c
     return [GroupOut(id=g.id, name=g.name, is_active=g.is_active) for g in groups]
 
 @router.delete("/groups/{group_id}", response_model=dict)
-def delete_group(group_id: int, db: Session = Depends(get_db), current_user: User = Depends(admin_required)):
+def delete_group(group_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(admin_required)):
     group = db.query(Group).filter(Group.id == group_id).first()
     if not group:
         raise HTTPException(status_code=404, detail="Группа не найдена")
@@ -111,11 +88,14 @@ def delete_group(group_id: int, db: Session = Depends(get_db), current_user: Use
     if current_user.group_id == group_id:
         raise HTTPException(status_code=403, detail="Нельзя удалить свою собственную группу")
     db.delete(group)
+    auth_state.group_changed(db, group_id)
+    data_versions.bump(db, "groups")
+    data_versions.bump(db, "users", group_id)
     db.commit()
     return {"ok": True}
 
 @router.put("/groups/{group_id}/block", response_model=dict)
-def block_group(group_id: int, db: Session = Depends(get_db), current_user: User = Depends(admin_required)):
+def block_group(group_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(admin_required)):
     group = db.query(Group).filter(Group.id == group_id).first()
     if not group:
         raise HTTPException(status_code=404, detail="Группа не найдена")
@@ -127,15 +107,21 @@ def block_group(group_id: int, db: Session = Depends(get_db), current_user: User
     if admins:
         raise HTTPException(status_code=403, detail="Нельзя блокировать группу, где есть админ")
     group.is_active = 0
+    bump_version(group)
+    auth_state.group_changed(db, group_id)
+    data_versions.bump(db, "groups")
     db.commit()
     return {"ok": True}
 
 @router.put("/groups/{group_id}/unblock", response_model=dict)
-def unblock_group(group_id: int, db: Session = Depends(get_db), current_user: User = Depends(admin_required)):
+def unblock_group(group_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(admin_required)):
     group = db.query(Group).filter(Group.id == group_id).first()
     if not group:
         raise HTTPException(status_code=404, detail="Группа не найдена")
     group.is_active = 1
+    bump_version(group)
+    auth_state.group_changed(db, group_id)
+    data_versions.bump(db, "groups")
     db.commit()
     return {"ok": True}
 
@@ -156,7 +142,7 @@ class UserOut(BaseModel):
         from_attributes = True
 
 @router.get("/users/", response_model=list[UserOut])
-def get_users(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_users(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     if current_user.role and current_user.role.name == "admin":
         users = db.query(User).options(joinedload(User.role), joinedload(User.group)).all()
     elif current_user.role and current_user.role.name == "moderator":
@@ -165,8 +151,7 @@ def get_users(db: Session = Depends(get_db), current_user: User = Depends(get_cu
         raise HTTPException(status_code=403, detail="Нет доступа")
     return users
 
-@router.post("/users/", response_model=UserOut)
-def create_user(user: UserCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def _create_user(db: Session, user: UserCreate, hashed_password: str, current_user: Principal):
     # Проверка роли
     if current_user.role.name == "admin":
         pass  # админ может всё
@@ -182,8 +167,6 @@ def create_user(user: UserCreate, db: Session = Depends(get_db), current_user: U
     # Проверка уникальности
     if db.query(User).filter(User.username == user.username).first():
         raise HTTPException(status_code=400, detail="Пользователь уже существует")
-    # Хеширование пароля
-    hashed_password = pwd_context.hash(user.password)
     db_user = User(
         username=user.username,
         hashed_password=hashed_password,
@@ -192,14 +175,24 @@ def create_user(user: UserCreate, db: Session = Depends(get_db), current_user: U
         is_active=1
     )
     db.add(db_user)
+    db.flush()
+    # id мог принадлежать удалённому пользователю — сбрасываем его "надгробие"
+    auth_state.user_changed(db, db_user.id)
+    data_versions.bump(db, "users", db_user.group_id)
     db.commit()
     # Подгружаем роль и группу для корректного возврата
     db.refresh(db_user)
     db_user = db.query(User).options(joinedload(User.role), joinedload(User.group)).filter(User.id == db_user.id).first()
     return db_user
 
+@router.post("/users/", response_model=UserOut)
+async def create_user(user: UserCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    # Хеширование пароля в отдельном пуле (utils/password_hashing.py), не занимая потоки anyio
+    hashed_password = await hash_password(user.password)
+    return await run_in_threadpool(_create_user, db, user, hashed_password, current_user)
+
 @router.delete("/users/{user_id}", response_model=dict)
-def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def delete_user(user_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -210,12 +203,14 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User
             raise HTTPException(status_code=403, detail="Нет доступа к удалению этого пользователя")
     else:
         raise HTTPException(status_code=403, detail="Нет доступа")
+    auth_state.user_changed(db, user_id)
+    data_versions.bump(db, "users", user.group_id)
     db.delete(user)
     db.commit()
     return {"ok": True}
 
 @router.put("/users/{user_id}/block", response_model=dict)
-def block_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def block_user(user_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -227,11 +222,14 @@ def block_user(user_id: int, db: Session = Depends(get_db), current_user: User =
     else:
         raise HTTPException(status_code=403, detail="Нет доступа")
     user.is_active = 0
+    bump_version(user)
+    auth_state.user_changed(db, user_id)
+    data_versions.bump(db, "users", user.group_id)
     db.commit()
     return {"ok": True}
 
 @router.put("/users/{user_id}/unblock", response_model=dict)
-def unblock_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def unblock_user(user_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -243,6 +241,9 @@ def unblock_user(user_id: int, db: Session = Depends(get_db), current_user: User
     else:
         raise HTTPException(status_code=403, detail="Нет доступа")
     user.is_active = 1
+    bump_version(user)
+    auth_state.user_changed(db, user_id)
+    data_versions.bump(db, "users", user.group_id)
     db.commit()
     return {"ok": True}
 
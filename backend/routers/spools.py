@@ -1,31 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import Spool, User, PlasticType, Group
+from database import SessionRunner, get_async_db
+from models import Spool, PlasticType, Group, PlasticManufacturer
 from pydantic import BaseModel
-from utils.qr_generator import generate_qr
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from utils.qr_worker import submit_spool_qr
+from utils.qr_service import QR_PERSIST, QRFormat, spool_qr_data, load_spool_qr_data, load_user_spool_qr_data, qr_response, spool_qr_path, verify_image_signature, link_expiry
 import os
-from dotenv import load_dotenv
-from fastapi.responses import FileResponse
+from routers.auth import get_current_user
+from utils.principal_cache import Principal
+from utils.usage_rollups import forget as forget_rollups
+from utils.data_versions import data_versions
+from utils.burn_rates import forget_spool as forget_burn_rate
+from utils.pagination import page_limit, encode_cursor, decode_cursor, set_next_cursor
+from utils.conditional import versions_etag, not_modified
+from utils.fast_json import FAST_JSON, rows_response
+from utils.qr_generator import sign_payload
+from utils import labels
 
 router = APIRouter()
 
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-if not SECRET_KEY or not ALGORITHM:
-    raise RuntimeError("SECRET_KEY и ALGORITHM должны быть заданы в .env")
-
-# 📥 Зависимость подключения к БД
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # 🧾 Pydantic-схемы
 class SpoolCreate(BaseModel):
     plastic_type_id: int
@@ -41,36 +37,22 @@ class SpoolOut(BaseModel):
     color: str
     weight_total: float
     weight_remaining: float
-    qr_code_path: str
+    qr_code_path: str | None = None  # Файл на диске или подписанная ссылка /spools/{id}/qr.png
     group_id: int | None = None
     manufacturer_name: str | None = None
     empty_spool_weight: float | None = None
     class Config:
         from_attributes = True
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Не удалось получить пользователя из токена")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Неверный токен")
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="Пользователь не найден")
-    # Проверка: если у пользователя есть группа и она заблокирована
-    if user.group_id is not None:
-        group = db.query(Group).filter(Group.id == user.group_id).first()
-        if group and getattr(group, 'is_active', 1) == 0:
-            raise HTTPException(status_code=403, detail="Ваша группа заблокирована. Обратитесь к администратору.")
-    return user
+class LabelRequest(BaseModel):
+    spool_ids: list[int] | None = None  # Явный список; иначе — фильтр как в GET /spools
+    plastic_type_id: int | None = None
+    color: str | None = None
+    manufacturer_id: int | None = None
+    max_remaining: float | None = None
+    format: Literal["pdf", "png"] = "pdf"  # png — ZIP с PNG по странице
 
-# ➕ POST /spools
-@router.post("/", response_model=SpoolOut)
-def create_spool(spool: SpoolCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def _create_spool(db: Session, spool: SpoolCreate, current_user: Principal):
     is_admin = current_user.role and current_user.role.name == "admin"
     if is_admin and spool.group_id:
         group_id = spool.group_id
@@ -90,64 +72,166 @@ def create_spool(spool: SpoolCreate, db: Session = Depends(get_db), current_user
         manufacturer_id=spool.manufacturer_id  # Сохраняем производителя
     )
     db.add(new_spool)
-    db.commit()
-    db.refresh(new_spool)
-    # Формируем полезную нагрузку для QR-кода
-    qr_data = {
-        "id": new_spool.id,
-        "plastic_type": plastic_type.name if plastic_type else str(new_spool.plastic_type_id),
-        "color": new_spool.color,
-        "group": None,
-        "created_at": str(new_spool.id)  # Можно заменить на дату, если есть поле
-    }
+    db.flush()
+    # Полезная нагрузка для QR-кода; PNG на диск (если нужен) пишется в фоне (utils/qr_worker.py)
+    group_name = None
     if new_spool.group_id:
-        group = db.query(Group).get(new_spool.group_id)
-        qr_data["group"] = group.name if group else str(new_spool.group_id)
-    qr_path = generate_qr(qr_data)
-    new_spool.qr_code_path = qr_path
+        group = db.query(Group.name).filter(Group.id == new_spool.group_id).first()
+        group_name = group.name if group else str(new_spool.group_id)
+    qr_data = spool_qr_data(new_spool.id, plastic_type.name, new_spool.color, group_name)
+    result = SpoolOut.model_validate(new_spool)
+    result.qr_code_path = spool_qr_path(new_spool.id, None)
+    data_versions.bump(db, "spools", group_id)
     db.commit()
-    return new_spool
+    if QR_PERSIST:
+        submit_spool_qr(qr_data, group_id)
+    return result
 
-# 📄 GET /spools
-@router.get("/", response_model=list[SpoolOut])
-def get_spools(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+# ➕ POST /spools
+@router.post("/", response_model=SpoolOut)
+async def create_spool(spool: SpoolCreate, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run_sync(_create_spool, spool, current_user)
+
+# Колонки для SpoolOut: катушка и производитель одним запросом с LEFT JOIN
+SPOOL_OUT_COLUMNS = (
+    Spool.id,
+    Spool.plastic_type_id,
+    Spool.color,
+    Spool.weight_total,
+    Spool.weight_remaining,
+    Spool.qr_code_path,
+    Spool.group_id,
+    PlasticManufacturer.name.label("manufacturer_name"),
+    PlasticManufacturer.empty_spool_weight,
+)
+
+def _get_spools(db: Session, current_user: Principal, limit: int, cursor: str | None, plastic_type_id: int | None,
+                color: str | None, manufacturer_id: int | None, max_remaining: float | None):
     is_admin = current_user.role and current_user.role.name == "admin"
-    spools = db.query(Spool).all() if is_admin else db.query(Spool).filter(Spool.group_id == current_user.group_id).all()
-    result = []
-    for spool in spools:
-        manufacturer = spool.manufacturer
-        result.append(SpoolOut(
-            id=spool.id,
-            plastic_type_id=spool.plastic_type_id,
-            color=spool.color,
-            weight_total=spool.weight_total,
-            weight_remaining=spool.weight_remaining,
-            qr_code_path=spool.qr_code_path,
-            group_id=spool.group_id,
-            manufacturer_name=manufacturer.name if manufacturer else None,
-            empty_spool_weight=manufacturer.empty_spool_weight if manufacturer else None
-        ))
-    return result
+    stmt = select(*SPOOL_OUT_COLUMNS).outerjoin(PlasticManufacturer, PlasticManufacturer.id == Spool.manufacturer_id)
+    if not is_admin:
+        stmt = stmt.where(Spool.group_id == current_user.group_id)
+    if plastic_type_id is not None:
+        stmt = stmt.where(Spool.plastic_type_id == plastic_type_id)
+    if color is not None:
+        stmt = stmt.where(Spool.color == color)
+    if manufacturer_id is not None:
+        stmt = stmt.where(Spool.manufacturer_id == manufacturer_id)
+    if max_remaining is not None:
+        # Заканчивающиеся катушки: остаток не больше заданного (граммы)
+        stmt = stmt.where(Spool.weight_remaining <= max_remaining)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        if not isinstance(last_id, int):
+            raise HTTPException(status_code=400, detail="Неверный курсор")
+        stmt = stmt.where(Spool.id > last_id)
+    rows = db.execute(stmt.order_by(Spool.id).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    # Словари по колонкам SpoolOut: схему проверяет только response_model (или никто при FAST_JSON)
+    return [{**row._mapping, "qr_code_path": spool_qr_path(row.id, row.qr_code_path)} for row in rows], next_cursor
+
+# 📄 GET /spools — страница катушек, курсор следующей страницы в заголовке X-Next-Cursor;
+# ETag по версии катушек группы, при совпадении If-None-Match — 304 без запроса к БД
+@router.get("/", response_model=list[SpoolOut])
+async def get_spools(request: Request, response: Response, limit: int | None = None, cursor: str | None = None, plastic_type_id: int | None = None,
+                     color: str | None = None, manufacturer_id: int | None = None, max_remaining: float | None = None,
+                     db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    # Срок ссылок на картинки — в ETag: после смены периода клиент получит новые ссылки, а не 304
+    etag = versions_etag(request, current_user, "spools", extra=str(link_expiry()))
+    if cached := not_modified(request, response, etag):
+        return cached
+    spools, next_cursor = await db.run_sync(_get_spools, current_user, page_limit(limit), cursor, plastic_type_id,
+                                            color, manufacturer_id, max_remaining)
+    set_next_cursor(response, next_cursor)
+    if FAST_JSON:
+        return rows_response(spools, response)
+    return spools
 
+# Скачивание QR: картинка строится на лету и кэшируется (utils/qr_service.py), ?format=svg — векторная
 @router.get("/{spool_id}/download_qr")
-def download_qr(spool_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    spool = db.query(Spool).get(spool_id)
-    if not spool or not spool.qr_code_path:
+async def download_qr(request: Request, spool_id: int, format: QRFormat = "png", db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    qr_data = await db.run_sync(load_user_spool_qr_data, spool_id, current_user)
+    return await qr_response(request, qr_data, format, filename=f"qr_spool_{spool_id}")
+
+def _public_spool_qr_data(db: Session, spool_id: int):
+    loaded = load_spool_qr_data(db, spool_id)
+    if loaded is None:
         raise HTTPException(status_code=404, detail="QR not found")
+    return loaded[1]
+
+# Картинка QR по подписанной ссылке из qr_code_path (для <img>, без токена)
+@router.get("/{spool_id}/qr.{format}")
+async def spool_qr_image(request: Request, spool_id: int, format: QRFormat, sig: str, exp: int = 0, db: SessionRunner = Depends(get_async_db)):
+    if not verify_image_signature(spool_id, exp, sig):
+        raise HTTPException(status_code=403, detail="Неверная или просроченная ссылка")
+    qr_data = await db.run_sync(_public_spool_qr_data, spool_id)
+    return await qr_response(request, qr_data, format)
+
+def _label_data(db: Session, request: LabelRequest, current_user: Principal) -> list[dict]:
+    # Катушки с типом, цветом, производителем и группой одним запросом + подписанные QR
     is_admin = current_user.role and current_user.role.name == "admin"
-    if not is_admin and spool.group_id != current_user.group_id:
-        raise HTTPException(status_code=403, detail="Нет доступа к этому QR-коду")
-    file_path = spool.qr_code_path.lstrip("/")
-    return FileResponse(
-        file_path,
-        media_type="image/png",
-        filename=f"qr_spool_{spool_id}.png",
-        headers={"Content-Disposition": f"attachment; filename=qr_spool_{spool_id}.png"}
+    stmt = (
+        select(Spool.id, Spool.group_id, Spool.color, Spool.plastic_type_id, PlasticType.name.label("plastic_type_name"),
+               Group.name.label("group_name"), PlasticManufacturer.name.label("manufacturer_name"))
+        .outerjoin(PlasticType, PlasticType.id == Spool.plastic_type_id)
+        .outerjoin(Group, Group.id == Spool.group_id)
+        .outerjoin(PlasticManufacturer, PlasticManufacturer.id == Spool.manufacturer_id)
     )
+    if request.spool_ids is not None:
+        spool_ids = list(dict.fromkeys(request.spool_ids))
+        if len(spool_ids) > labels.LABEL_MAX:
+            raise HTTPException(status_code=400, detail=f"Не больше {labels.LABEL_MAX} наклеек за раз")
+        rows = {row.id: row for row in db.execute(stmt.where(Spool.id.in_(spool_ids))).all()}
+        missing = [spool_id for spool_id in spool_ids if spool_id not in rows]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Катушки не найдены: {', '.join(map(str, missing))}")
+        if not is_admin and any(row.group_id != current_user.group_id for row in rows.values()):
+            raise HTTPException(status_code=403, detail="Нет доступа к этим катушкам")
+        rows = [rows[spool_id] for spool_id in spool_ids]
+    else:
+        if not is_admin:
+            stmt = stmt.where(Spool.group_id == current_user.group_id)
+        if request.plastic_type_id is not None:
+            stmt = stmt.where(Spool.plastic_type_id == request.plastic_type_id)
+        if request.color is not None:
+            stmt = stmt.where(Spool.color == request.color)
+        if request.manufacturer_id is not None:
+            stmt = stmt.where(Spool.manufacturer_id == request.manufacturer_id)
+        if request.max_remaining is not None:
+            stmt = stmt.where(Spool.weight_remaining <= request.max_remaining)
+        rows = db.execute(stmt.order_by(Spool.id).limit(labels.LABEL_MAX + 1)).all()
+        if len(rows) > labels.LABEL_MAX:
+            raise HTTPException(status_code=400, detail=f"Не больше {labels.LABEL_MAX} наклеек за раз, уточните фильтр")
+    if not rows:
+        raise HTTPException(status_code=404, detail="Катушки не найдены")
+    result = []
+    for row in rows:
+        plastic_type = row.plastic_type_name if row.plastic_type_name is not None else str(row.plastic_type_id)
+        group_name = row.group_name if row.group_name is not None else (str(row.group_id) if row.group_id else None)
+        result.append({
+            "id": row.id,
+            "qr": sign_payload(spool_qr_data(row.id, plastic_type, row.color, group_name)),
+            "plastic_type": plastic_type,
+            "color": row.color,
+            "manufacturer": row.manufacturer_name,
+        })
+    return result
 
-# ➖ DELETE /spools/{spool_id}
-@router.delete("/{spool_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_spool(spool_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+# 🏷 POST /spools/labels — лист наклеек (PDF или ZIP с PNG), страницы рисуются в пуле процессов
+# и отдаются потоком по мере готовности (utils/labels.py)
+@router.post("/labels")
+async def spool_labels(request: LabelRequest, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    label_data = await db.run_sync(_label_data, request, current_user)
+    if request.format == "png":
+        return StreamingResponse(labels.stream_png_zip(label_data), media_type="application/zip",
+                                 headers={"Content-Disposition": "attachment; filename=labels.zip"})
+    return StreamingResponse(labels.stream_pdf(label_data), media_type="application/pdf",
+                             headers={"Content-Disposition": "attachment; filename=labels.pdf"})
+
+def _delete_spool(db: Session, spool_id: int, current_user: Principal):
     spool = db.query(Spool).get(spool_id)
     if not spool:
         raise HTTPException(status_code=404, detail="Катушка не найдена")
@@ -159,19 +243,29 @@ def delete_spool(spool_id: int, db: Session = Depends(get_db), current_user: Use
         file_path = spool.qr_code_path.lstrip("/")
         if os.path.exists(file_path):
             os.remove(file_path)
+    data_versions.bump(db, "spools", spool.group_id)
+    data_versions.bump(db, "usages", spool.group_id)
     db.delete(spool)
+    forget_rollups(db, "spool", spool_id)
+    forget_burn_rate(db, spool_id)
     db.commit()
     return
 
-# Получить все типы пластика (для фронта)
-@router.get("/types", response_model=list[dict])
-def get_types(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+# ➖ DELETE /spools/{spool_id}
+@router.delete("/{spool_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_spool(spool_id: int, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run_sync(_delete_spool, spool_id, current_user)
+
+def _get_types(db: Session, current_user: Principal):
     types = db.query(PlasticType).all()
     return [{"id": t.id, "name": t.name} for t in types]
 
-# Добавить тип пластика (для фронта)
-@router.post("/types", response_model=dict)
-def add_type(data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+# Получить все типы пластика (для фронта)
+@router.get("/types", response_model=list[dict])
+async def get_types(db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run_sync(_get_types, current_user)
+
+def _add_type(db: Session, data: dict, current_user: Principal):
     name = data.get("name")
     if not name:
         raise HTTPException(status_code=400, detail="Имя обязательно")
@@ -179,28 +273,43 @@ def add_type(data: dict, db: Session = Depends(get_db), current_user: User = Dep
         raise HTTPException(status_code=400, detail="Такой тип уже существует")
     new_type = PlasticType(name=name, user_id=current_user.id)
     db.add(new_type)
+    data_versions.bump(db, "plastic_types")
     db.commit()
     db.refresh(new_type)
     return {"id": new_type.id, "name": new_type.name}
 
-# Получить информацию о катушке по id
-@router.get("/{spool_id}")
-def get_spool(spool_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    spool = db.query(Spool).filter(Spool.id == spool_id).first()
-    if not spool:
+# Добавить тип пластика (для фронта)
+@router.post("/types", response_model=dict)
+async def add_type(data: dict, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run_sync(_add_type, data, current_user)
+
+def _get_spool(db: Session, spool_id: int, current_user: Principal):
+    # Катушка, тип пластика и группа — одним запросом
+    row = db.execute(
+        select(
+            Spool.id, Spool.plastic_type_id, Spool.color, Spool.weight_total, Spool.weight_remaining,
+            Spool.qr_code_path, Spool.group_id, PlasticType.name.label("plastic_type_name"), Group.name.label("group_name"),
+        )
+        .outerjoin(PlasticType, PlasticType.id == Spool.plastic_type_id)
+        .outerjoin(Group, Group.id == Spool.group_id)
+        .where(Spool.id == spool_id)
+    ).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Катушка не найдена")
-    # Получаем объекты типа пластика и группы
-    plastic_type = db.query(PlasticType).filter(PlasticType.id == spool.plastic_type_id).first()
-    group = db.query(Group).filter(Group.id == spool.group_id).first() if spool.group_id else None
     # Формируем расширенный ответ
     return {
-        "id": spool.id,
-        "plastic_type_id": spool.plastic_type_id,
-        "color": spool.color,
-        "weight_total": spool.weight_total,
-        "weight_remaining": spool.weight_remaining,
-        "qr_code_path": spool.qr_code_path,
-        "group_id": spool.group_id,
-        "plastic_type": {"id": plastic_type.id, "name": plastic_type.name} if plastic_type else None,
-        "group": {"id": group.id, "name": group.name} if group else None
+        "id": row.id,
+        "plastic_type_id": row.plastic_type_id,
+        "color": row.color,
+        "weight_total": row.weight_total,
+        "weight_remaining": row.weight_remaining,
+        "qr_code_path": spool_qr_path(row.id, row.qr_code_path),
+        "group_id": row.group_id,
+        "plastic_type": {"id": row.plastic_type_id, "name": row.plastic_type_name} if row.plastic_type_name is not None else None,
+        "group": {"id": row.group_id, "name": row.group_name} if row.group_name is not None else None
     }
+
+# Получить информацию о катушке по id
+@router.get("/{spool_id}")
+async def get_spool(spool_id: int, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run_sync(_get_spool, spool_id, current_user)
@@ -1,30 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import update, insert, select, or_, tuple_
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from database import SessionLocal
-from models import Spool, Usage, User, Group
+from database import SessionRunner, get_async_db
+from models import Spool, Usage, Project
 from datetime import datetime 
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-import os
-from dotenv import load_dotenv
+from routers.auth import get_current_user
+from utils.principal_cache import Principal
+from utils.usage_rollups import apply_usages
+from utils.data_versions import data_versions
+from utils.burn_rates import BurnEvent, record as record_burn
+from utils.fast_json import FAST_JSON, rows_response
+from utils.pagination import page_limit, encode_cursor, decode_cursor, set_next_cursor
 
 router = APIRouter()
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-if not SECRET_KEY or not ALGORITHM:
-    raise RuntimeError("SECRET_KEY и ALGORITHM должны быть заданы в .env")
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class UsageCreate(BaseModel):
     spool_id: int
     amount_used: float
@@ -43,90 +33,217 @@ class UsageOut(BaseModel):
     class Config:
         from_attributes = True
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Не удалось получить пользователя из токена")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Неверный токен")
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="Пользователь не найден")
-    # Проверка: если у пользователя есть группа и она заблокирована
-    if user.group_id is not None:
-        group = db.query(Group).filter(Group.id == user.group_id).first()
-        if group and getattr(group, 'is_active', 1) == 0:
-            raise HTTPException(status_code=403, detail="Ваша группа заблокирована. Обратитесь к администратору.")
-    return user
+class UsageBatchItem(BaseModel):
+    index: int  # Позиция в исходном списке
+    ok: bool
+    usage: UsageOut | None = None
+    status_code: int | None = None
+    detail: str | None = None
 
-@router.post("/", response_model=UsageOut)
-def add_usage(usage: UsageCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+class UsageBatchOut(BaseModel):
+    created: int
+    failed: int
+    results: list[UsageBatchItem]
+
+USAGE_BATCH_LIMIT = 1000
+
+def _deduct_stmt(spool_id: int, amount: float, group_id: int | None, is_admin: bool):
+    # Атомарное условное списание: проверка остатка и вычитание одним UPDATE,
+    # чтобы два одновременных сканирования одной катушки не потеряли обновление
+    stmt = (
+        update(Spool)
+        .where(Spool.id == spool_id, Spool.weight_remaining >= amount)
+        .values(weight_remaining=Spool.weight_remaining - amount)
+        .returning(Spool.group_id, Spool.plastic_type_id, Spool.color)
+    )
+    if not is_admin:
+        stmt = stmt.where(Spool.group_id == group_id)
+    return stmt
+
+def _spool_or_404(db: Session, spool_id: int, group_id: int | None, is_admin: bool):
+    # Вызывается только когда условное списание не прошло — выбираем код ошибки
+    query = db.query(Spool.id).filter(Spool.id == spool_id)
+    if not is_admin:
+        query = query.filter(Spool.group_id == group_id)
+    if query.first() is None:
+        detail = "Катушка не найдена" if is_admin else "Катушка не найдена или не принадлежит вашей группе"
+        raise HTTPException(status_code=404, detail=detail)
+
+def _add_usage(db: Session, usage: UsageCreate, current_user: Principal):
     is_admin = current_user.role and current_user.role.name == "admin"
-    if is_admin:
-        # Админ может делать трату на любую катушку и проект
-        spool = db.query(Spool).filter(Spool.id == usage.spool_id).first()
-        if not spool:
-            raise HTTPException(status_code=404, detail="Катушка не найдена")
-        if usage.amount_used > spool.weight_remaining:
-            raise HTTPException(status_code=400, detail="Недостаточно пластика на катушке")
-        spool.weight_remaining -= usage.amount_used
-        usage_entry = Usage(
-            spool_id=usage.spool_id,
-            amount_used=usage.amount_used,
-            purpose=usage.purpose,
-            project_id=usage.project_id,
-            group_id=spool.group_id,
-            user_id=current_user.id
-        )
-    else:
-        # Обычный пользователь — только катушки и проекты своей группы
-        group_id = current_user.group_id
-        spool = db.query(Spool).filter(Spool.id == usage.spool_id, Spool.group_id == group_id).first()
-        if not spool:
-            raise HTTPException(status_code=404, detail="Катушка не найдена или не принадлежит вашей группе")
-        if usage.amount_used > spool.weight_remaining:
-            raise HTTPException(status_code=400, detail="Недостаточно пластика на катушке")
-        # Проверка проекта
-        if usage.project_id is not None:
-            from models import Project
-            project = db.query(Project).filter(Project.id == usage.project_id, Project.group_id == group_id).first()
-            if not project:
-                raise HTTPException(status_code=400, detail="Проект не найден или не принадлежит вашей группе")
-        spool.weight_remaining -= usage.amount_used
-        usage_entry = Usage(
-            spool_id=usage.spool_id,
-            amount_used=usage.amount_used,
-            purpose=usage.purpose,
-            project_id=usage.project_id,
-            group_id=group_id,
-            user_id=current_user.id
-        )
+    # Админ может делать трату на любую катушку и проект,
+    # обычный пользователь — только катушки и проекты своей группы
+    if not is_admin and usage.project_id is not None:
+        project = db.query(Project.id).filter(Project.id == usage.project_id, Project.group_id == current_user.group_id).first()
+        if not project:
+            raise HTTPException(status_code=400, detail="Проект не найден или не принадлежит вашей группе")
+    stmt = _deduct_stmt(usage.spool_id, usage.amount_used, current_user.group_id, is_admin)
+    row = db.execute(stmt, execution_options={"synchronize_session": False}).first()
+    if row is None:
+        db.rollback()
+        _spool_or_404(db, usage.spool_id, current_user.group_id, is_admin)
+        raise HTTPException(status_code=400, detail="Недостаточно пластика на катушке")
+    usage_entry = Usage(
+        spool_id=usage.spool_id,
+        amount_used=usage.amount_used,
+        purpose=usage.purpose,
+        project_id=usage.project_id,
+        group_id=row.group_id,
+        user_id=current_user.id
+    )
+    # Списание и запись траты — в одной транзакции
     db.add(usage_entry)
+    db.flush()
+    apply_usages(db, [usage_entry])
+    record_burn(db, [BurnEvent(usage.spool_id, row.group_id, row.plastic_type_id, row.color, usage.amount_used, usage_entry.timestamp)])
+    result = UsageOut.model_validate(usage_entry)
+    # Остаток катушки изменился — и версия списка катушек
+    data_versions.bump(db, "usages", row.group_id)
+    data_versions.bump(db, "spools", row.group_id)
     db.commit()
-    db.refresh(usage_entry)
-    return usage_entry
+    return result
 
-@router.get("/", response_model=list[UsageOut])
-def get_usages(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.post("/", response_model=UsageOut)
+async def add_usage(usage: UsageCreate, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run_sync(_add_usage, usage, current_user)
+
+def _add_usages_batch(db: Session, usages: list[UsageCreate], current_user: Principal):
     is_admin = current_user.role and current_user.role.name == "admin"
-    if is_admin:
-        usages = db.query(Usage).all()
-    else:
-        usages = db.query(Usage).filter(Usage.group_id == current_user.group_id).all()
-    # Фильтруем только те траты, у которых есть катушка и (если указан) проект
-    valid_usages = []
-    for u in usages:
-        if not u.spool:
-            continue
-        if u.project_id is not None and not u.project:
-            continue
-        valid_usages.append(u)
-    return valid_usages
+    group_id = current_user.group_id
+    # Проверки принадлежности — два запроса на весь пакет, а не по записи
+    spool_query = db.query(Spool.id, Spool.group_id, Spool.weight_remaining, Spool.plastic_type_id, Spool.color).filter(Spool.id.in_({u.spool_id for u in usages}))
+    if not is_admin:
+        spool_query = spool_query.filter(Spool.group_id == group_id)
+    spools = {row.id: row for row in spool_query}
+    project_ids = {u.project_id for u in usages if u.project_id is not None}
+    known_projects = set()
+    if not is_admin and project_ids:
+        known_projects = {row.id for row in db.query(Project.id).filter(Project.id.in_(project_ids), Project.group_id == group_id)}
 
-@router.delete("/{usage_id}", response_model=dict)
-def delete_usage(usage_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    results: list[UsageBatchItem | None] = [None] * len(usages)
+    by_spool: dict[int, list[int]] = {}
+    for i, usage in enumerate(usages):
+        if usage.spool_id not in spools:
+            detail = "Катушка не найдена" if is_admin else "Катушка не найдена или не принадлежит вашей группе"
+            results[i] = UsageBatchItem(index=i, ok=False, status_code=404, detail=detail)
+        elif not is_admin and usage.project_id is not None and usage.project_id not in known_projects:
+            results[i] = UsageBatchItem(index=i, ok=False, status_code=400, detail="Проект не найден или не принадлежит вашей группе")
+        else:
+            by_spool.setdefault(usage.spool_id, []).append(i)
+
+    # Остаток проверяется по порядку записей, а списание — одним условным UPDATE
+    # на катушку. Если катушку успели изменить параллельно, её записи списываются
+    # по одной через _deduct_stmt.
+    accepted = []
+    insufficient = "Недостаточно пластика на катушке"
+    for spool_id, indexes in by_spool.items():
+        remaining = spools[spool_id].weight_remaining
+        planned = []
+        for i in indexes:
+            if remaining >= usages[i].amount_used:
+                remaining -= usages[i].amount_used
+                planned.append(i)
+        total = sum(usages[i].amount_used for i in planned)
+        if planned and db.execute(_deduct_stmt(spool_id, total, group_id, is_admin), execution_options={"synchronize_session": False}).first() is None:
+            planned = []
+            for i in indexes:
+                stmt = _deduct_stmt(spool_id, usages[i].amount_used, group_id, is_admin)
+                if db.execute(stmt, execution_options={"synchronize_session": False}).first() is not None:
+                    planned.append(i)
+        planned_set = set(planned)
+        for i in indexes:
+            if i not in planned_set:
+                results[i] = UsageBatchItem(index=i, ok=False, status_code=400, detail=insufficient)
+        accepted.extend(planned)
+
+    accepted.sort()
+    timestamp = datetime.utcnow()
+    rows = [{
+        "spool_id": usages[i].spool_id,
+        "amount_used": usages[i].amount_used,
+        "purpose": usages[i].purpose,
+        "project_id": usages[i].project_id,
+        "group_id": spools[usages[i].spool_id].group_id,
+        "user_id": current_user.id,
+        "timestamp": timestamp,
+    } for i in accepted]
+    if rows:
+        inserted = db.execute(insert(Usage).returning(Usage.id, sort_by_parameter_order=True), rows).all()
+        for i, row, data in zip(accepted, inserted, rows):
+            results[i] = UsageBatchItem(index=i, ok=True, usage=UsageOut(id=row.id, **data))
+        apply_usages(db, rows)
+        record_burn(db, [
+            BurnEvent(data["spool_id"], data["group_id"], spools[data["spool_id"]].plastic_type_id,
+                      spools[data["spool_id"]].color, data["amount_used"], timestamp)
+            for data in rows
+        ])
+        data_versions.bump(db, "usages", *{data["group_id"] for data in rows})
+        data_versions.bump(db, "spools", *{data["group_id"] for data in rows})
+    # Одна транзакция и один commit на весь пакет
+    db.commit()
+    return UsageBatchOut(created=len(rows), failed=len(usages) - len(rows), results=results)
+
+# Пакетная запись трат (для фермы принтеров): ответ содержит результат по каждой записи
+@router.post("/batch", response_model=UsageBatchOut)
+async def add_usages_batch(usages: list[UsageCreate], db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    if len(usages) > USAGE_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Не больше {USAGE_BATCH_LIMIT} записей за запрос")
+    if not usages:
+        return UsageBatchOut(created=0, failed=0, results=[])
+    return await db.run_sync(_add_usages_batch, usages, current_user)
+
+def _get_usages(db: Session, current_user: Principal, limit: int, cursor: str | None, spool_id: int | None,
+                project_id: int | None, user_id: int | None, date_from: datetime | None, date_to: datetime | None):
+    is_admin = current_user.role and current_user.role.name == "admin"
+    # Только нужные колонки; траты без катушки или с удалённым проектом отсекаются JOIN-ами в SQL
+    stmt = (
+        select(Usage.id, Usage.spool_id, Usage.amount_used, Usage.purpose, Usage.timestamp, Usage.project_id, Usage.user_id)
+        .join(Spool, Spool.id == Usage.spool_id)
+        .outerjoin(Project, Project.id == Usage.project_id)
+        .where(or_(Usage.project_id.is_(None), Project.id.is_not(None)))
+    )
+    if not is_admin:
+        stmt = stmt.where(Usage.group_id == current_user.group_id)
+    if spool_id is not None:
+        stmt = stmt.where(Usage.spool_id == spool_id)
+    if project_id is not None:
+        stmt = stmt.where(Usage.project_id == project_id)
+    if user_id is not None:
+        stmt = stmt.where(Usage.user_id == user_id)
+    if date_from is not None:
+        stmt = stmt.where(Usage.timestamp >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Usage.timestamp < date_to)
+    if cursor:
+        ts, last_id = decode_cursor(cursor, 2)
+        try:
+            key = (datetime.fromisoformat(ts), int(last_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Неверный курсор")
+        stmt = stmt.where(tuple_(Usage.timestamp, Usage.id) < tuple_(*key))
+    # Новые траты первыми; (timestamp, id) — уникальный ключ для курсора
+    rows = db.execute(stmt.order_by(Usage.timestamp.desc(), Usage.id.desc()).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    # Колонки совпадают с UsageOut; схему проверяет только response_model (или никто при FAST_JSON)
+    return [dict(row._mapping) for row in rows], next_cursor
+
+# Страница трат: курсор следующей страницы — в заголовке X-Next-Cursor
+@router.get("/", response_model=list[UsageOut])
+async def get_usages(response: Response, limit: int | None = None, cursor: str | None = None, spool_id: int | None = None,
+                     project_id: int | None = None, user_id: int | None = None, date_from: datetime | None = None,
+                     date_to: datetime | None = None, db: SessionRunner = Depends(get_async_db),
+                     current_user: Principal = Depends(get_current_user)):
+    usages, next_cursor = await db.run_sync(_get_usages, current_user, page_limit(limit), cursor, spool_id,
+                                            project_id, user_id, date_from, date_to)
+    set_next_cursor(response, next_cursor)
+    if FAST_JSON:
+        return rows_response(usages, response)
+    return usages
+
+def _delete_usage(db: Session, usage_id: int, current_user: Principal):
     usage = db.query(Usage).filter(Usage.id == usage_id).first()
     if not usage:
         raise HTTPException(status_code=404, detail="Трата не найдена")
@@ -134,11 +251,21 @@ def delete_usage(usage_id: int, db: Session = Depends(get_db), current_user: Use
     is_admin = current_user.role and current_user.role.name == "admin"
     if not is_admin and usage.group_id != current_user.group_id:
         raise HTTPException(status_code=403, detail="Нет доступа к удалению этой траты")
-    # Возврат пластика
-    spool = db.query(Spool).filter(Spool.id == usage.spool_id).first()
-    if spool:
-        spool.weight_remaining += usage.amount_used
-        db.commit()
+    # Возврат пластика атомарным UPDATE, в одной транзакции с удалением траты
+    spool = db.execute(
+        update(Spool).where(Spool.id == usage.spool_id).values(weight_remaining=Spool.weight_remaining + usage.amount_used)
+        .returning(Spool.plastic_type_id, Spool.color),
+        execution_options={"synchronize_session": False},
+    ).first()
+    apply_usages(db, [usage], sign=-1)
+    if spool is not None:
+        record_burn(db, [BurnEvent(usage.spool_id, usage.group_id, spool.plastic_type_id, spool.color, usage.amount_used, usage.timestamp)], sign=-1)
+    data_versions.bump(db, "usages", usage.group_id)
+    data_versions.bump(db, "spools", usage.group_id)
     db.delete(usage)
     db.commit()
     return {"ok": True}
+
+@router.delete("/{usage_id}", response_model=dict)
+async def delete_usage(usage_id: int, db: SessionRunner = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    return await db.run_sync(_delete_usage, usage_id, current_user)
@@ -0,0 +1,179 @@
+import threading
+from typing import NamedTuple
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import User, Group, Role
+from utils.principal_cache import principal_cache, Principal, RoleInfo, GroupInfo
+from utils import cache_sync
+
+# Компактная карта состояния авторизации в памяти процесса.
+# Токен несёт uid/gid/rid и версии uv/gv; если версия в токене совпадает
+# с текущей версией пользователя и группы, запрос авторизуется без обращения к БД.
+# Версия увеличивается при блокировке, разблокировке, смене роли и удалении.
+# Изменения применяются после commit через utils/cache_sync.py — и в других воркерах.
+
+
+class UserState(NamedTuple):
+    version: int
+    is_active: int
+    username: str
+    group_id: int | None
+    role_id: int
+
+
+class GroupState(NamedTuple):
+    version: int
+    is_active: int
+    name: str
+
+
+_DELETED = None  # "надгробие" для удалённых записей, чтобы не ходить в БД повторно
+_MISSING = object()  # Записи нет в карте (в отличие от _DELETED)
+
+
+def bump_version(obj):
+    # Вызывать до commit для User/Group, состояние которых влияет на доступ
+    obj.auth_version = (obj.auth_version or 0) + 1
+
+
+class AuthState:
+    def __init__(self):
+        self.users: dict[int, UserState | None] = {}
+        self.groups: dict[int, GroupState | None] = {}
+        self.roles: dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._generation = 0  # Счётчик событий forget_*: по нему загрузка узнаёт, что устарела
+        self.hits = 0  # Проверки токена без обращения к БД
+        self.misses = 0  # Проверки, которым понадобилась загрузка из БД
+        self.loads = 0  # Запросов к БД (пользователь, группа или роли)
+
+    # --- Изменения: вызывать до commit; запись перечитается из БД при следующей проверке ---
+    # После commit (в этом процессе и, через журнал, в остальных воркерах) — forget_*
+    def user_changed(self, db: Session, user_id: int):
+        cache_sync.record(db, "user", user_id)
+
+    def group_changed(self, db: Session, group_id: int):
+        cache_sync.record(db, "group", group_id)
+
+    def forget_user(self, user_id: int):
+        # Под блокировкой: загрузка, начатая до события, не вернёт старое состояние в карту
+        with self._lock:
+            self.users.pop(user_id, None)
+            self._generation += 1
+        principal_cache.invalidate_user(user_id)
+
+    def forget_group(self, group_id: int):
+        with self._lock:
+            self.groups.pop(group_id, None)
+            self._generation += 1
+        principal_cache.invalidate_group(group_id)
+
+    def forget_all(self):
+        with self._lock:
+            self.users.clear()
+            self.groups.clear()
+            self._generation += 1
+        principal_cache.clear()
+
+    # Запрос к БД — без блокировки, чтобы промах не задерживал остальные проверки.
+    # Если за время запроса пришло событие (forget_*), результат мог устареть: в карту не кладём
+    def _store(self, table: dict, key: int, state, generation: int):
+        with self._lock:
+            self.loads += 1
+            if self._generation == generation:
+                table[key] = state
+
+    def _load_user(self, user_id: int) -> UserState | None:
+        generation = self._generation
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            state = UserState(user.auth_version or 0, user.is_active, user.username, user.group_id, user.role_id) if user else _DELETED
+        finally:
+            db.close()
+        self._store(self.users, user_id, state, generation)
+        return state
+
+    def _load_group(self, group_id: int) -> GroupState | None:
+        generation = self._generation
+        db = SessionLocal()
+        try:
+            group = db.query(Group).filter(Group.id == group_id).first()
+            state = GroupState(group.auth_version or 0, group.is_active, group.name) if group else _DELETED
+        finally:
+            db.close()
+        self._store(self.groups, group_id, state, generation)
+        return state
+
+    def _load_roles(self) -> dict[int, str]:
+        # Роли меняются только при старте (ensure_default_roles), загружаем их целиком
+        db = SessionLocal()
+        try:
+            roles = {role.id: role.name for role in db.query(Role).all()}
+        finally:
+            db.close()
+        with self._lock:
+            self.loads += 1
+            self.roles = roles  # Замена словаря целиком, читатели без блокировки видят старый или новый
+        return roles
+
+    # --- Проверка токена ---
+    def needs_db(self, claims: dict) -> bool:
+        # True, если для проверки токена придётся сходить в БД (запись ещё не в карте)
+        gid = claims.get("gid")
+        return claims["uid"] not in self.users or (gid is not None and gid not in self.groups) or claims["rid"] not in self.roles
+
+    def check(self, claims: dict) -> Principal:
+        uid, gid, rid = claims["uid"], claims.get("gid"), claims["rid"]
+        # Один get вместо in + []: forget_* из другого потока может удалить запись между ними
+        user = self.users.get(uid, _MISSING)
+        group = self.groups.get(gid, _MISSING) if gid is not None else None
+        with self._lock:
+            if user is _MISSING or group is _MISSING or rid not in self.roles:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if user is _MISSING:
+            user = self._load_user(uid)
+        if user is None or not user.is_active or user.username != claims.get("sub"):
+            raise HTTPException(status_code=401, detail="Пользователь не найден или заблокирован")
+        if gid is not None:
+            if group is _MISSING:
+                group = self._load_group(gid)
+            if group is not None and group.is_active == 0:
+                raise HTTPException(status_code=403, detail="Ваша группа заблокирована. Обратитесь к администратору.")
+        role_name = self.roles.get(rid)
+        if role_name is None:
+            role_name = self._load_roles().get(rid)
+        expected_gv = group.version if group is not None else None
+        if (user.version != claims.get("uv") or user.group_id != gid or user.role_id != rid
+                or expected_gv != claims.get("gv") or role_name is None):
+            raise HTTPException(status_code=401, detail="Токен отозван, войдите заново")
+        return Principal(
+            id=uid,
+            username=user.username,
+            role_id=rid,
+            group_id=gid,
+            is_active=user.is_active,
+            role=RoleInfo(id=rid, name=role_name),
+            group=GroupInfo(id=gid, name=group.name, is_active=group.is_active) if group is not None else None,
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "users": len(self.users),
+                "groups": len(self.groups),
+                "hits": self.hits,
+                "misses": self.misses,
+                "db_loads": self.loads,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+auth_state = AuthState()
+cache_sync.subscribe("user", lambda key, version: auth_state.forget_user(int(key)))
+cache_sync.subscribe("group", lambda key, version: auth_state.forget_group(int(key)))
+cache_sync.subscribe_reset(auth_state.forget_all)
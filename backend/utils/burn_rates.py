@@ -0,0 +1,129 @@
+import math
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy import select, delete, tuple_
+from sqlalchemy.orm import Session
+from database import IS_SQLITE
+from models import SpoolBurnRate, MaterialBurnRate
+from utils.usage_rollups import NO_GROUP
+
+if IS_SQLITE:
+    from sqlalchemy.dialects.sqlite import insert
+else:
+    from sqlalchemy.dialects.postgresql import insert
+
+# Скорость расхода (г/день) по катушке и по материалу (группа, тип, цвет).
+# Экспоненциально взвешенное среднее с затуханием по времени:
+#   rate(t) = rate(last) * exp(-(t - last) / tau) + amount / tau
+# Обновление на каждую трату — O(1), история не пересчитывается. Удаление траты
+# вычитает её вклад, затухший к моменту last. Прогноз: остаток / rate(сейчас).
+# Заполнение по существующим тратам: python backfill_burn_rates.py
+
+BURN_RATE_HALF_LIFE_DAYS = float(os.getenv("BURN_RATE_HALF_LIFE_DAYS", "14"))  # Период полураспада веса трат
+TAU_DAYS = BURN_RATE_HALF_LIFE_DAYS / math.log(2)
+DAY_SECONDS = 86400.0
+
+
+class BurnEvent(NamedTuple):
+    spool_id: int | None
+    group_id: int | None
+    plastic_type_id: int | None
+    color: str | None
+    amount: float
+    timestamp: datetime
+
+
+def decayed(rate: float, last_at: datetime, at: datetime) -> float:
+    # Скорость, затухшая от last_at до at
+    days = (at - last_at).total_seconds() / DAY_SECONDS
+    return rate * math.exp(-days / TAU_DAYS) if days > 0 else rate
+
+
+def _fold(state: tuple[float, datetime] | None, events: list[BurnEvent], sign: int) -> tuple[float, datetime]:
+    rate, last_at = state if state is not None else (0.0, None)
+    for event in sorted(events, key=lambda e: e.timestamp):
+        if last_at is None:
+            last_at = event.timestamp
+        if sign > 0 and event.timestamp > last_at:
+            rate = decayed(rate, last_at, event.timestamp)
+            last_at = event.timestamp
+        # Вклад траты, затухший к last_at (для удаляемых трат и трат из прошлого)
+        contribution = decayed(event.amount / TAU_DAYS, event.timestamp, last_at)
+        rate = rate + contribution if sign > 0 else max(0.0, rate - contribution)
+    return rate, last_at
+
+
+def _material_key(event: BurnEvent):
+    return (event.group_id or NO_GROUP, event.plastic_type_id or 0, event.color or "")
+
+
+def record(db: Session, events: list[BurnEvent], sign: int = 1):
+    # Обновляет оценки в текущей транзакции: по одному SELECT и одному upsert на таблицу
+    by_spool, by_material = defaultdict(list), defaultdict(list)
+    for event in events:
+        if event.spool_id is not None:
+            by_spool[event.spool_id].append(event)
+        by_material[_material_key(event)].append(event)
+    if by_spool:
+        current = {
+            row.spool_id: (row.rate, row.last_usage_at)
+            for row in db.execute(select(SpoolBurnRate).where(SpoolBurnRate.spool_id.in_(by_spool)).with_for_update()).scalars()
+        }
+        rows = []
+        for spool_id, spool_events in by_spool.items():
+            if sign < 0 and spool_id not in current:
+                continue
+            rate, last_at = _fold(current.get(spool_id), spool_events, sign)
+            rows.append({"spool_id": spool_id, "rate": rate, "last_usage_at": last_at})
+        _upsert(db, SpoolBurnRate, ["spool_id"], rows)
+    if by_material:
+        columns = (MaterialBurnRate.group_id, MaterialBurnRate.plastic_type_id, MaterialBurnRate.color)
+        current = {
+            (row.group_id, row.plastic_type_id, row.color): (row.rate, row.last_usage_at)
+            for row in db.execute(select(MaterialBurnRate).where(tuple_(*columns).in_(list(by_material))).with_for_update()).scalars()
+        }
+        rows = []
+        for key, material_events in by_material.items():
+            if sign < 0 and key not in current:
+                continue
+            rate, last_at = _fold(current.get(key), material_events, sign)
+            rows.append({"group_id": key[0], "plastic_type_id": key[1], "color": key[2], "rate": rate, "last_usage_at": last_at})
+        _upsert(db, MaterialBurnRate, ["group_id", "plastic_type_id", "color"], rows)
+
+
+def _upsert(db: Session, model, index_elements: list[str], rows: list[dict]):
+    if not rows:
+        return
+    stmt = insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={"rate": stmt.excluded.rate, "last_usage_at": stmt.excluded.last_usage_at},
+    )
+    db.execute(stmt, rows)
+
+
+def forget_spool(db: Session, spool_id: int):
+    db.execute(delete(SpoolBurnRate).where(SpoolBurnRate.spool_id == spool_id))
+
+
+def rebuild(db: Session, events) -> tuple[int, int]:
+    # Пересчёт по всей истории; events — итератор BurnEvent в порядке времени
+    spools: dict[int, tuple[float, datetime]] = {}
+    materials: dict[tuple, tuple[float, datetime]] = {}
+    for event in events:
+        if event.spool_id is not None:
+            spools[event.spool_id] = _fold(spools.get(event.spool_id), [event], 1)
+        key = _material_key(event)
+        materials[key] = _fold(materials.get(key), [event], 1)
+    db.execute(delete(SpoolBurnRate))
+    db.execute(delete(MaterialBurnRate))
+    _upsert(db, SpoolBurnRate, ["spool_id"], [
+        {"spool_id": spool_id, "rate": rate, "last_usage_at": last_at} for spool_id, (rate, last_at) in spools.items()
+    ])
+    _upsert(db, MaterialBurnRate, ["group_id", "plastic_type_id", "color"], [
+        {"group_id": g, "plastic_type_id": t, "color": c, "rate": rate, "last_usage_at": last_at}
+        for (g, t, c), (rate, last_at) in materials.items()
+    ])
+    return len(spools), len(materials)
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import secrets
+from typing import Callable
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, func, insert, select, text
+from sqlalchemy.orm import Session
+from database import engine, IS_SQLITE
+from models import CacheEvent
+
+# События изменения данных, от которых зависят кэши в памяти процесса
+# (версии данных для ETag и отчётов, карта авторизации).
+# Обработчик вызывает record(db, ...) до commit; после успешного commit события
+# применяются в своём процессе, при rollback — отбрасываются.
+# При нескольких воркерах (uvicorn --workers / gunicorn) события ещё и пишутся в таблицу
+# cache_events той же транзакцией, что и само изменение: одним INSERT на все события commit.
+# Каждый воркер раз в CACHE_SYNC_INTERVAL проверяет журнал: в SQLite сначала PRAGMA
+# data_version на отдельном соединении — число меняется, только если другое соединение
+# что-то записало, поэтому в простое проверка не трогает таблицы. Внешние сервисы не нужны.
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# По умолчанию включено, если воркеров несколько (uvicorn и gunicorn берут их число из WEB_CONCURRENCY)
+CACHE_SYNC = os.getenv("CACHE_SYNC", "1" if WEB_CONCURRENCY > 1 else "0") == "1"
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "0.1"))  # Секунды между проверками журнала
+CACHE_EVENTS_KEEP = int(os.getenv("CACHE_EVENTS_KEEP", "10000"))  # Сколько последних событий хранить
+PRUNE_EVERY = 1000  # Очистка журнала — на каждом таком id
+
+logger = logging.getLogger("uvicorn.error")
+
+# kind -> обработчик (key, version): version — id события в журнале, None без CACHE_SYNC.
+# Регистрируют utils/data_versions.py (data, epoch) и utils/auth_state.py (user, group)
+_handlers: dict[str, Callable[[str, int | None], None]] = {}
+_resets: list[Callable[[], None]] = []  # Полный сброс, если воркер отстал дальше очистки журнала
+
+
+def subscribe(kind: str, handler: Callable[[str, int | None], None]):
+    _handlers[kind] = handler
+
+
+def subscribe_reset(handler: Callable[[], None]):
+    _resets.append(handler)
+
+
+def record(db: Session, kind: str, key):
+    # Вызывать до commit сессии db
+    db.info.setdefault("cache_events", {})[(kind, str(key))] = None  # dict — без повторов, в порядке записи
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session: Session):
+    events = session.info.get("cache_events")
+    if not events or not CACHE_SYNC:
+        return
+    # Журнал пишется в транзакции изменения: либо есть и то и другое, либо ничего
+    ids = session.connection().execute(
+        insert(CacheEvent).returning(CacheEvent.id, sort_by_parameter_order=True),
+        [{"kind": kind, "key": key} for kind, key in events],
+    ).scalars().all()
+    for event_key, event_id in zip(list(events), ids):
+        events[event_key] = event_id
+    if any(event_id % PRUNE_EVERY == 0 for event_id in ids):
+        _prune(session.connection(), max(ids))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    events = session.info.pop("cache_events", None)
+    for (kind, key), event_id in (events or {}).items():
+        _handlers[kind](key, event_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop("cache_events", None)
+
+
+def _prune(conn, last_id: int):
+    # Старые события не нужны никому, кроме последнего по каждому ключу: по нему строится версия
+    conn.execute(text(
+        "DELETE FROM cache_events WHERE id < :horizon"
+        " AND id NOT IN (SELECT max(id) FROM cache_events GROUP BY kind, key)"
+    ), {"horizon": last_id - CACHE_EVENTS_KEEP})
+
+
+def _load_versions(conn):
+    # Последнее событие по каждому ключу — текущие версии данных во всех воркерах
+    rows = conn.execute(select(func.max(CacheEvent.id), CacheEvent.key).where(CacheEvent.kind == "data").group_by(CacheEvent.key))
+    for event_id, key in rows:
+        _handlers["data"](key, event_id)
+
+
+class _Watcher:
+    # Состояние опроса; опрос идёт из одной задачи, последовательно
+    connection = None  # Своё соединение SQLite: data_version считается на соединение
+    data_version = None
+    last_id = 0
+    task: asyncio.Task | None = None
+
+
+def init():
+    # Вызывается при старте воркера (main.startup): общий epoch ETag, версии и позиция в журнале
+    if not CACHE_SYNC:
+        return
+    with engine.begin() as conn:
+        # Один оператор: при одновременном старте воркеров epoch создаст только один из них
+        conn.execute(text(
+            "INSERT INTO cache_events (kind, key) SELECT 'epoch', :key"
+            " WHERE NOT EXISTS (SELECT 1 FROM cache_events WHERE kind = 'epoch')"
+        ), {"key": secrets.token_hex(8)})
+    with engine.connect() as conn:
+        epoch = conn.execute(
+            select(CacheEvent.key).where(CacheEvent.kind == "epoch").order_by(CacheEvent.id).limit(1)
+        ).scalar_one()
+        _handlers["epoch"](epoch, None)
+        _Watcher.last_id = conn.execute(select(func.max(CacheEvent.id))).scalar() or 0
+        _load_versions(conn)
+
+
+def poll():
+    if IS_SQLITE:
+        if _Watcher.connection is None:
+            # Соединение DBAPI занимает место в пуле до остановки; его курсоры не видны
+            # событиям движка (метрики, журнал медленных запросов)
+            _Watcher.connection = engine.raw_connection()
+        cursor = _Watcher.connection.cursor()
+        try:
+            version = cursor.execute("PRAGMA data_version").fetchone()[0]
+            if version == _Watcher.data_version:
+                return
+            _Watcher.data_version = version
+            rows = cursor.execute("SELECT id, kind, key FROM cache_events WHERE id > ? ORDER BY id", (_Watcher.last_id,)).fetchall()
+        finally:
+            cursor.close()
+    else:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(CacheEvent.id, CacheEvent.kind, CacheEvent.key).where(CacheEvent.id > _Watcher.last_id).order_by(CacheEvent.id)
+            ).all()
+    if not rows:
+        return
+    if rows[-1][0] - _Watcher.last_id > CACHE_EVENTS_KEEP:
+        # Воркер отстал дальше очистки журнала: часть событий удалена — сбрасываем всё
+        for reset in _resets:
+            reset()
+        with engine.connect() as conn:
+            _load_versions(conn)
+    else:
+        # Свои события тоже приходят сюда; повторное применение безвредно
+        for event_id, kind, key in rows:
+            handler = _handlers.get(kind)
+            if handler is not None and kind != "epoch":
+                handler(key, event_id)
+    _Watcher.last_id = rows[-1][0]
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(CACHE_SYNC_INTERVAL)
+        try:
+            await run_in_threadpool(poll)
+        except Exception:
+            logger.exception("Ошибка синхронизации кэшей между воркерами")
+
+
+def start():
+    # Из lifespan, после init
+    if CACHE_SYNC:
+        _Watcher.task = asyncio.create_task(_run())
+
+
+async def stop():
+    if _Watcher.task is not None:
+        _Watcher.task.cancel()
+        try:
+            await _Watcher.task
+        except asyncio.CancelledError:
+            pass
+        _Watcher.task = None
+    if _Watcher.connection is not None:
+        _Watcher.connection.close()
+        _Watcher.connection = None
@@ -0,0 +1,36 @@
+import hashlib
+from fastapi import Request, Response
+from utils.data_versions import data_versions, ALL_GROUPS
+from utils.principal_cache import Principal
+
+# Условные GET для списков: ETag строится из версий таблиц (utils/data_versions.py),
+# видимых пользователю, и строки запроса. Совпал If-None-Match — ответ 304
+# без запроса к БД и сериализации.
+
+LIST_CACHE_CONTROL = "private, no-cache"  # Браузер хранит ответ, но каждый раз сверяет ETag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+def versions_etag(request: Request, current_user: Principal, *tables: str, extra: str = "") -> str:
+    # Админ видит все группы, остальные — свою (плюс общие изменения).
+    # extra — то, от чего ответ зависит помимо данных (например, срок ссылок в нём)
+    is_admin = current_user.role and current_user.role.name == "admin"
+    scope = ALL_GROUPS if is_admin else current_user.group_id
+    versions = ",".join(str(data_versions.get(table, scope)) for table in tables)
+    key = f"{data_versions.epoch}:{request.url.path}?{request.url.query}:{scope}:{versions}:{extra}"
+    return 'W/"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    # 304, если у клиента актуальная версия; иначе ставит ETag на будущий ответ
+    headers = {"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,57 @@
+import secrets
+import threading
+from collections import defaultdict
+from sqlalchemy.orm import Session
+from utils import cache_sync
+
+# Счётчики версий данных по таблицам и группам.
+# Обработчики вызывают bump до commit, версия увеличивается после commit
+# (utils/cache_sync.py); кэши и ETag включают версию в ключ, поэтому после
+# записи старые значения больше не используются.
+# При нескольких воркерах версия — id события в общем журнале cache_events:
+# она одинакова во всех процессах и переживает перезапуск.
+
+ALL_GROUPS = "*"  # версия таблицы целиком (для админа)
+_SHARED = "shared"  # изменения, затрагивающие все группы сразу
+_GROUP_KEYS = {"None": None, _SHARED: _SHARED}  # Ключи групп в журнале, кроме id
+
+
+class DataVersions:
+    def __init__(self):
+        self._versions: dict[tuple[str, object], int] = defaultdict(int)
+        self._lock = threading.Lock()
+        # Счётчики живут в памяти и после перезапуска начинаются заново;
+        # epoch в ETag не даёт старому тегу совпасть с новой версией
+        self.epoch = secrets.token_hex(8)
+
+    def bump(self, db: Session, table: str, *group_ids: int | None):
+        # Вызывать до commit; без group_ids изменение считается общим для всех групп
+        for group_id in set(group_ids) or {_SHARED}:
+            cache_sync.record(db, "data", f"{table}:{group_id}")
+
+    def apply_event(self, key: str, version: int | None):
+        # После commit (своего или другого воркера); version=None — счётчик одного процесса
+        table, _, group_key = key.rpartition(":")
+        group_id = _GROUP_KEYS[group_key] if group_key in _GROUP_KEYS else int(group_key)
+        with self._lock:
+            for scope in (ALL_GROUPS, group_id):
+                if version is None:
+                    self._versions[(table, scope)] += 1
+                elif self._versions[(table, scope)] < version:
+                    # max — события приходят и от себя, и повторно
+                    self._versions[(table, scope)] = version
+
+    def set_epoch(self, epoch: str, version: int | None = None):
+        self.epoch = epoch
+
+    def get(self, table: str, group_id: object = ALL_GROUPS) -> int:
+        # Оба слагаемых только растут, поэтому сумма меняется при любом изменении группы
+        with self._lock:
+            if group_id == ALL_GROUPS:
+                return self._versions[(table, ALL_GROUPS)]
+            return self._versions[(table, _SHARED)] + self._versions[(table, group_id)]
+
+
+data_versions = DataVersions()
+cache_sync.subscribe("data", data_versions.apply_event)
+cache_sync.subscribe("epoch", data_versions.set_epoch)
@@ -0,0 +1,233 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import zlib
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image, ImageDraw
+
+# Листы наклеек с QR-кодами (A4, сетка LABEL_COLUMNS x LABEL_ROWS).
+# Страницы рисуются параллельно в пуле процессов и отдаются по мере готовности,
+# в работе одновременно не больше 2 * LABEL_WORKERS страниц — память ограничена.
+# Модуль не импортирует ничего из приложения: он загружается в дочерних процессах.
+# qrcode и PIL импортируются при рисовании — в дочерних процессах, а не при старте API.
+
+LABEL_WORKERS = int(os.getenv("LABEL_WORKERS", str(os.cpu_count() or 1)))  # Процессов рисования
+LABEL_MAX = int(os.getenv("LABEL_MAX", "5000"))  # Наклеек в одном запросе
+LABEL_FONT = os.getenv("LABEL_FONT", "DejaVuSans.ttf")  # TrueType-шрифт с кириллицей
+LABEL_COLUMNS, LABEL_ROWS = 3, 7
+DPI = 150
+PAGE_WIDTH, PAGE_HEIGHT = 1240, 1754  # A4 при 150 dpi
+MARGIN = 40
+
+_pool: ProcessPoolExecutor | None = None
+_fonts: dict[int, object] = {}
+
+
+def labels_per_page() -> int:
+    return LABEL_COLUMNS * LABEL_ROWS
+
+
+def _font(size: int):
+    if size not in _fonts:
+        from PIL import ImageFont
+        try:
+            _fonts[size] = ImageFont.truetype(LABEL_FONT, size)
+        except OSError:
+            _fonts[size] = ImageFont.load_default(size=size)
+    return _fonts[size]
+
+
+def _draw_label(page: "Image.Image", draw: "ImageDraw.ImageDraw", x: int, y: int, width: int, height: int, label: dict):
+    import qrcode
+    from PIL import Image
+    # Фиксированная маска: перебор восьми масок — основная часть времени qrcode,
+    # а читаемость с любой маской одинаковая
+    qr = qrcode.QRCode(border=1, mask_pattern=0)
+    qr.add_data(label["qr"])
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    modules = Image.frombytes("L", (len(matrix), len(matrix)), bytes(0 if cell else 255 for row in matrix for cell in row))
+    side = height - 20
+    image = modules.resize((side, side), Image.NEAREST).convert("1")
+    page.paste(image, (x + 10, y + 10))
+    text_x = x + side + 25
+    lines = [
+        (f"#{label['id']}", _font(34)),
+        (label.get("plastic_type") or "—", _font(26)),
+        (label.get("color") or "—", _font(26)),
+        (label.get("manufacturer") or "", _font(22)),
+    ]
+    text_y = y + 20
+    for text, font in lines:
+        # Обрезаем по ширине наклейки
+        while text and draw.textlength(text, font=font) > width - (text_x - x) - 10:
+            text = text[:-1]
+        draw.text((text_x, text_y), text, fill=0, font=font)
+        text_y += font.size + 14
+    draw.rectangle((x, y, x + width - 1, y + height - 1), outline=0, width=1)
+
+
+def render_page(labels: list[dict]) -> "Image.Image":
+    from PIL import Image, ImageDraw
+    # 1-битная страница: 0 — чёрный, 255 — белый
+    page = Image.new("1", (PAGE_WIDTH, PAGE_HEIGHT), 255)
+    draw = ImageDraw.Draw(page)
+    width = (PAGE_WIDTH - 2 * MARGIN) // LABEL_COLUMNS
+    height = (PAGE_HEIGHT - 2 * MARGIN) // LABEL_ROWS
+    for i, label in enumerate(labels):
+        row, column = divmod(i, LABEL_COLUMNS)
+        _draw_label(page, draw, MARGIN + column * width, MARGIN + row * height, width, height, label)
+    return page
+
+
+def render_pdf_page(labels: list[dict]) -> bytes:
+    # Для PDF: сжатые 1-битные строки растра (FlateDecode, DeviceGray)
+    return zlib.compress(render_page(labels).tobytes(), 6)
+
+
+def render_png_page(labels: list[dict]) -> bytes:
+    buffer = io.BytesIO()
+    render_page(labels).save(buffer, "PNG", optimize=True, dpi=(DPI, DPI))
+    return buffer.getvalue()
+
+
+class PdfWriter:
+    # Минимальный PDF из растровых страниц, который пишется потоком:
+    # номера объектов известны заранее (число страниц известно), смещения
+    # копятся для xref, дерево страниц и каталог дописываются в конце
+    def __init__(self, pages: int):
+        self.pages = pages
+        self.offset = 0
+        self.offsets: dict[int, int] = {}
+
+    def _obj(self, number: int, body: bytes) -> bytes:
+        self.offsets[number] = self.offset
+        data = b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        self.offset += len(data)
+        return data
+
+    def header(self) -> bytes:
+        data = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self.offset += len(data)
+        return data
+
+    def page(self, index: int, raster: bytes) -> bytes:
+        # Объекты: 1 — каталог, 2 — дерево страниц, далее по 3 на страницу
+        image, content, page = 3 + index * 3, 4 + index * 3, 5 + index * 3
+        width_pt, height_pt = PAGE_WIDTH * 72 / DPI, PAGE_HEIGHT * 72 / DPI
+        drawing = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (width_pt, height_pt)
+        return b"".join([
+            self._obj(image, b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                             b"/BitsPerComponent 1 /Filter /FlateDecode /Length %d >>\nstream\n" % (PAGE_WIDTH, PAGE_HEIGHT, len(raster))
+                      + raster + b"\nendstream"),
+            self._obj(content, b"<< /Length %d >>\nstream\n" % len(drawing) + drawing + b"\nendstream"),
+            self._obj(page, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /XObject << /Im0 %d 0 R >> >> "
+                            b"/Contents %d 0 R >>" % (width_pt, height_pt, image, content)),
+        ])
+
+    def trailer(self) -> bytes:
+        kids = b" ".join(b"%d 0 R" % (5 + i * 3) for i in range(self.pages))
+        data = self._obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, self.pages))
+        data += self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        count = 3 + self.pages * 3
+        xref = [b"xref\n0 %d\n" % count, b"0000000000 65535 f \n"]
+        xref += [b"%010d 00000 n \n" % self.offsets[n] for n in range(1, count)]
+        xref.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, self.offset))
+        return data + b"".join(xref)
+
+
+class ZipStream:
+    # Файл-приёмник для zipfile, из которого забираются готовые куски архива
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def open_zip(stream: ZipStream) -> zipfile.ZipFile:
+    # PNG уже сжаты, поэтому без повторного сжатия
+    return zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED)
+
+
+def pool() -> ProcessPoolExecutor:
+    # spawn: дочерние процессы не наследуют потоки и соединения с БД родителя
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=LABEL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def _rendered_pages(labels: list[dict], render):
+    # Страницы по порядку; в пуле не больше 2 * LABEL_WORKERS задач одновременно
+    loop = asyncio.get_running_loop()
+    executor = pool()
+    size = labels_per_page()
+    chunks = [labels[i:i + size] for i in range(0, len(labels), size)]
+    window = max(1, LABEL_WORKERS * 2)
+    pending = [loop.run_in_executor(executor, render, chunk) for chunk in chunks[:window]]
+    submitted = len(pending)
+    try:
+        while pending:
+            page = await pending.pop(0)
+            if submitted < len(chunks):
+                pending.append(loop.run_in_executor(executor, render, chunks[submitted]))
+                submitted += 1
+            yield page
+    finally:
+        # Клиент отключился — недорисованные страницы не нужны
+        for future in pending:
+            future.cancel()
+
+
+def page_count(labels: list[dict]) -> int:
+    return -(-len(labels) // labels_per_page())
+
+
+async def stream_pdf(labels: list[dict]):
+    writer = PdfWriter(page_count(labels))
+    yield writer.header()
+    index = 0
+    async for raster in _rendered_pages(labels, render_pdf_page):
+        yield writer.page(index, raster)
+        index += 1
+    yield writer.trailer()
+
+
+async def stream_png_zip(labels: list[dict]):
+    # PNG — по файлу на страницу, упакованные в ZIP
+    stream = ZipStream()
+    archive = open_zip(stream)
+    index = 0
+    async for png in _rendered_pages(labels, render_png_page):
+        index += 1
+        archive.writestr(f"labels_{index:03d}.png", png)
+        yield stream.take()
+    archive.close()
+    yield stream.take()
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
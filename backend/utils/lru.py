@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+
+# Простой потокобезопасный LRU-кэш для готовых ответов (отчёты, картинки QR).
+# Ключ должен включать версию данных, тогда устаревшие записи просто вытесняются.
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, weigh=None):
+        # weigh(value) — "вес" записи (например, len для байтов); по умолчанию 1,
+        # тогда maxsize — число записей
+        self.maxsize = maxsize
+        self.weigh = weigh or (lambda value: 1)
+        self.size = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key, value):
+        weight = self.weigh(value)
+        if weight > self.maxsize:
+            return
+        with self._lock:
+            if key in self._data:
+                self.size -= self.weigh(self._data.pop(key))
+            self._data[key] = value
+            self.size += weight
+            while self.size > self.maxsize:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= self.weigh(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "size": self.size,
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
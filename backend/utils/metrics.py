@@ -0,0 +1,190 @@
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Метрики в формате Prometheus (GET /metrics): по каждому шаблону маршрута —
+# число запросов по кодам ответа, гистограммы времени ответа, числа и времени
+# SQL-запросов и ожидания соединения из пула; плюс запросы в работе.
+# SQL считается через события движка в объект текущего запроса (ContextVar;
+# пул потоков и run_sync получают тот же контекст). В общие счётчики всё
+# складывается только в middleware — в потоке event loop, поэтому без блокировок.
+# Работа с БД вне HTTP-запросов (скрипты, старт приложения) не учитывается.
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # Если задан — /metrics только с "Authorization: Bearer <токен>", иначе только админу
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+POOL_WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+UNMATCHED = "other"  # Статика и несуществующие пути — одной меткой, чтобы не плодить ряды
+
+
+class Histogram:
+    # Счётчики по корзинам заведены заранее; observe — поиск корзины и два сложения
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя — +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        out, total = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            out.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        total += self.counts[-1]
+        out.append(f'{name}_bucket{{{labels},le="+Inf"}} {total}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum}")
+        out.append(f"{name}_count{{{labels}}} {total}")
+        return out
+
+
+class RequestStats:
+    # Накопитель одного запроса; его меняют обработчики событий движка
+    __slots__ = ("scope", "statements", "db_time", "pool_wait")
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.statements = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+
+
+class RouteStats:
+    __slots__ = ("statuses", "latency", "statements", "db_time", "pool_wait")
+
+    def __init__(self):
+        self.statuses: dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.db_time = Histogram(DB_TIME_BUCKETS)
+        self.pool_wait = Histogram(POOL_WAIT_BUCKETS)
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+_routes: dict[tuple[str, str], RouteStats] = {}
+_in_flight = 0
+_engines: dict[str, object] = {}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["metrics_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += time.perf_counter() - conn.info.pop("metrics_started", time.perf_counter())
+
+
+def instrument_engine(engine, name: str):
+    # Подписка на события выполнения SQL и замер ожидания соединения:
+    # у пула нет события «начали ждать», поэтому оборачивается raw_connection
+    # (его вызывает и Connection синхронного движка, и sync_engine асинхронного)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        started = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.pool_wait += time.perf_counter() - started
+
+    engine.raw_connection = timed_raw_connection
+    _engines[name] = engine
+
+
+def _route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED) if route is not None else UNMATCHED
+
+
+def current_route() -> tuple[str, str] | None:
+    # (метод, шаблон маршрута) HTTP-запроса, в котором выполняется код; None вне запроса
+    stats = _current.get()
+    return (stats.scope["method"], _route_template(stats.scope)) if stats is not None else None
+
+
+class MetricsMiddleware:
+    # Чистый ASGI (без BaseHTTPMiddleware): ни копирования тела ответа, ни лишних задач
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        global _in_flight
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _in_flight -= 1
+            _current.reset(token)
+            key = (scope["method"], _route_template(scope))
+            route = _routes.get(key)
+            if route is None:
+                route = _routes[key] = RouteStats()
+            route.statuses[status] = route.statuses.get(status, 0) + 1
+            route.latency.observe(time.perf_counter() - started)
+            route.statements.observe(stats.statements)
+            route.db_time.observe(stats.db_time)
+            route.pool_wait.observe(stats.pool_wait)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render() -> str:
+    lines = [
+        "# HELP http_requests_in_flight Запросы в обработке",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {_in_flight}",
+        "# HELP http_requests_total Запросы по маршруту и коду ответа",
+        "# TYPE http_requests_total counter",
+    ]
+    routes = sorted(_routes.items())
+    for (method, path), route in routes:
+        for status, count in sorted(route.statuses.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{_escape(path)}",status="{status}"}} {count}')
+    histograms = [
+        ("http_request_duration_seconds", "Время ответа", "latency"),
+        ("db_statements_per_request", "SQL-запросов на один HTTP-запрос", "statements"),
+        ("db_time_per_request_seconds", "Время SQL на один HTTP-запрос", "db_time"),
+        ("db_pool_wait_per_request_seconds", "Ожидание соединения из пула на один HTTP-запрос", "pool_wait"),
+    ]
+    for name, description, attribute in histograms:
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+        for (method, path), route in routes:
+            lines += getattr(route, attribute).lines(name, f'method="{method}",route="{_escape(path)}"')
+    lines += ["# HELP db_pool_checked_out Соединения, выданные из пула", "# TYPE db_pool_checked_out gauge"]
+    for name, engine in _engines.items():
+        checked_out = getattr(engine.pool, "checkedout", None)  # Есть только у QueuePool
+        if checked_out is not None:
+            lines.append(f'db_pool_checked_out{{engine="{name}"}} {checked_out()}')
+    return "\n".join(lines) + "\n"
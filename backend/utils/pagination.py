@@ -0,0 +1,44 @@
+import base64
+import json
+import os
+from fastapi import HTTPException, Response
+
+# Курсорная (keyset) пагинация для списков.
+# Курсор — непрозрачная строка с ключом сортировки последней строки страницы;
+# следующая страница выбирается условием "ключ < курсора" по индексу, поэтому
+# время ответа не зависит от размера таблицы (в отличие от OFFSET).
+# Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "500"))  # Размер страницы по умолчанию
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "1000"))  # Максимальный limit в запросе
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_limit(limit: int | None) -> int:
+    if limit is None:
+        return PAGE_SIZE_DEFAULT
+    if limit < 1 or limit > PAGE_SIZE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {PAGE_SIZE_MAX}")
+    return limit
+
+
+def encode_cursor(*key) -> str:
+    raw = json.dumps(key, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+    if not isinstance(key, list) or len(key) != size:
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+    return key
+
+
+def set_next_cursor(response: Response, next_cursor: str | None):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+
+# Хеширование и проверка паролей (bcrypt) в отдельном ограниченном пуле потоков.
+# bcrypt занимает ~250 мс CPU на операцию; в общем пуле anyio это отнимает потоки
+# у всех остальных эндпоинтов. Если очередь переполнена — сразу отвечаем 503.
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Стоимость (work factor) bcrypt
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))  # Потоков хеширования
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))  # Максимум операций в работе и в очереди
+
+_context = None  # passlib загружается при первом хешировании, а не при старте
+_executor: ThreadPoolExecutor | None = None
+_lock = threading.Lock()
+_pending = 0
+
+
+def _pwd_context():
+    global _context
+    if _context is None:
+        from passlib.context import CryptContext
+        _context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _context
+
+
+def __getattr__(name: str):
+    # from utils.password_hashing import pwd_context — для скриптов (generate_data.py)
+    if name == "pwd_context":
+        return _pwd_context()
+    raise AttributeError(name)
+
+
+async def _submit(fn, *args):
+    global _pending, _executor
+    with _lock:
+        if _pending >= HASH_QUEUE_LIMIT:
+            raise HTTPException(status_code=503, detail="Сервер перегружен, повторите попытку позже", headers={"Retry-After": "1"})
+        _pending += 1
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+        executor = _executor
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(lambda: _pwd_context().hash(password))
+
+
+async def verify_password(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    # Возвращает (пароль верен, новый хеш). Новый хеш не None, если хеш создан
+    # с другой стоимостью и его нужно перезаписать (rehash-on-login)
+    return await _submit(lambda: _pwd_context().verify_and_update(password, hashed_password))
+
+
+def shutdown():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# Кэш "принципалов" (авторизованных пользователей) между запросами.
+# Ключ — subject из токена (username). Хранятся только простые значения,
+# а не ORM-объекты, чтобы кэш не был привязан к конкретной сессии БД.
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))  # секунды
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+
+
+@dataclass(frozen=True)
+class RoleInfo:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class GroupInfo:
+    id: int
+    name: str
+    is_active: int
+
+
+@dataclass(frozen=True)
+class Principal:
+    # Повторяет атрибуты models.User, которые используют обработчики
+    id: int
+    username: str
+    role_id: int
+    group_id: int | None
+    is_active: int
+    role: RoleInfo | None
+    group: GroupInfo | None
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Principal]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, username: str) -> Principal | None:
+        with self._lock:
+            entry = self._data.get(username)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, principal = entry
+            if expires_at < time.monotonic():
+                del self._data[username]
+                self.misses += 1
+                return None
+            self._data.move_to_end(username)
+            self.hits += 1
+            return principal
+
+    def put(self, principal: Principal):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[principal.username] = (time.monotonic() + self.ttl, principal)
+            self._data.move_to_end(principal.username)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for username in [k for k, (_, p) in self._data.items() if p.id == user_id]:
+                del self._data[username]
+                self.evictions += 1
+
+    def invalidate_group(self, group_id: int):
+        with self._lock:
+            for username in [k for k, (_, p) in self._data.items() if p.group_id == group_id]:
+                del self._data[username]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.evictions += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+principal_cache = PrincipalCache()
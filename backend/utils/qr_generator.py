@@ -1,30 +1,43 @@
-import qrcode
+import io
 import os
 import json
 import base64
 import hmac
 import hashlib
-from dotenv import load_dotenv
+from utils.secret_key import SECRET_KEY  # Тот же ключ, что у JWT
 
 QR_FOLDER = "static/qr_codes"
 os.makedirs(QR_FOLDER, exist_ok=True)
 
-load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY", "default_secret")
-
-# data_dict: словарь с данными для QR
-# Возвращает путь к PNG
-def generate_qr(data_dict: dict) -> str:
+# Строка, которая кодируется в QR: base64(JSON).подпись
+def sign_payload(data_dict: dict) -> str:
     # Сериализация и base64
     json_data = json.dumps(data_dict, ensure_ascii=False, separators=(",", ":"))
     json_bytes = json_data.encode("utf-8")
     b64_data = base64.urlsafe_b64encode(json_bytes).decode("utf-8")
     # Подпись
     signature = hmac.new(SECRET_KEY.encode(), b64_data.encode(), hashlib.sha256).hexdigest()
-    qr_payload = f"{b64_data}.{signature}"
+    return f"{b64_data}.{signature}"
+
+# Картинка QR в памяти: fmt — "png" или "svg".
+# qrcode (и PIL через него) импортируется при первой картинке, а не при старте
+def render_qr(qr_payload: str, fmt: str = "png") -> bytes:
+    import qrcode
+    buffer = io.BytesIO()
+    if fmt == "svg":
+        import qrcode.image.svg
+        qrcode.make(qr_payload, image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qrcode.make(qr_payload).save(buffer)
+    return buffer.getvalue()
+
+# data_dict: словарь с данными для QR
+# Возвращает путь к PNG
+def generate_qr(data_dict: dict) -> str:
+    qr_payload = sign_payload(data_dict)
     # Имя файла по id (или hash)
     filename = f"{data_dict.get('id', 'qr')}.png"
     filepath = os.path.join(QR_FOLDER, filename)
-    qr = qrcode.make(qr_payload)
-    qr.save(filepath)
+    with open(filepath, "wb") as f:
+        f.write(render_qr(qr_payload))
     return f"/static/qr_codes/{filename}"
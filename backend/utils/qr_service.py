@@ -0,0 +1,132 @@
+import functools
+import hashlib
+import hmac
+import os
+import time
+from typing import Literal, NamedTuple
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Spool, PlasticType, Group
+from utils.lru import LRUCache
+from utils.conditional import etag_matches
+from utils.principal_cache import Principal
+from utils.qr_generator import SECRET_KEY, sign_payload, render_qr
+
+# Отдача QR-кодов без чтения с диска: картинка строится из подписанной
+# полезной нагрузки и хранится в LRU-кэше байтов. ETag — хеш формата и
+# нагрузки, поэтому он сильный и меняется только вместе с содержимым.
+# Файлы в static/qr_codes пишутся только при QR_PERSIST=1.
+
+QR_PERSIST = os.getenv("QR_PERSIST", "0") == "1"  # Сохранять PNG новых катушек на диск
+QR_CACHE_BYTES = int(os.getenv("QR_CACHE_BYTES", str(32 * 1024 * 1024)))  # Размер кэша картинок
+QR_MAX_AGE = int(os.getenv("QR_MAX_AGE", "86400"))  # Cache-Control max-age, секунды
+QR_LINK_TTL = int(os.getenv("QR_LINK_TTL", str(7 * 86400)))  # Срок действия подписанной ссылки на картинку, секунды
+
+QRFormat = Literal["png", "svg"]
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+class QRImage(NamedTuple):
+    body: bytes
+    etag: str
+    media_type: str
+
+
+qr_cache = LRUCache(QR_CACHE_BYTES, weigh=lambda image: len(image.body))
+
+
+def spool_qr_data(spool_id: int, plastic_type_name: str | None, color: str, group_name: str | None) -> dict:
+    # Полезная нагрузка QR-кода катушки
+    return {
+        "id": spool_id,
+        "plastic_type": plastic_type_name,
+        "color": color,
+        "group": group_name,
+        "created_at": str(spool_id)  # Можно заменить на дату, если есть поле
+    }
+
+
+def load_spool_qr_data(db: Session, spool_id: int):
+    # Катушка с типом и группой одним запросом; (group_id, данные QR) или None
+    row = db.execute(
+        select(Spool.id, Spool.group_id, Spool.color, Spool.plastic_type_id,
+               PlasticType.name.label("plastic_type_name"), Group.name.label("group_name"))
+        .outerjoin(PlasticType, PlasticType.id == Spool.plastic_type_id)
+        .outerjoin(Group, Group.id == Spool.group_id)
+        .where(Spool.id == spool_id)
+    ).first()
+    if row is None:
+        return None
+    qr_data = spool_qr_data(
+        row.id,
+        row.plastic_type_name if row.plastic_type_name is not None else str(row.plastic_type_id),
+        row.color,
+        row.group_name if row.group_name is not None else (str(row.group_id) if row.group_id else None),
+    )
+    return row.group_id, qr_data
+
+
+def load_user_spool_qr_data(db: Session, spool_id: int, current_user: Principal) -> dict:
+    # Данные QR катушки с проверкой доступа: не админ видит только катушки своей группы
+    loaded = load_spool_qr_data(db, spool_id)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="QR not found")
+    group_id, qr_data = loaded
+    is_admin = current_user.role and current_user.role.name == "admin"
+    if not is_admin and group_id != current_user.group_id:
+        raise HTTPException(status_code=403, detail="Нет доступа к этому QR-коду")
+    return qr_data
+
+
+async def qr_image(qr_data: dict, fmt: QRFormat = "png") -> QRImage:
+    qr_payload = sign_payload(qr_data)
+    etag = '"' + hashlib.sha256(f"{fmt}:{qr_payload}".encode()).hexdigest()[:32] + '"'
+    image = qr_cache.get(etag)
+    if image is None:
+        # Рисование — CPU-работа, выносим из event loop
+        body = await run_in_threadpool(render_qr, qr_payload, fmt)
+        image = QRImage(body, etag, MEDIA_TYPES[fmt])
+        qr_cache.put(etag, image)
+    return image
+
+
+async def qr_response(request: Request, qr_data: dict, fmt: QRFormat, filename: str | None = None) -> Response:
+    # filename задан — ответ для скачивания (Content-Disposition: attachment)
+    image = await qr_image(qr_data, fmt)
+    headers = {"ETag": image.etag, "Cache-Control": f"private, max-age={QR_MAX_AGE}"}
+    if etag_matches(request, image.etag):
+        return Response(status_code=304, headers=headers)
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename={filename}.{fmt}"
+    return Response(image.body, media_type=image.media_type, headers=headers)
+
+
+def link_expiry() -> int:
+    # Срок кратен QR_LINK_TTL: в течение периода ссылка (и ETag списка с ней) не меняется,
+    # а действует она от TTL до 2·TTL — утёкшая ссылка перестаёт работать
+    return (int(time.time()) // QR_LINK_TTL + 2) * QR_LINK_TTL
+
+
+@functools.lru_cache(maxsize=65536)  # Подпись меняется раз в период, а списки катушек запрашиваются часто
+def _image_signature(spool_id: int, expires: int) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"qr-image:{spool_id}:{expires}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def image_url(spool_id: int, fmt: QRFormat = "png") -> str:
+    # Подписанная ссылка на картинку для <img> (без заголовка Authorization)
+    expires = link_expiry()
+    return f"/spools/{spool_id}/qr.{fmt}?exp={expires}&sig={_image_signature(spool_id, expires)}"
+
+
+def verify_image_signature(spool_id: int, expires: int, sig: str) -> bool:
+    # sig — из строки запроса: сравниваем байты (compare_digest не принимает не-ASCII str)
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sig.encode(), _image_signature(spool_id, expires).encode())
+
+
+def spool_qr_path(spool_id: int, stored_path: str | None) -> str:
+    # Что отдавать в qr_code_path: файл на диске, если он уже есть, иначе подписанную ссылку
+    return stored_path or image_url(spool_id)
@@ -0,0 +1,58 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import update
+from database import SessionLocal
+from models import Spool
+from utils.qr_generator import generate_qr
+from utils.data_versions import data_versions
+
+# Сохранение PNG с QR-кодом на диск в фоновом пуле, вне запроса create_spool
+# (только при QR_PERSIST=1). Путь в spools.qr_code_path записывается, когда
+# файл готов, вместе с версией spools (ETag списка); download_qr от файла не зависит (utils/qr_service.py).
+
+QR_WORKERS = int(os.getenv("QR_WORKERS", "2"))  # Потоков генерации QR
+
+logger = logging.getLogger("uvicorn.error")
+_executor: ThreadPoolExecutor | None = None
+
+
+def _render(qr_data: dict, group_id: int | None):
+    try:
+        qr_path = generate_qr(qr_data)
+        db = SessionLocal()
+        try:
+            updated = db.execute(update(Spool).where(Spool.id == qr_data["id"]).values(qr_code_path=qr_path)).rowcount
+            if updated:
+                # qr_code_path меняется со ссылки на файл: ETag списков с этой катушкой должен смениться
+                data_versions.bump(db, "spools", group_id)
+            db.commit()
+        finally:
+            db.close()
+        if not updated:
+            # Катушку успели удалить — файл не нужен
+            _remove(qr_path)
+    except Exception:
+        logger.exception("Не удалось сгенерировать QR для катушки %s", qr_data.get("id"))
+
+
+def _remove(qr_path: str):
+    file_path = qr_path.lstrip("/")
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def submit_spool_qr(qr_data: dict, group_id: int | None):
+    # Вызывать после commit, чтобы фоновая задача видела катушку; group_id — для версии spools
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=QR_WORKERS, thread_name_prefix="qr")
+    _executor.submit(_render, qr_data, group_id)
+
+
+def shutdown():
+    # Дописываем начатые файлы: иначе в qr_code_path останется путь без PNG
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,18 @@
+import os
+from dotenv import load_dotenv
+
+# Ключ подписи — один для JWT (routers/auth.py), QR-кодов (utils/qr_generator.py,
+# routers/decode_qr.py) и подписанных ссылок на картинки QR (utils/qr_service.py).
+# .env читается и здесь: ключ не зависит от того, импортирован ли раньше database.py
+
+load_dotenv()
+
+APP_ENV = os.getenv("APP_ENV", "production")  # dev — локальная разработка
+# Значения из примеров README и прежние значения по умолчанию: известны всем, подпись с ними подделывается
+PUBLIC_KEYS = {"default_secret", "supersecretkey", "your_secret_key_here", "your_super_secret_key_here", "your_production_secret_key"}
+
+SECRET_KEY = os.getenv("SECRET_KEY", "")
+if not SECRET_KEY:
+    raise RuntimeError("SECRET_KEY должен быть задан в .env")
+if SECRET_KEY in PUBLIC_KEYS and APP_ENV != "dev":
+    raise RuntimeError("SECRET_KEY взят из примера и известен всем: задайте свой ключ (с APP_ENV=dev он допустим для локальной разработки)")
@@ -0,0 +1,106 @@
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from sqlalchemy import event
+from utils.lru import LRUCache
+from utils.metrics import current_route
+
+# Журнал медленных SQL-запросов (дольше SLOW_QUERY_MS): нормализованный текст,
+# маршрут, длительность и план выполнения. План (EXPLAIN QUERY PLAN в SQLite,
+# EXPLAIN в PostgreSQL) снимается один раз на нормализованный запрос и кэшируется.
+# Записи хранятся в кольцевом буфере, админ читает их через GET /metrics/slow_queries.
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))  # Порог, мс; 0 — отключить журнал
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "200"))  # Записей в кольцевом буфере
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+_records: deque = deque(maxlen=SLOW_QUERY_BUFFER)  # append и чтение deque потокобезопасны
+_plans = LRUCache(1024)
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),  # Строки
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),  # Числа
+    (re.compile(r"%\(\w+\)s|\$\d+|(?<![:\w]):[A-Za-z_]\w*"), "?"),  # Параметры psycopg / asyncpg / именованные
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?, ...)"),  # IN (?, ?, ?) — без длины списка
+    (re.compile(r"\s+"), " "),
+]
+
+
+@lru_cache(maxsize=4096)
+def normalize(statement: str) -> str:
+    # Тексты запросов SQLAlchemy повторяются — результат кэшируется
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def _explain(conn, statement: str, parameters) -> list[str]:
+    # Отдельный курсор того же соединения: события движка не срабатывают,
+    # план строится в той же транзакции (видит те же таблицы)
+    sqlite = conn.dialect.name == "sqlite"
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(("EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN ") + statement, parameters)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if not sqlite:
+        return [row[0] for row in rows]
+    # SQLite: (id, parent, notused, detail) — отступ по глубине вложенности
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append("  " * (depth[node_id] - 1) + detail)
+    return lines
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["slow_query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("slow_query_started", None)
+    if started is None:
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms < SLOW_QUERY_MS:
+        return
+    sql = normalize(statement)
+    plan = _plans.get(sql)
+    if plan is None and sql.lstrip("( ").upper().startswith(EXPLAINABLE):
+        try:
+            plan = _explain(conn, statement, parameters[0] if executemany and parameters else parameters)
+        except Exception as e:
+            plan = [f"План недоступен: {e}"]
+        _plans.put(sql, plan)
+    method, route = current_route() or (None, None)
+    _records.append({
+        "at": datetime.utcnow(),
+        "method": method,
+        "route": route,
+        "duration_ms": round(duration_ms, 2),
+        "executemany": executemany,
+        "sql": sql,
+        "plan": plan or [],
+    })
+
+
+def instrument_engine(engine):
+    if SLOW_QUERY_MS <= 0:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def records(limit: int | None = None) -> list[dict]:
+    # Новые записи первыми
+    items = list(_records)[::-1]
+    return items[:limit] if limit else items
+
+
+def clear():
+    _records.clear()
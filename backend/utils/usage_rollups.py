@@ -0,0 +1,99 @@
+from collections import defaultdict
+from sqlalchemy import select, delete, func, literal
+from sqlalchemy.orm import Session
+from database import IS_SQLITE
+from models import Usage, UsageRollup
+
+if IS_SQLITE:
+    from sqlalchemy.dialects.sqlite import insert
+else:
+    from sqlalchemy.dialects.postgresql import insert
+
+# Суммы трат по дням в разрезе группы, катушки, проекта и пользователя.
+# Обновляются в той же транзакции, что и сами траты (add_usage, пакетная запись,
+# delete_usage), поэтому отчёты читают сотни строк сводки вместо миллионов трат.
+# Полный пересчёт и сверка: python rebuild_rollups.py
+
+NO_GROUP = 0  # group_id в сводке для трат без группы (в первичном ключе не бывает NULL)
+
+# dimension -> колонка траты, по которой ведётся сводка
+DIMENSIONS = {
+    "group": Usage.group_id,
+    "spool": Usage.spool_id,
+    "project": Usage.project_id,
+    "user": Usage.user_id,
+}
+
+_upsert = insert(UsageRollup)
+_upsert = _upsert.on_conflict_do_update(
+    index_elements=[UsageRollup.dimension, UsageRollup.key_id, UsageRollup.group_id, UsageRollup.day],
+    set_={
+        "grams": UsageRollup.grams + _upsert.excluded.grams,
+        "usages": UsageRollup.usages + _upsert.excluded.usages,
+    },
+)
+
+
+def apply_usages(db: Session, usages: list, sign: int = 1):
+    # usages — объекты Usage или словари с теми же полями; sign=-1 при удалении трат.
+    # Изменения сначала суммируются в памяти, затем один executemany с upsert
+    deltas = defaultdict(lambda: [0.0, 0])
+    for usage in usages:
+        get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name)
+        group_id = get("group_id") or NO_GROUP
+        day = get("timestamp").date()
+        amount = get("amount_used") * sign
+        for dimension in DIMENSIONS:
+            key = group_id if dimension == "group" else get(f"{dimension}_id")
+            if key is None:
+                continue
+            delta = deltas[(dimension, key, group_id, day)]
+            delta[0] += amount
+            delta[1] += sign
+    if deltas:
+        db.execute(_upsert, [
+            {"dimension": dimension, "key_id": key, "group_id": group_id, "day": day, "grams": grams, "usages": count}
+            for (dimension, key, group_id, day), (grams, count) in deltas.items()
+        ])
+
+
+def forget(db: Session, dimension: str, key_id: int):
+    # Вызывается при удалении катушки или проекта: их траты теряют ссылку (NULL)
+    # и больше не относятся к этому ключу
+    db.execute(delete(UsageRollup).where(UsageRollup.dimension == dimension, UsageRollup.key_id == key_id))
+
+
+def _expected(dimension: str):
+    group_id = func.coalesce(Usage.group_id, NO_GROUP)
+    key = group_id if dimension == "group" else DIMENSIONS[dimension]
+    day = func.date(Usage.timestamp)
+    return (
+        select(literal(dimension), key, group_id, day, func.sum(Usage.amount_used), func.count())
+        .where(key.is_not(None), Usage.timestamp.is_not(None))
+        .group_by(key, group_id, day)
+    )
+
+
+def rebuild(db: Session):
+    # Пересчёт с нуля одним INSERT ... SELECT ... GROUP BY на каждый разрез
+    db.execute(delete(UsageRollup))
+    columns = ["dimension", "key_id", "group_id", "day", "grams", "usages"]
+    for dimension in DIMENSIONS:
+        db.execute(insert(UsageRollup).from_select(columns, _expected(dimension)))
+
+
+def verify(db: Session, tolerance: float = 1e-6) -> list[str]:
+    # Сверка сводки с тратами; возвращает список расхождений (пустой — всё сходится)
+    expected = {}
+    for dimension in DIMENSIONS:
+        for dim, key, group_id, day, grams, count in db.execute(_expected(dimension)):
+            expected[(dim, key, group_id, str(day))] = (grams, count)
+    actual = {}
+    for row in db.execute(select(UsageRollup).where((UsageRollup.usages != 0) | (UsageRollup.grams != 0))).scalars():
+        actual[(row.dimension, row.key_id, row.group_id, str(row.day))] = (row.grams, row.usages)
+    problems = []
+    for key in sorted(expected.keys() | actual.keys(), key=str):
+        want, got = expected.get(key, (0.0, 0)), actual.get(key, (0.0, 0))
+        if want[1] != got[1] or abs(want[0] - got[0]) > tolerance:
+            problems.append(f"{key}: ожидалось {want}, в сводке {got}")
+    return problems
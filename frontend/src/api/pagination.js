@@ -0,0 +1,26 @@
+import api from './axios';
+
+// Курсорная пагинация: курсор следующей страницы сервер возвращает в заголовке X-Next-Cursor.
+// Списки грузятся постранично по требованию («Загрузить ещё»), а не целиком.
+
+// Справочники для подписей и выпадающих списков — не больше стольких страниц
+export const LOOKUP_MAX_PAGES = 4;
+
+// Одна страница: { items, nextCursor }; nextCursor = null — страниц больше нет
+export async function fetchPage(url, params = {}, cursor = null) {
+  const res = await api.get(url, { params: cursor ? { ...params, cursor } : params });
+  return { items: res.data, nextCursor: res.headers['x-next-cursor'] || null };
+}
+
+// Первые maxPages страниц одним массивом
+export async function fetchPages(url, params = {}, maxPages = LOOKUP_MAX_PAGES) {
+  const items = [];
+  let cursor = null;
+  for (let i = 0; i < maxPages; i++) {
+    const page = await fetchPage(url, params, cursor);
+    items.push(...page.items);
+    cursor = page.nextCursor;
+    if (!cursor) break;
+  }
+  return items;
+}
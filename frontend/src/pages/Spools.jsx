@@ -1,6 +1,7 @@
 import React, { useEffect, useState, useRef } from 'react';
 import api from '../api/axios';
 import { fetchPlasticTypes, addPlasticType } from '../api/plasticTypes';
+import { fetchPage } from '../api/pagination';
 import { Box, Typography, Button, Table, TableBody, TableCell, TableHead, TableRow, Paper, Dialog, DialogTitle, DialogContent, TextField, DialogActions, Alert, MenuItem, Select, InputLabel, FormControl, IconButton, Grid, Autocomplete } from '@mui/material';
 import AddCircleOutlineIcon from '@mui/icons-material/AddCircleOutline';
 import FileDownload from 'js-file-download';
@@ -28,19 +29,36 @@ export default function Spools() {
   const [minWeightRemaining, setMinWeightRemaining] = useState('');
   const [sort, setSort] = useState({ field: '', direction: 'asc' }); // field: 'weight_total' | 'weight_remaining'
   const [page, setPage] = useState(1);
+  const [nextCursor, setNextCursor] = useState(null); // Курсор следующей страницы с сервера
+  const [loadingMore, setLoadingMore] = useState(false);
   const rowsPerPage = 10;
   const role = localStorage.getItem('role');
   const API_URL = import.meta.env.VITE_API_URL || '/api'; // Используем переменную окружения
 
+  // Первая страница списка; следующие — по кнопке «Загрузить ещё»
   const fetchSpools = async () => {
     try {
-      const res = await api.get('/spools/');
-      setSpools(res.data);
+      const { items, nextCursor } = await fetchPage('/spools/');
+      setSpools(items);
+      setNextCursor(nextCursor);
     } catch {
       setError('Ошибка загрузки катушек');
     }
   };
 
+  const loadMoreSpools = async () => {
+    setLoadingMore(true);
+    try {
+      const { items, nextCursor: cursor } = await fetchPage('/spools/', {}, nextCursor);
+      setSpools(prev => [...prev, ...items]);
+      setNextCursor(cursor);
+    } catch {
+      setError('Ошибка загрузки катушек');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const fetchTypes = async () => {
     try {
       const types = await fetchPlasticTypes();
@@ -463,6 +481,12 @@ useEffect(() => {
               showLastButton
             />
           </Box>
+          {nextCursor && (
+            <Box display="flex" justifyContent="center" mb={2}>
+              {/* Поиск и сортировка работают по уже загруженным катушкам */}
+              <Button onClick={loadMoreSpools} disabled={loadingMore}>Загрузить ещё</Button>
+            </Box>
+          )}
         </Paper>
         <Dialog open={open} onClose={() => setOpen(false)} fullWidth maxWidth="sm">
           <DialogTitle>Добавить катушку</DialogTitle>
@@ -1,6 +1,7 @@
 import React, { useEffect, useState, useRef } from 'react';
 import api from '../api/axios';
 import { fetchPlasticTypes } from '../api/plasticTypes';
+import { fetchPage, fetchPages } from '../api/pagination';
 import { Box, Typography, Button, Table, TableBody, TableCell, TableHead, TableRow, Paper, Dialog, DialogTitle, DialogContent, TextField, DialogActions, Alert, Autocomplete, Grid, IconButton } from '@mui/material';
 import ArrowUpwardIcon from '@mui/icons-material/ArrowUpward';
 import ArrowDownwardIcon from '@mui/icons-material/ArrowDownward';
@@ -18,24 +19,42 @@ export default function Usage() {
   const [search, setSearch] = useState('');
   const [sort, setSort] = useState({ field: '', direction: 'asc' });
   const [page, setPage] = useState(1);
+  const [nextCursor, setNextCursor] = useState(null); // Курсор следующей страницы с сервера
+  const [loadingMore, setLoadingMore] = useState(false);
   const rowsPerPage = 10;
   const [groups, setGroups] = useState([]);
   const [selectedGroup, setSelectedGroup] = useState('all');
   const [users, setUsers] = useState([]);
 
+  // Первая страница трат; следующие — по кнопке «Загрузить ещё»
   const fetchUsages = async () => {
     try {
-      const res = await api.get('/usage/');
-      setUsages(res.data);
+      const { items, nextCursor } = await fetchPage('/usage/');
+      setUsages(items);
+      setNextCursor(nextCursor);
     } catch {
       setError('Ошибка загрузки трат');
     }
   };
 
+  const loadMoreUsages = async () => {
+    setLoadingMore(true);
+    try {
+      const { items, nextCursor: cursor } = await fetchPage('/usage/', {}, nextCursor);
+      setUsages(prev => [...prev, ...items]);
+      setNextCursor(cursor);
+    } catch {
+      setError('Ошибка загрузки трат');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchUsages();
-    api.get('/spools/')
-      .then(res => setSpools(res.data))
+    // Катушки нужны для подписей и выбора — первые страницы; за их пределами в таблице виден id
+    fetchPages('/spools/')
+      .then(setSpools)
       .catch(() => setSpools([]));
     api.get('/projects/')
       .then(res => setProjects(res.data))
@@ -283,6 +302,12 @@ export default function Usage() {
               showLastButton
             />
           </Box>
+          {nextCursor && (
+            <Box display="flex" justifyContent="center" mb={2}>
+              {/* Поиск и сортировка работают по уже загруженным тратам */}
+              <Button onClick={loadMoreUsages} disabled={loadingMore}>Загрузить ещё</Button>
+            </Box>
+          )}
         </Paper>
         <Dialog open={open} onClose={() => setOpen(false)}>
           <DialogTitle>Добавить трату</DialogTitle>